@@ -0,0 +1,218 @@
+"""Incrementally maintained aggregates behind the /analytics endpoint"""
+import bisect
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+from reconciler import Reconciler
+
+# Columns the rollup needs; reconcile jobs stream this query into rebuild()
+SOURCE_QUERY = """
+    SELECT id, title, status, priority, type, submitted_at, due_date, resolved_at, rating
+    FROM Complaints
+"""
+
+ACTIVITY_DAYS = 7
+TOP_RATED = 5
+MIN_RATING, MAX_RATING = 1, 5
+
+
+def datediff_hours(start, end):
+    """Hour boundaries crossed between two datetimes, like DATEDIFF(hour, start, end)"""
+    start = start.replace(minute=0, second=0, microsecond=0)
+    end = end.replace(minute=0, second=0, microsecond=0)
+    return int((end - start).total_seconds() // 3600)
+
+
+class _Entry:
+    """What one complaint contributes to the aggregates"""
+
+    __slots__ = ("title", "status", "priority", "type", "submitted_at", "due_date", "resolution_hours", "rating")
+
+    def __init__(self, title=None, status=None, priority=None, type=None, submitted_at=None,
+                 due_date=None, resolution_hours=None, rating=None):
+        self.title = title
+        self.status = status
+        self.priority = priority
+        self.type = type
+        self.submitted_at = submitted_at
+        self.due_date = due_date
+        self.resolution_hours = resolution_hours
+        self.rating = rating
+
+    def copy(self):
+        return _Entry(*(getattr(self, name) for name in self.__slots__))
+
+    @property
+    def is_open(self):
+        return self.status is not None and self.status != 'Resolved'
+
+
+class _Aggregates:
+    def __init__(self):
+        self.entries = {}
+        self.by_status = Counter()
+        self.by_priority = Counter()
+        self.by_type = Counter()
+        self.by_day = Counter()
+        self.resolution_hours_sum = 0
+        self.resolution_count = 0
+        self.open_due = []  # sorted (due_date, id) of unresolved complaints
+        self.rated = []     # sorted (-rating, -id) of rated complaints
+
+    def put(self, complaint_id, entry):
+        old = self.entries.get(complaint_id)
+        if old is not None:
+            self._count(complaint_id, old, -1)
+        self.entries[complaint_id] = entry
+        self._count(complaint_id, entry, 1)
+
+    def _count(self, complaint_id, entry, sign):
+        self.by_status[entry.status] += sign
+        self.by_priority[entry.priority] += sign
+        self.by_type[entry.type] += sign
+        if entry.submitted_at is not None:
+            self.by_day[entry.submitted_at.date()] += sign
+        if entry.resolution_hours is not None:
+            self.resolution_hours_sum += sign * entry.resolution_hours
+            self.resolution_count += sign
+        if entry.is_open and entry.due_date is not None:
+            _sorted_update(self.open_due, (entry.due_date, complaint_id), sign)
+        if entry.rating is not None:
+            _sorted_update(self.rated, (-entry.rating, -complaint_id), sign)
+
+    def snapshot(self, now):
+        start_day = (now - timedelta(days=ACTIVITY_DAYS)).date()
+        activity = [{"date": day.strftime('%Y-%m-%d'), "count": self.by_day[day]}
+                    for day in (start_day + timedelta(days=i) for i in range(ACTIVITY_DAYS + 1))
+                    if self.by_day.get(day)]
+        top_rated = []
+        for neg_rating, neg_id in self.rated[:TOP_RATED]:
+            top_rated.append({"title": self.entries[-neg_id].title, "rating": -neg_rating})
+        avg = self.resolution_hours_sum / self.resolution_count if self.resolution_count else 0
+        return {
+            "total_complaints": len(self.entries),
+            "by_status": {k: v for k, v in self.by_status.items() if v},
+            "by_priority": {k: v for k, v in self.by_priority.items() if v},
+            "by_type": {k: v for k, v in self.by_type.items() if v},
+            "avg_resolution_hours": round(avg, 1),
+            "overdue_count": bisect.bisect_left(self.open_due, (now,)),
+            "activity_7_days": activity,
+            "top_rated": top_rated
+        }
+
+
+def _sorted_update(items, key, sign):
+    if sign > 0:
+        bisect.insort(items, key)
+        return
+    i = bisect.bisect_left(items, key)
+    if i < len(items) and items[i] == key:
+        del items[i]
+
+
+class AnalyticsRollup:
+    """Analytics counters updated on every write instead of recomputed per request.
+
+    Call the on_* hooks after each committed write. rebuild() recomputes the
+    aggregates from the base table to correct drift (writes made by other
+    processes, failed hooks); hooks that fire while a rebuild is streaming
+    rows are replayed on top of the rebuilt state.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self._lock = threading.Lock()
+        self._aggregates = _Aggregates()
+        self._journal = None  # hooks recorded while a rebuild is in progress
+        self._reconciler = Reconciler("Analytics")
+
+    # Write hooks
+
+    def on_submit(self, complaint_id, title, type_, priority, due_date, status="Submitted", submitted_at=None):
+        entry = _Entry(title=title, status=status, priority=priority, type=type_,
+                       submitted_at=submitted_at or datetime.now(), due_date=due_date)
+        self._apply(complaint_id, lambda old: entry, creates=True)
+
+    def on_status_change(self, complaint_id, status, resolved_at=None):
+        def change(old):
+            entry = old.copy()
+            entry.status = status
+            # Resolving stamps resolved_at once, as update_status does; re-resolving keeps it
+            if status == 'Resolved' and old.status != 'Resolved' and entry.submitted_at is not None:
+                entry.resolution_hours = datediff_hours(entry.submitted_at, resolved_at or datetime.now())
+            return entry
+        self._apply(complaint_id, change)
+
+    def on_rating(self, complaint_id, rating):
+        try:
+            rating = int(rating)
+        except (TypeError, ValueError):
+            return  # not a rating; the next rebuild reads whatever was stored
+        if not MIN_RATING <= rating <= MAX_RATING:
+            return
+
+        def change(old):
+            entry = old.copy()
+            entry.rating = rating
+            return entry
+        self._apply(complaint_id, change)
+
+    def _apply(self, complaint_id, change, creates=False):
+        try:
+            complaint_id = int(complaint_id)
+        except (TypeError, ValueError):
+            return
+        with self._lock:
+            self._apply_locked(self._aggregates, complaint_id, change, creates)
+            if self._journal is not None:
+                self._journal.append((complaint_id, change, creates))
+
+    @staticmethod
+    def _apply_locked(aggregates, complaint_id, change, creates):
+        old = aggregates.entries.get(complaint_id)
+        if old is None:
+            if not creates:
+                return  # unknown complaint; the next rebuild picks it up
+            old = _Entry()
+        aggregates.put(complaint_id, change(old))
+
+    # Reads
+
+    def snapshot(self, now=None):
+        """The /analytics payload, answered from the counters"""
+        with self._lock:
+            return self._aggregates.snapshot(now or datetime.now())
+
+    # Reconciliation
+
+    def rebuild(self, rows):
+        """Recompute everything from rows of SOURCE_QUERY"""
+        with self._lock:
+            self._journal = []
+        try:
+            fresh = _Aggregates()
+            for row in rows:
+                hours = None
+                if row.resolved_at is not None and row.submitted_at is not None:
+                    hours = datediff_hours(row.submitted_at, row.resolved_at)
+                fresh.put(int(row.id), _Entry(
+                    title=row.title, status=row.status, priority=row.priority, type=row.type,
+                    submitted_at=row.submitted_at,
+                    due_date=row.due_date, resolution_hours=hours, rating=row.rating))
+            with self._lock:
+                for complaint_id, change, creates in self._journal:
+                    self._apply_locked(fresh, complaint_id, change, creates)
+                self._aggregates = fresh
+                self.ready = True
+        finally:
+            with self._lock:
+                self._journal = None
+
+    def start_reconciler(self, reconcile, interval):
+        """Run reconcile() now and then every interval seconds in a daemon thread"""
+        self._reconciler.start(reconcile, interval)
+
+    def request_rebuild(self):
+        """Run the reconciler now instead of waiting for the next interval"""
+        self._reconciler.request()
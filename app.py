@@ -1,29 +1,71 @@
-from flask import Flask, request, render_template, redirect, url_for, jsonify, send_file, session
-from flask_socketio import SocketIO, emit, join_room
-from werkzeug.utils import secure_filename
+import realtime
+realtime.monkey_patch()  # before anything imports socket/threading; no-op in threading mode
+
+from flask import (Flask, Response, request, render_template, redirect, url_for, jsonify, send_file, session,
+                   stream_with_context)
+from flask_socketio import emit, join_room, leave_room
 from azure.storage.blob import BlobServiceClient
 import pyodbc
 import os
 import uuid
-import requests
 from opencensus.ext.azure.log_exporter import AzureLogHandler
 import logging
 from dotenv import load_dotenv
 import threading
-import qrcode
 from io import BytesIO
 import json
 from datetime import datetime, timedelta
-import pandas as pd
-from openpyxl import Workbook
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
+from analytics_rollup import MAX_RATING, MIN_RATING, SOURCE_QUERY as ANALYTICS_SOURCE_QUERY, AnalyticsRollup
+from badge_engine import BADGES_QUERY, BadgeEngine, quick_resolution
+from chat_history import ChatHistory, history_page, mark_read, serialize_message
+from change_feed import ChangeFeed
+from chat_writer import ChatQueueFull, ChatWriter
+from complaint_queries import (build_filters, date_range_filter, parse_fields, parse_limit, select_columns,
+                               serialize_row)
+from complaint_store import insert_complaint
+from db_pool import ConnectionPool, iter_rows
+from event_dispatcher import ROLE_ADMIN, EventDispatcher, complaint_room, role_room, user_room
+from exporters import EXCEL_MIMETYPE, STREAM_FORMATS, gzip_chunks, iter_export, spool_excel
+from http_cache import HttpCache
+from leaderboard import WINDOWS as LEADERBOARD_WINDOWS, Leaderboard
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Metrics
+from notification_outbox import NotificationOutbox, SpoolOutboxStore, SqlOutboxStore
+from presence import Presence
+from priority_classifier import DUE_DAYS, PriorityClassifier, rescore_complaints
+from qr_codes import QR_FORMATS, QRCache, parse_sheet_ids
+from refdata import RefData, sql_loader
+from sql_instrumentation import SqlInstrumentation, parse_budgets
+from uploads import (LocalBlobStore, UploadError, create_upload_store, new_blob_name, stream_size,
+                     validate_upload)
+from upvotes import UpvoteCounter
 
 load_dotenv()
 
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", os.urandom(24))
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+# SOCKETIO_ASYNC_MODE / SOCKETIO_MESSAGE_QUEUE select the async mode and the
+# broker that lets several workers share rooms (see gunicorn.conf.py)
+socketio = realtime.create_socketio(app)
+
+# Request/Socket.IO latency and subsystem counters, scraped from /metrics. Instrumented
+# before any route or handler is registered so every one of them is covered
+metrics = Metrics()
+metrics.instrument_app(app)
+metrics.instrument_socketio(socketio)
+
+# Server-pushed events go to complaint/role/user rooms in coalesced batches
+event_dispatcher = EventDispatcher(socketio, window=float(os.getenv("EVENT_COALESCE_MS", "250")) / 1000)
+# Viewer counts per complaint room and typing indicators sent only on start/stop.
+# Counts are per process, so they are not published when workers share rooms
+presence = Presence(
+    socketio,
+    event_dispatcher.publish,
+    typing_timeout=float(os.getenv("TYPING_TIMEOUT_SECONDS", "3")),
+    min_interval=int(os.getenv("TYPING_MIN_INTERVAL_MS", "500")) / 1000,
+    publish_counts=not realtime.shares_rooms(),
+)
 
 # Azure Blob Setup
 blob_service_client = None
@@ -35,12 +77,149 @@ except Exception as e:
     print(f"Warning: Could not initialize Azure Blob Storage: {e}")
     print("The app will continue without blob storage support.")
 
+# Attachment uploads: "azure" (parallel staged blocks, SAS tokens for direct
+# browser uploads) or "local" (filesystem stand-in for development/testing)
+upload_store = create_upload_store(
+    os.getenv("BLOB_BACKEND", "azure"),
+    service_client=blob_service_client,
+    container=container_name,
+    local_root=os.getenv("LOCAL_BLOB_DIR", "local_blobs"),
+    local_url="/uploads/local",
+    secret=os.getenv("FLASK_SECRET_KEY"),
+    block_size=int(os.getenv("UPLOAD_BLOCK_SIZE", str(4 * 1024 * 1024))),
+    max_concurrency=int(os.getenv("UPLOAD_MAX_CONCURRENCY", "4")),
+    token_ttl=int(os.getenv("UPLOAD_TOKEN_TTL", "600")),
+)
+
 # Azure SQL Setup
 conn_str = os.getenv("AZURE_SQL_CONN_STRING")
 
+# Per-statement timing and slow-query log for every pooled cursor. SQL_QUERY_BUDGET (and
+# per-route SQL_QUERY_BUDGETS="/analytics=12,...") caps statements per request: over budget is
+# logged, or fails the request when testing; SQL_DEBUG_HEADERS adds X-DB-* response headers
+sql_instrumentation = SqlInstrumentation(
+    slow_ms=float(os.getenv("SQL_SLOW_QUERY_MS", "500")),
+    slow_log_path=os.getenv("SQL_SLOW_QUERY_LOG") or None,
+    budget=int(os.getenv("SQL_QUERY_BUDGET", "0")),
+    budgets=parse_budgets(os.getenv("SQL_QUERY_BUDGETS")),
+    debug_headers=os.getenv("SQL_DEBUG_HEADERS", "false").lower() == "true",
+    repeat_threshold=int(os.getenv("SQL_REPEAT_THRESHOLD", "10")),
+)
+sql_instrumentation.instrument_app(app)
+
+# Connection pool (replaces the ODBC driver manager's own pooling)
+pyodbc.pooling = False
+db_pool = ConnectionPool(
+    realtime.cooperative_connect(lambda: pyodbc.connect(conn_str)),
+    min_size=int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+    max_size=int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+    timeout=float(os.getenv("DB_POOL_TIMEOUT", "15")),
+    max_lifetime=float(os.getenv("DB_POOL_MAX_LIFETIME", "1800")),
+    wrap_cursor=sql_instrumentation.wrap_cursor,
+)
+
+# Precomputed /analytics counters, reconciled against Complaints periodically
+analytics_rollup = AnalyticsRollup()
+analytics_reconcile_interval = float(os.getenv("ANALYTICS_RECONCILE_SECONDS", "300"))
+
+# In-memory leaderboard (all time, this week, this month), reconciled against the database periodically
+leaderboard = Leaderboard()
+leaderboard_reconcile_interval = float(os.getenv("LEADERBOARD_RECONCILE_SECONDS", "300"))
+
+# Rendered QR codes: in-memory LRU, plus a shared directory when QR_CACHE_DIR is set
+qr_cache = QRCache(max_entries=int(os.getenv("QR_CACHE_SIZE", "512")), cache_dir=os.getenv("QR_CACHE_DIR") or None)
+
+# Conditional GET: ETags from per-scope change counters bumped after each write. With
+# several workers, ETags also roll over every HTTP_CACHE_MAX_STALENESS seconds so a
+# worker cannot keep validating data another worker changed
+http_cache = HttpCache(max_staleness=float(os.getenv(
+    "HTTP_CACHE_MAX_STALENESS", "5" if int(os.getenv("WEB_CONCURRENCY", "1")) > 1 else "0")))
+
+# Delta sync: each write stamps the complaint with a new feed version so dashboards fetch
+# only what changed. With several workers, clients resync every CHANGE_FEED_RESYNC_SECONDS
+# to pick up changes made through other workers
+change_feed = ChangeFeed(max_entries=int(os.getenv("CHANGE_FEED_SIZE", "10000")), resync_interval=float(os.getenv(
+    "CHANGE_FEED_RESYNC_SECONDS", "60" if int(os.getenv("WEB_CONCURRENCY", "1")) > 1 else "0")))
+
+# Reference data (response templates, badge catalogue): loaded at startup, served from
+# memory and reloaded every REFDATA_TTL seconds or on POST /admin/refresh_refdata
+refdata = RefData(default_ttl=float(os.getenv("REFDATA_TTL", "300")))
+refdata.register("templates",
+                 sql_loader(lambda: db_pool.connection(),
+                            "SELECT id, title, category, template_text FROM ResponseTemplates"),
+                 on_change=lambda: http_cache.bump("templates"))
+refdata.register("badges", sql_loader(lambda: db_pool.connection(), BADGES_QUERY),
+                 on_change=lambda: http_cache.bump("badges"))
+
+# Priority classifier: rules from PRIORITY_RULES_FILE (JSON) if set, otherwise the
+# PriorityRules table once loaded, with the built-in keyword list until then
+priority_rules_file = os.getenv("PRIORITY_RULES_FILE")
+priority_classifier = PriorityClassifier.from_file(priority_rules_file) if priority_rules_file else PriorityClassifier()
+
 # Logic App Webhook URL
 logic_app_url = os.getenv("LOGIC_APP_WEBHOOK_URL")
 
+# Notification outbox: the NotificationOutbox table (written in the same
+# transaction as the complaint) or, without a database, a local spool
+# directory; drained by a fixed pool of workers sharing one HTTP session.
+# Notifications the table cannot take (database down) go to the spool too
+outbox_spool = SpoolOutboxStore(os.getenv("OUTBOX_SPOOL_DIR", "outbox_spool"))
+outbox_store = SqlOutboxStore(lambda: db_pool.connection()) if conn_str else outbox_spool
+notification_outbox = NotificationOutbox(
+    outbox_store,
+    logic_app_url,
+    workers=int(os.getenv("OUTBOX_WORKERS", "4")),
+    batch=os.getenv("LOGIC_APP_ACCEPTS_BATCH", "false").lower() == "true",
+    batch_size=int(os.getenv("OUTBOX_BATCH_SIZE", "20")),
+    max_attempts=int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8")),
+    fallback_store=outbox_spool if outbox_store is not outbox_spool else None,
+)
+notification_outbox.start()
+
+# Badge engine: users whose UserProfiles counters changed are queued and a
+# fixed pool of workers checks them against the cached badge catalogue
+def publish_badges(email, badge_ids):
+    http_cache.bump("user", email)
+    for badge_id in badge_ids:
+        event_dispatcher.publish('badge_earned', {'email': email, 'badge_id': badge_id}, [user_room(email)])
+
+badge_engine = BadgeEngine(
+    lambda: db_pool.connection(),
+    lambda: refdata.get("badges"),
+    on_award=publish_badges,
+    workers=int(os.getenv("BADGE_WORKERS", "2")),
+    max_queue=int(os.getenv("BADGE_QUEUE_SIZE", "1000")),
+)
+badge_engine.start()
+
+# Upvotes: one per voter, counted in memory, logged to UPVOTE_LOG_DIR before they are
+# acknowledged and written to the database in batches every UPVOTE_FLUSH_SECONDS
+def on_upvotes_flushed(counts):
+    for complaint_id in counts:
+        http_cache.bump("complaint", complaint_id)
+
+upvote_counter = UpvoteCounter(
+    lambda: db_pool.connection(),
+    os.getenv("UPVOTE_LOG_DIR", "upvote_log"),
+    flush_interval=float(os.getenv("UPVOTE_FLUSH_SECONDS", "1")),
+    fsync=os.getenv("UPVOTE_LOG_FSYNC", "true").lower() == "true",
+    on_flush=on_upvotes_flushed,
+)
+
+# Chat messages are emitted as soon as they arrive and saved by a background
+# writer that bulk-inserts whatever queued up in the last CHAT_FLUSH_MS
+chat_writer = ChatWriter(
+    lambda: db_pool.connection(),
+    batch_size=int(os.getenv("CHAT_BATCH_SIZE", "200")),
+    flush_interval=int(os.getenv("CHAT_FLUSH_MS", "50")) / 1000,
+    max_queue=int(os.getenv("CHAT_QUEUE_SIZE", "10000")),
+)
+# The last CHAT_HISTORY_SIZE messages of active rooms, replayed to clients joining them
+chat_history = ChatHistory(
+    size=int(os.getenv("CHAT_HISTORY_SIZE", "50")),
+    max_rooms=int(os.getenv("CHAT_HISTORY_ROOMS", "1000")),
+)
+
 # Monitoring - Azure Application Insights
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -60,53 +239,62 @@ if appinsights_conn:
 
 # Helper Functions
 def get_db_connection():
-    """Get database connection"""
-    return pyodbc.connect(conn_str)
-
-def calculate_priority(title, description):
-    """Auto-calculate priority based on keywords"""
-    high_priority_keywords = ['urgent', 'emergency', 'critical', 'immediately', 'asap', 'severe']
-    medium_priority_keywords = ['important', 'soon', 'attention', 'issue']
-    
-    text = (title + " " + description).lower()
-    
-    for keyword in high_priority_keywords:
-        if keyword in text:
-            return 'High'
-    
-    for keyword in medium_priority_keywords:
-        if keyword in text:
-            return 'Medium'
-    
-    return 'Low'
+    """Check out a pooled database connection (returned to the pool when the `with` block exits)"""
+    return db_pool.connection()
 
-def award_badges(email):
-    """Check and award badges to user"""
+def warm_db_pool():
+    """Open the pool's minimum connections in the background so the first requests don't pay for them"""
     try:
+        db_pool.warm()
+    except Exception as e:
+        print(f"Warning: Could not warm database connection pool: {e}")
+
+def reconcile_analytics():
+    """Rebuild the analytics rollups from the Complaints table to correct any drift"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(ANALYTICS_SOURCE_QUERY)
+        analytics_rollup.rebuild(iter_rows(cursor))
+
+def reconcile_leaderboard():
+    """Reload the leaderboard from UserProfiles and Complaints to correct any drift"""
+    with get_db_connection() as conn:
+        leaderboard.rebuild_from(conn.cursor())
+    http_cache.bump("leaderboard")
+
+if conn_str:
+    threading.Thread(target=warm_db_pool, daemon=True).start()
+    threading.Thread(target=refdata.warm, daemon=True).start()
+    upvote_counter.start()
+    chat_writer.start()
+    analytics_rollup.start_reconciler(reconcile_analytics, analytics_reconcile_interval)
+    leaderboard.start_reconciler(reconcile_leaderboard, leaderboard_reconcile_interval)
+
+def load_priority_rules():
+    """Reload priority rules from PRIORITY_RULES_FILE or the PriorityRules table"""
+    global priority_classifier
+    if priority_rules_file:
+        priority_classifier = PriorityClassifier.from_file(priority_rules_file)
+    else:
         with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Count user's complaints
-            cursor.execute("SELECT COUNT(*) as count FROM Complaints WHERE email = ?", (email,))
-            complaint_count = cursor.fetchone().count
-            
-            # Get badges user already has
-            cursor.execute("SELECT badge_id FROM UserBadges WHERE user_email = ?", (email,))
-            earned_badges = [row.badge_id for row in cursor.fetchall()]
-            
-            # Check badge requirements
-            cursor.execute("SELECT id, requirement_type, requirement_value FROM Badges")
-            badges = cursor.fetchall()
-            
-            for badge in badges:
-                if badge.id not in earned_badges:
-                    if badge.requirement_type == 'complaints_submitted' and complaint_count >= badge.requirement_value:
-                        cursor.execute("INSERT INTO UserBadges (user_email, badge_id) VALUES (?, ?)", 
-                                     (email, badge.id))
-                        conn.commit()
-                        socketio.emit('badge_earned', {'email': email, 'badge_id': badge.id}, broadcast=True)
+            classifier = PriorityClassifier.from_db(conn.cursor())
+        if classifier.rules:
+            priority_classifier = classifier
+    return priority_classifier
+
+def init_priority_rules():
+    """Load the PriorityRules table at startup, keeping the defaults if it is unavailable"""
+    try:
+        load_priority_rules()
     except Exception as e:
-        print(f"Error awarding badges: {e}")
+        print(f"Warning: Could not load priority rules, using defaults: {e}")
+
+if conn_str and not priority_rules_file:
+    threading.Thread(target=init_priority_rules, daemon=True).start()
+
+def calculate_priority(title, description):
+    """Auto-calculate priority based on keywords"""
+    return priority_classifier.classify(title, description)
 
 # Routes
 
@@ -145,76 +333,64 @@ def submit_complaint():
             priority = calculate_priority(title, description)
             
             # Calculate due date based on priority
-            due_date = None
-            if priority == 'High':
-                due_date = datetime.now() + timedelta(days=1)
-            elif priority == 'Medium':
-                due_date = datetime.now() + timedelta(days=3)
-            else:
-                due_date = datetime.now() + timedelta(days=7)
+            due_date = datetime.now() + timedelta(days=DUE_DAYS[priority])
 
             file_url = None
+            blob_name = request.form.get("blob_name")
 
-            # Upload file to Azure Blob (with timeout)
-            if file and file.filename != "" and blob_service_client:
-                if not file.filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.pdf', '.doc', '.docx')):
-                    return jsonify({"success": False, "error": "Invalid file type."}), 400
-                file.seek(0, 2)
-                if file.tell() > 10 * 1024 * 1024:  # 10MB limit
-                    return jsonify({"success": False, "error": "File too large."}), 400
-                file.seek(0)
-                filename = secure_filename(file.filename)
-                blob_name = f"{uuid.uuid4()}_{filename}"
+            # Attachment: finalize a direct-to-storage upload, or upload the posted file
+            if blob_name and upload_store:
+                try:
+                    file_url = upload_store.finalize(blob_name)
+                except UploadError as e:
+                    return jsonify({"success": False, "error": str(e)}), 400
+            elif file and file.filename != "" and upload_store:
+                size = stream_size(file)
                 try:
-                    blob_client = blob_service_client.get_blob_client(container=container_name, blob=blob_name)
-                    blob_client.upload_blob(file, timeout=10)  # 10 second timeout
-                    file_url = blob_client.url
+                    validate_upload(file.filename, size)
+                except UploadError as e:
+                    return jsonify({"success": False, "error": str(e)}), 400
+                try:
+                    file_url = upload_store.upload(new_blob_name(file.filename), file.stream, size, file.mimetype)
                 except Exception as e:
                     print(f"Warning: Could not upload file to blob storage: {e}")
 
+            # Logic App notification (delivered by the outbox workers)
+            notification = None
+            if notification_outbox.enabled:
+                notification = {
+                    "title": title,
+                    "description": description,
+                    "type": type_,
+                    "priority": priority,
+                    "file_url": file_url,
+                    "status": "Submitted",
+                    "student_name": student_name,
+                    "email": email
+                }
+            notification_queued = False
+
             # Save to Azure SQL (with error handling)
             complaint_id = None
             try:
                 if conn_str:  # Only try if connection string is configured
+                    # Complaint, activity log, profile update and outbox row: one batch, one transaction
                     with get_db_connection() as conn:
                         cursor = conn.cursor()
-                        cursor.execute("""
-                            INSERT INTO Complaints (title, description, type, file_url, status, student_name, email, priority, due_date)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        """, (title, description, type_, file_url, "Submitted", student_name, email, priority, due_date))
-                        conn.commit()
-                        
-                        # Get the inserted complaint ID
-                        cursor.execute("SELECT @@IDENTITY AS id")
-                        complaint_id = cursor.fetchone().id
-                        
-                        # Log activity (non-blocking)
-                        try:
-                            cursor.execute("""
-                                INSERT INTO ActivityLog (complaint_id, action, performed_by, details)
-                                VALUES (?, ?, ?, ?)
-                            """, (complaint_id, "Created", student_name, f"Complaint submitted with {priority} priority"))
-                            conn.commit()
-                        except:
-                            pass  # Don't fail if activity log fails
-                        
-                        # Update user profile (non-blocking)
-                        try:
-                            cursor.execute("""
-                                IF EXISTS (SELECT 1 FROM UserProfiles WHERE email = ?)
-                                    UPDATE UserProfiles SET total_complaints = total_complaints + 1, points = points + 10 WHERE email = ?
-                                ELSE
-                                    INSERT INTO UserProfiles (email, name, total_complaints, points) VALUES (?, ?, 1, 10)
-                            """, (email, email, email, student_name))
-                            conn.commit()
-                        except:
-                            pass  # Don't fail if profile update fails
-                        
-                        # Award badges (non-blocking, in background)
-                        try:
-                            threading.Thread(target=award_badges, args=(email,), daemon=True).start()
-                        except:
-                            pass
+                        submitted = insert_complaint(cursor, title, description, type_, file_url,
+                                                     student_name, email, priority, due_date,
+                                                     notification if outbox_store.transactional else None)
+                        complaint_id = submitted.id
+                    notification_queued = outbox_store.transactional
+
+                    # Award badges (queued for the badge workers, after commit so the new complaint is counted)
+                    badge_engine.submit(email)
+                    leaderboard.on_submit(email, complaint_id, submitted, student_name)
+                    http_cache.bump("user", email)
+                    http_cache.bump("leaderboard")
+
+                    analytics_rollup.on_submit(complaint_id, title, type_, priority, due_date)
+                    change_feed.record(complaint_id, email)
                 else:
                     # If no database, generate a random complaint ID
                     complaint_id = uuid.uuid4().hex[:8].upper()
@@ -226,34 +402,25 @@ def submit_complaint():
                 complaint_id = uuid.uuid4().hex[:8].upper()
                 print(f"Database error (continuing anyway): {str(e)}")
 
-            # Send Email via Logic App (in background thread to avoid blocking)
-            def send_notification():
-                try:
-                    if logic_app_url:
-                        payload = {
-                            "title": title,
-                            "description": description,
-                            "type": type_,
-                            "priority": priority,
-                            "file_url": file_url,
-                            "status": "Submitted",
-                            "student_name": student_name,
-                            "email": email
-                        }
-                        requests.post(logic_app_url, json=payload, timeout=2)
-                except Exception as e:
-                    print(f"Warning: Could not send notification via Logic App: {e}")
-            
-            threading.Thread(target=send_notification, daemon=True).start()
+            # Send Email via Logic App (queued; the outbox workers deliver and retry it)
+            try:
+                if notification is not None:
+                    if notification_queued:
+                        notification_outbox.notify()
+                    else:
+                        notification["complaint_id"] = complaint_id
+                        notification_outbox.enqueue(notification)
+            except Exception as e:
+                print(f"Warning: Could not queue notification: {e}")
 
             # Emit real-time notification
             try:
-                socketio.emit('new_complaint', {
+                event_dispatcher.publish('new_complaint', {
                     'id': complaint_id,
                     'title': title,
                     'priority': priority,
                     'status': 'Submitted'
-                }, broadcast=True)
+                }, [ROLE_ADMIN])
             except:
                 pass  # Don't fail if socketio fails
 
@@ -267,6 +434,49 @@ def submit_complaint():
 
     return render_template("submit_complaint.html")
 
+@app.route("/uploads/token", methods=["POST"])
+def upload_token():
+    """Issue a short-lived token for uploading an attachment directly to storage"""
+    if not upload_store:
+        return jsonify({"error": "File uploads are not configured"}), 503
+    try:
+        data = request.get_json(silent=True) or request.form
+        filename = data.get("filename", "")
+        size = data.get("size")
+        validate_upload(filename, int(size) if size is not None else None)
+        blob_name = new_blob_name(filename)
+        token = upload_store.upload_token(blob_name, data.get("content_type"))
+        token["blob_name"] = blob_name
+        return jsonify(token)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error("Error issuing upload token", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/uploads/local/<blob_name>", methods=["GET", "PUT"])
+def local_blob(blob_name):
+    """Serve and receive attachments when BLOB_BACKEND=local"""
+    if not isinstance(upload_store, LocalBlobStore):
+        return jsonify({"error": "Not found"}), 404
+    try:
+        path = upload_store.path(blob_name)
+    except UploadError:
+        return jsonify({"error": "Not found"}), 404
+
+    if request.method == "GET":
+        if not os.path.exists(path):
+            return jsonify({"error": "Not found"}), 404
+        return send_file(path)
+
+    if not upload_store.verify_token(blob_name, request.args.get("expires"), request.args.get("sig")):
+        return jsonify({"error": "Invalid or expired upload token"}), 403
+    try:
+        upload_store.write(blob_name, request.stream)
+    except UploadError as e:
+        return jsonify({"error": str(e)}), 413
+    return "", 201
+
 @app.route("/admin")
 def admin_dashboard():
     return render_template("admin_dashboard.html")
@@ -275,7 +485,66 @@ def admin_dashboard():
 def user_profile():
     return render_template("user_profile.html")
 
+def complaint_changes(token, email=None):
+    """/changes body: complaints changed since token (all listing fields), or reset"""
+    version, ids, reset = change_feed.since(token, email)
+    complaints = []
+    if ids:
+        fields = parse_fields(None)
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT {', '.join(select_columns(fields))}
+                FROM Complaints
+                WHERE id IN ({', '.join('?' * len(ids))})
+            """, ids)
+            rows = cursor.fetchall()
+        now = datetime.now()
+        for row in rows:
+            if email and (row.email or '').strip().lower() != email.strip().lower():
+                continue
+            complaint = serialize_row(row, fields, now)
+            complaint["upvotes"] = upvote_counter.count(row.id) or row.upvotes
+            complaints.append(complaint)
+    return {"version": version, "complaints": complaints, "reset": reset}
+
+@app.route("/changes", methods=["GET"])
+def get_changes():
+    """Complaints changed since a version (since: from the last response; email: one user's)"""
+    try:
+        response = jsonify(complaint_changes(request.args.get('since'), request.args.get('email')))
+        response.headers["Cache-Control"] = "no-store"
+        return response
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/changes/stream", methods=["GET"])
+def stream_changes():
+    """Server-Sent Events version of /changes: a 'changes' event whenever something changes"""
+    token = request.headers.get('Last-Event-ID') or request.args.get('since')
+    email = request.args.get('email')
+    keepalive = float(os.getenv("CHANGE_STREAM_KEEPALIVE_SECONDS", "25"))
+
+    def events(token):
+        yield "retry: 5000\n\n"
+        while True:
+            # Idle streams sleep here until a write is recorded
+            if not change_feed.wait(token, keepalive):
+                yield ": keepalive\n\n"
+                continue
+            try:
+                body = complaint_changes(token, email)
+            except Exception as e:
+                logger.warning("Change stream closed: %s", e)
+                return  # the browser reconnects with Last-Event-ID
+            token = body["version"]
+            yield f"id: {token}\nevent: changes\ndata: {json.dumps(body)}\n\n"
+
+    return Response(stream_with_context(events(token)), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"})
+
 @app.route("/get_complaint/<int:complaint_id>", methods=["GET"])
+@http_cache.conditional(lambda complaint_id: ["complaints", ("complaint", complaint_id)])
 def get_complaint(complaint_id):
     try:
         with get_db_connection() as conn:
@@ -299,7 +568,7 @@ def get_complaint(complaint_id):
                 "status": row.status,
                 "priority": row.priority,
                 "rating": row.rating,
-                "upvotes": row.upvotes,
+                "upvotes": upvote_counter.count(row.id) or row.upvotes,  # includes unflushed votes
                 "due_date": row.due_date.strftime('%Y-%m-%d %H:%M:%S') if row.due_date else None,
                 "submitted_at": row.submitted_at.strftime('%Y-%m-%d %H:%M:%S') if row.submitted_at else "N/A",
                 "resolved_at": row.resolved_at.strftime('%Y-%m-%d %H:%M:%S') if row.resolved_at else None,
@@ -335,7 +604,12 @@ def assign_complaint():
             
             conn.commit()
 
-        socketio.emit('status_updated', {'id': complaint_id, 'status': 'Assigned'}, broadcast=True)
+        analytics_rollup.on_status_change(complaint_id, "Assigned")
+        change_feed.record(complaint_id)
+        http_cache.bump("complaint", complaint_id)
+
+        event_dispatcher.publish('status_updated', {'id': complaint_id, 'status': 'Assigned'},
+                                 [complaint_room(complaint_id), ROLE_ADMIN], coalesce_key=complaint_id)
         
         return jsonify({"success": True, "message": "Complaint assigned successfully."})
     except Exception as e:
@@ -350,23 +624,32 @@ def update_status():
         new_status = data.get("status")
         performed_by = data.get("performed_by", "Admin")
 
+        resolved_by = owner = None
         with get_db_connection() as conn:
             cursor = conn.cursor()
             
-            # If status is Resolved, set resolved_at
+            # If status is Resolved, set resolved_at (once: re-resolving changes nothing)
             if new_status == "Resolved":
                 cursor.execute("""
                     UPDATE Complaints
                     SET status = ?, resolved_at = GETDATE()
-                    WHERE id = ?
+                    WHERE id = ? AND (status IS NULL OR status <> 'Resolved')
                 """, (new_status, complaint_id))
                 
-                # Update user profile resolved count
-                cursor.execute("""
-                    UPDATE UserProfiles 
-                    SET resolved_complaints = resolved_complaints + 1, points = points + 50
-                    WHERE email = (SELECT email FROM Complaints WHERE id = ?)
-                """, (complaint_id,))
+                # Update the submitter's resolved counters, unless it was already resolved
+                if cursor.rowcount > 0:
+                    cursor.execute(f"""
+                        UPDATE p
+                        SET resolved_complaints = p.resolved_complaints + 1, points = p.points + 50,
+                            quick_resolutions = p.quick_resolutions
+                                + CASE WHEN {quick_resolution("c.submitted_at", "c.resolved_at")} THEN 1 ELSE 0 END
+                        OUTPUT INSERTED.email, INSERTED.points, INSERTED.total_complaints, INSERTED.resolved_complaints
+                        FROM UserProfiles p
+                        JOIN Complaints c ON c.email = p.email
+                        WHERE c.id = ?
+                    """, (complaint_id,))
+                    owner = cursor.fetchone()
+                    resolved_by = owner.email if owner else None
             else:
                 cursor.execute("""
                     UPDATE Complaints
@@ -382,7 +665,17 @@ def update_status():
             
             conn.commit()
 
-        socketio.emit('status_updated', {'id': complaint_id, 'status': new_status}, broadcast=True)
+        analytics_rollup.on_status_change(complaint_id, new_status)
+        badge_engine.submit(resolved_by)
+        leaderboard.on_resolved(resolved_by, complaint_id, owner)
+        change_feed.record(complaint_id, resolved_by)
+        http_cache.bump("complaint", complaint_id)
+        if resolved_by:
+            http_cache.bump("user", resolved_by)
+            http_cache.bump("leaderboard")
+
+        event_dispatcher.publish('status_updated', {'id': complaint_id, 'status': new_status},
+                                 [complaint_room(complaint_id), ROLE_ADMIN], coalesce_key=complaint_id)
         
         return jsonify({"success": True, "message": "Complaint status updated successfully."})
     except Exception as e:
@@ -395,11 +688,20 @@ def rate_complaint():
         data = request.get_json()
         complaint_id = data.get("id")
         rating = data.get("rating")
-        
+        if isinstance(rating, str) and rating.strip().isdigit():
+            rating = int(rating)
+        if isinstance(rating, bool) or not isinstance(rating, int) or not MIN_RATING <= rating <= MAX_RATING:
+            return jsonify({"success": False,
+                            "error": f"rating must be a whole number from {MIN_RATING} to {MAX_RATING}"}), 400
+
         with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("UPDATE Complaints SET rating = ? WHERE id = ?", (rating, complaint_id))
             conn.commit()
+
+        analytics_rollup.on_rating(complaint_id, rating)
+        change_feed.record(complaint_id)
+        http_cache.bump("complaint", complaint_id)
         
         return jsonify({"success": True, "message": "Rating submitted successfully."})
     except Exception as e:
@@ -407,25 +709,38 @@ def rate_complaint():
 
 @app.route("/upvote_complaint", methods=["POST"])
 def upvote_complaint():
+    """Record one upvote per voter.
+
+    There is no login, so the voter is whatever this session first presented:
+    the email it upvoted with, otherwise a random id. The email is not
+    verified; a client can still vote once per made-up address or per new
+    session, so the count deters casual repeat clicks rather than ballot
+    stuffing.
+    """
     try:
         data = request.get_json()
         complaint_id = data.get("id")
+        if isinstance(complaint_id, str) and complaint_id.strip().isdigit():
+            complaint_id = int(complaint_id)
+        if isinstance(complaint_id, bool) or not isinstance(complaint_id, int):
+            return jsonify({"success": False, "error": "id must be a complaint id"}), 400
+        voter = session.setdefault("voter_id", data.get("email") or uuid.uuid4().hex)
+
+        accepted, upvotes = upvote_counter.vote(complaint_id, voter)
+        if accepted:
+            http_cache.bump("complaint", complaint_id)
+            change_feed.record(complaint_id)
+            event_dispatcher.publish('upvote_updated', {'id': complaint_id, 'upvotes': upvotes},
+                                     [complaint_room(complaint_id), ROLE_ADMIN], coalesce_key=complaint_id)
         
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("UPDATE Complaints SET upvotes = upvotes + 1 WHERE id = ?", (complaint_id,))
-            conn.commit()
-            
-            cursor.execute("SELECT upvotes FROM Complaints WHERE id = ?", (complaint_id,))
-            upvotes = cursor.fetchone().upvotes
-        
-        socketio.emit('upvote_updated', {'id': complaint_id, 'upvotes': upvotes}, broadcast=True)
-        
-        return jsonify({"success": True, "upvotes": upvotes})
+        return jsonify({"success": True, "upvotes": upvotes, "already_upvoted": not accepted})
+    except KeyError:
+        return jsonify({"success": False, "error": "Complaint not found"}), 404
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route("/comments/<int:complaint_id>", methods=["GET", "POST"])
+@http_cache.conditional(lambda complaint_id: [("complaint", complaint_id)])
 def manage_comments(complaint_id):
     if request.method == "POST":
         try:
@@ -444,14 +759,15 @@ def manage_comments(complaint_id):
                 
                 cursor.execute("SELECT @@IDENTITY AS id")
                 comment_id = cursor.fetchone().id
+            http_cache.bump("complaint", complaint_id)
             
-            socketio.emit('new_comment', {
+            event_dispatcher.publish('new_comment', {
                 'complaint_id': complaint_id,
                 'user_name': user_name,
                 'user_type': user_type,
                 'comment_text': comment_text,
                 'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }, broadcast=True)
+            }, [complaint_room(complaint_id)])
             
             return jsonify({"success": True, "comment_id": comment_id})
         except Exception as e:
@@ -480,9 +796,39 @@ def manage_comments(complaint_id):
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
+@app.route("/chat/<int:complaint_id>", methods=["GET"])
+def get_chat(complaint_id):
+    """Chat history, newest first (limit; cursor from the previous page or the chat_history event)"""
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        with get_db_connection() as conn:
+            messages, next_cursor = history_page(conn.cursor(), complaint_id, limit, request.args.get('cursor'))
+        return jsonify({"messages": messages, "next_cursor": next_cursor})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/chat/<int:complaint_id>/read", methods=["POST"])
+def mark_chat_read(complaint_id):
+    """Mark unread messages read: all of them, those not sent by reader_type, or only ids"""
+    try:
+        data = request.get_json(silent=True) or {}
+        with get_db_connection() as conn:
+            marked = mark_read(conn.cursor(), complaint_id, data.get("reader_type"), data.get("ids"))
+        return jsonify({"success": True, "marked": marked})
+    except (TypeError, ValueError) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
 @app.route("/analytics", methods=["GET"])
 def get_analytics():
     try:
+        # Served from the rollups once the first reconciliation has run
+        if analytics_rollup.ready:
+            return jsonify(analytics_rollup.snapshot())
+
         with get_db_connection() as conn:
             cursor = conn.cursor()
             
@@ -560,30 +906,48 @@ def get_analytics():
         return jsonify({"error": str(e)}), 500
 
 @app.route("/leaderboard", methods=["GET"])
+@http_cache.conditional(lambda: ["leaderboard"], cache_control="public, max-age=10")
 def get_leaderboard():
+    """Top users by points for window=all|weekly|monthly, served from the in-memory leaderboard"""
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Top users by points
-            cursor.execute("""
-                SELECT TOP 10 name, email, points, total_complaints, resolved_complaints
-                FROM UserProfiles
-                ORDER BY points DESC
-            """)
-            top_users = [{
-                "name": row.name,
-                "email": row.email,
-                "points": row.points,
-                "total_complaints": row.total_complaints,
-                "resolved_complaints": row.resolved_complaints
-            } for row in cursor.fetchall()]
-            
-            return jsonify({"leaderboard": top_users})
+        window = request.args.get("window", "all")
+        limit = min(max(int(request.args.get("limit", 10)), 1), 100)
+        offset = max(int(request.args.get("offset", 0)), 0)
+        leaderboard.check_window(window)
+        if not leaderboard.ready:
+            reconcile_leaderboard()
+
+        top_users, total = leaderboard.top(window, limit, offset)
+        return jsonify({"leaderboard": top_users, "window": window, "total": total})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/leaderboard/user/<email>", methods=["GET"])
+@http_cache.conditional(lambda email: ["leaderboard"], cache_control="public, max-age=10")
+def get_leaderboard_position(email):
+    """A user's rank plus the users just above and below them"""
+    try:
+        window = request.args.get("window", "all")
+        before = min(max(int(request.args.get("before", 2)), 0), 50)
+        after = min(max(int(request.args.get("after", 2)), 0), 50)
+        leaderboard.check_window(window)
+        if not leaderboard.ready:
+            reconcile_leaderboard()
+
+        user, nearby = leaderboard.around(email, window, before, after)
+        if user is None:
+            return jsonify({"error": "User has no points in this window"}), 404
+        return jsonify({"user": user, "around": nearby, "window": window,
+                        "total": leaderboard.stats()[window]})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route("/user_profile/<email>", methods=["GET"])
+@http_cache.conditional(lambda email: [("user", email), "leaderboard", "badges"], cache_control="private, no-cache")
 def get_user_profile(email):
     try:
         with get_db_connection() as conn:
@@ -610,28 +974,31 @@ def get_user_profile(email):
                 "created_at": row.created_at.strftime('%Y-%m-%d') if row.created_at else None
             }
             
-            # Get badges
+            # Get badges (names and icons from the cached catalogue)
+            catalogue = {badge["id"]: badge for badge in refdata.get("badges")}
             cursor.execute("""
-                SELECT b.name, b.description, b.icon, ub.earned_at
-                FROM UserBadges ub
-                JOIN Badges b ON ub.badge_id = b.id
-                WHERE ub.user_email = ?
-                ORDER BY ub.earned_at DESC
+                SELECT badge_id, earned_at
+                FROM UserBadges
+                WHERE user_email = ?
+                ORDER BY earned_at DESC
             """, (email,))
             badges = [{
-                "name": row.name,
-                "description": row.description,
-                "icon": row.icon,
+                "name": catalogue[row.badge_id]["name"],
+                "description": catalogue[row.badge_id]["description"],
+                "icon": catalogue[row.badge_id]["icon"],
                 "earned_at": row.earned_at.strftime('%Y-%m-%d') if row.earned_at else None
-            } for row in cursor.fetchall()]
+            } for row in cursor.fetchall() if row.badge_id in catalogue]
             
             profile["badges"] = badges
+            profile["rank"] = ({window: leaderboard.rank(email, window) for window in LEADERBOARD_WINDOWS}
+                               if leaderboard.ready else None)
             
             return jsonify({"profile": profile})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route("/activity_log/<int:complaint_id>", methods=["GET"])
+@http_cache.conditional(lambda complaint_id: [("complaint", complaint_id)])
 def get_activity_log(complaint_id):
     try:
         with get_db_connection() as conn:
@@ -655,43 +1022,137 @@ def get_activity_log(complaint_id):
         return jsonify({"error": str(e)}), 500
 
 @app.route("/templates", methods=["GET"])
+@http_cache.conditional(lambda: ["templates"], cache_control="public, max-age=60", max_staleness=300)
 def get_templates():
     try:
+        return jsonify({"templates": refdata.get("templates")})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/admin/rescore_priorities", methods=["POST"])
+def rescore_priorities():
+    """Reload priority rules and re-score complaints (open ones unless include_resolved is set)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        if data.get("reload_rules", True):
+            load_priority_rules()
+
         with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, title, category, template_text FROM ResponseTemplates")
-            
-            templates = [{
-                "id": row.id,
-                "title": row.title,
-                "category": row.category,
-                "template_text": row.template_text
-            } for row in cursor.fetchall()]
-            
-            return jsonify({"templates": templates})
+            changes = rescore_complaints(conn, priority_classifier,
+                                         include_resolved=bool(data.get("include_resolved")))
+
+        if changes:
+            analytics_rollup.request_rebuild()
+            http_cache.bump("complaints")
+            for complaint_id, _ in changes:
+                change_feed.record(complaint_id)
+
+        return jsonify({"success": True, "rescored": len(changes)})
+    except Exception as e:
+        logger.error("Error re-scoring complaint priorities", exc_info=True)
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route("/admin/backfill_badges", methods=["POST"])
+def backfill_badges():
+    """Award every badge users already qualify for (recounting quick resolutions unless recount is false)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        refdata.invalidate("badges")
+        awarded = badge_engine.backfill(recount=data.get("recount", True))
+        http_cache.bump("badges")
+        return jsonify({"success": True, "awarded": sum(awarded.values()),
+                        "by_badge": {str(badge_id): count for badge_id, count in awarded.items()}})
+    except Exception as e:
+        logger.error("Error backfilling badges", exc_info=True)
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route("/admin/refresh_refdata", methods=["POST"])
+def refresh_refdata():
+    """Reload cached reference data now (all lookups, or {"names": [...]})"""
+    try:
+        data = request.get_json(silent=True) or {}
+        results = refdata.refresh(data.get("names"))
+        failed = {name: error for name, error in results.items() if error}
+        return jsonify({"success": not failed, "refreshed": [name for name in results if name not in failed],
+                        "failed": failed}), (500 if failed else 200)
+    except KeyError as e:
+        return jsonify({"success": False, "error": e.args[0]}), 400
+
+# Subsystem counters, exported as app_<name>_* gauges (read only when /metrics is
+# scraped) and as JSON from /admin/stats
+subsystem_stats = {
+    "db_pool": lambda: db_pool.stats(), "outbox": lambda: notification_outbox.stats(),
+    "events": lambda: event_dispatcher.stats(), "badges": lambda: badge_engine.stats(),
+    "leaderboard": lambda: leaderboard.stats(), "qr": lambda: qr_cache.stats(),
+    "http_cache": lambda: http_cache.stats(), "refdata": lambda: refdata.stats(),
+    "upvotes": lambda: upvote_counter.stats(), "chat": lambda: chat_writer.stats(),
+    "chat_history": lambda: chat_history.stats(), "presence": lambda: presence.stats(),
+    "change_feed": lambda: change_feed.stats(), "sql": lambda: sql_instrumentation.stats(),
+}
+for name, stats in subsystem_stats.items():
+    metrics.register(name, stats)
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Prometheus scrape endpoint (this worker's metrics)"""
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+@app.route("/admin/stats", methods=["GET"])
+def get_admin_stats():
+    """This worker's subsystem counters as JSON, all or ?name=<subsystem> (sql also takes ?limit=, ?sort=)"""
+    name = request.args.get("name")
+    try:
+        if name is None:
+            return jsonify({subsystem: stats() for subsystem, stats in subsystem_stats.items()})
+        if name not in subsystem_stats:
+            raise ValueError(f"name must be one of: {', '.join(subsystem_stats)}")
+        if name == "sql":
+            limit = parse_limit(request.args.get('limit'))
+            return jsonify(sql_instrumentation.stats(limit, request.args.get('sort', 'total_ms')))
+        return jsonify(subsystem_stats[name]())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route("/qr/<int:complaint_id>")
 def generate_qr(complaint_id):
-    """Generate QR code for complaint tracking"""
+    """Generate QR code for complaint tracking (?format=png or svg)"""
     try:
         # Create tracking URL
         tracking_url = request.url_root + f"track/{complaint_id}"
-        
-        # Generate QR code
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(tracking_url)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Save to BytesIO
-        img_io = BytesIO()
-        img.save(img_io, 'PNG')
-        img_io.seek(0)
-        
-        return send_file(img_io, mimetype='image/png')
+        fmt = request.args.get("format", "png")
+
+        # The image only depends on the URL, so revalidation needs no rendering
+        etag = qr_cache.etag(tracking_url, fmt)
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(qr_cache.render(tracking_url, fmt), mimetype=QR_FORMATS[fmt])
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/qr/sheet", methods=["GET", "POST"])
+def generate_qr_sheet():
+    """Printable PDF sheet of tracking QR codes (ids=1,2,5-9 or JSON {"ids": [...]})"""
+    try:
+        data = request.get_json(silent=True) or {}
+        ids = parse_sheet_ids(request.args.get("ids", ""), data.get("ids") or [])
+        columns = min(max(int(request.args.get("columns", data.get("columns", 4))), 1), 8)
+        rows = min(max(int(request.args.get("rows", data.get("rows", 5))), 1), 10)
+
+        pdf = qr_cache.sheet([(request.url_root + f"track/{complaint_id}", f"Complaint #{complaint_id}")
+                              for complaint_id in ids],
+                             title=request.args.get("title", data.get("title")), columns=columns, rows=rows)
+        return send_file(BytesIO(pdf), mimetype='application/pdf', as_attachment=True,
+                         download_name=f'complaint_qr_codes_{datetime.now().strftime("%Y%m%d")}.pdf')
+    except ValueError as e:
+        return jsonify({"error": f"Invalid complaint ids: {e}"}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -702,28 +1163,54 @@ def track_complaint(complaint_id):
 
 @app.route("/export/excel")
 def export_excel():
-    """Export complaints to Excel"""
+    """Export complaints to Excel (accepts the /get_complaints filters: status, priority, type, search)"""
     try:
+        where, params = build_filters(request.args)
+
+        # Rows are streamed into a write-only workbook spooled to a temp file
         with get_db_connection() as conn:
-            df = pd.read_sql("""
-                SELECT id, title, type, status, priority, student_name, email, 
-                       submitted_at, resolved_at, rating
-                FROM Complaints
-                ORDER BY submitted_at DESC
-            """, conn)
-        
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Complaints')
-        
-        output.seek(0)
-        return send_file(output, 
-                        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                        as_attachment=True,
-                        download_name=f'complaints_{datetime.now().strftime("%Y%m%d")}.xlsx')
+            path = spool_excel(conn.cursor(), where, params, os.getenv("EXPORT_TMP_DIR"))
+
+        response = send_file(path,
+                             mimetype=EXCEL_MIMETYPE,
+                             as_attachment=True,
+                             download_name=f'complaints_{datetime.now().strftime("%Y%m%d")}.xlsx')
+        response.call_on_close(lambda: os.remove(path))
+        return response
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/export/stream")
+def export_stream():
+    """Stream complaints as CSV or NDJSON for bulk pulls.
+
+    Query params: format (ndjson|csv), from/to (submitted_at range), status,
+    priority, type, search, include (comments,activity), gzip (0 to disable).
+    """
+    try:
+        fmt = request.args.get('format', 'ndjson').lower()
+        include = [name.strip() for name in request.args.get('include', '').split(',') if name.strip()]
+        where, params = build_filters(request.args)
+        date_predicate, date_params = date_range_filter(request.args)
+        where += date_predicate
+        params += date_params
+        chunks = iter_export(get_db_connection, where, params, fmt, include,
+                             int(os.getenv("EXPORT_CHUNK_SIZE", "1000")))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    headers = {
+        "Content-Disposition": f'attachment; filename=complaints_{datetime.now().strftime("%Y%m%d")}.{fmt}',
+        "Cache-Control": "no-store",
+        "X-Accel-Buffering": "no",
+    }
+    body = (chunk.encode("utf-8") for chunk in chunks)
+    if request.args.get('gzip', '1') != '0' and 'gzip' in request.headers.get('Accept-Encoding', ''):
+        body = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+    return Response(stream_with_context(body), mimetype=STREAM_FORMATS[fmt], headers=headers)
+
 @app.route("/export/pdf")
 def export_pdf():
     """Export complaints summary to PDF"""
@@ -772,39 +1259,75 @@ def export_pdf():
 @socketio.on('join_complaint')
 def on_join(data):
     complaint_id = data['complaint_id']
-    join_room(f'complaint_{complaint_id}')
+    join_room(complaint_room(complaint_id))
     emit('joined', {'complaint_id': complaint_id})
+    presence.join(request.sid, complaint_id)
+    try:
+        messages, cursor = chat_history.recent(complaint_id, get_db_connection)
+    except Exception as e:
+        logger.warning("Could not load chat history for complaint %s: %s", complaint_id, e)
+        return
+    # Oldest first; older pages come from /chat/<id>?cursor=...
+    emit('chat_history', {'complaint_id': complaint_id, 'messages': messages, 'cursor': cursor})
+
+@socketio.on('leave_complaint')
+def on_leave(data):
+    leave_room(complaint_room(data['complaint_id']))
+    presence.leave(request.sid, data['complaint_id'])
+
+@socketio.on('disconnect')
+def on_disconnect(*args):
+    presence.disconnect(request.sid)
+
+@socketio.on('join_role')
+def on_join_role(data):
+    try:
+        join_room(role_room(data.get('role')))
+    except ValueError as e:
+        emit('error', {'message': str(e)})
+
+@socketio.on('join_user')
+def on_join_user(data):
+    email = (data.get('email') or '').strip()
+    if email:
+        join_room(user_room(email))
 
 @socketio.on('send_message')
 def handle_message(data):
-    complaint_id = data['complaint_id']
+    try:
+        complaint_id = int(data['complaint_id'])
+    except (TypeError, ValueError):
+        emit('error', {'message': 'complaint_id must be a complaint id'})
+        return
+    try:
+        if not chat_history.exists(complaint_id, get_db_connection):
+            emit('error', {'message': 'Complaint not found'})
+            return
+    except Exception as e:
+        # The writer retries until the database is back and drops the message if the complaint is unknown
+        logger.warning("Could not check complaint %s before saving chat: %s", complaint_id, e)
     sender_name = data['sender_name']
     sender_type = data['sender_type']
     message = data['message']
     
+    sent_at = datetime.now()
+    
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO ChatMessages (complaint_id, sender_name, sender_type, message)
-                VALUES (?, ?, ?, ?)
-            """, (complaint_id, sender_name, sender_type, message))
-            conn.commit()
-        
-        emit('new_message', {
-            'sender_name': sender_name,
-            'sender_type': sender_type,
-            'message': message,
-            'timestamp': datetime.now().strftime('%H:%M:%S')
-        }, room=f'complaint_{complaint_id}')
-    except Exception as e:
+        # Saved in the background; blocks briefly and refuses the message if the writer is backed up
+        chat_writer.write(complaint_id, sender_name, sender_type, message, sent_at)
+    except ChatQueueFull as e:
         emit('error', {'message': str(e)})
+        return
+    
+    presence.stop_typing(request.sid, complaint_id)
+    payload = serialize_message(sender_name, sender_type, message, sent_at)
+    chat_history.add(complaint_id, payload, sent_at)
+    emit('new_message', payload, room=f'complaint_{complaint_id}')
 
 @socketio.on('typing')
 def handle_typing(data):
-    complaint_id = data['complaint_id']
-    user_name = data['user_name']
-    emit('user_typing', {'user_name': user_name}, room=f'complaint_{complaint_id}', include_self=False)
+    # Sent per keystroke; the room only hears when the user starts or stops typing
+    presence.typing(request.sid, data['complaint_id'], data['user_name'], data.get('typing', True))
 
 if __name__ == "__main__":
     socketio.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", 5000)), debug=True, allow_unsafe_werkzeug=True)
@@ -0,0 +1,194 @@
+"""Event-driven badge awarding from UserProfiles counters"""
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Badges.requirement_type -> UserProfiles counter it is measured against
+REQUIREMENT_COLUMNS = {
+    "complaints_submitted": "total_complaints",
+    "complaints_resolved": "resolved_complaints",
+    "quick_resolutions": "quick_resolutions",
+    "points": "points",
+}
+
+QUICK_RESOLUTION_HOURS = 24
+
+
+def quick_resolution(submitted_at="submitted_at", resolved_at="resolved_at"):
+    """SQL predicate for a complaint resolved less than QUICK_RESOLUTION_HOURS after submission.
+
+    The one definition used when a complaint is resolved and when counts are
+    recomputed, so a backfill agrees with the live counters (DATEDIFF(hour)
+    would count hour boundaries crossed rather than elapsed time).
+    """
+    return f"DATEADD(hour, {QUICK_RESOLUTION_HOURS}, {submitted_at}) > {resolved_at}"
+
+
+# Recount quick_resolutions from history (the column starts at 0 for existing users)
+RECOUNT_QUICK_RESOLUTIONS_SQL = f"""
+UPDATE p
+SET quick_resolutions = COALESCE(q.quick, 0)
+FROM UserProfiles p
+LEFT JOIN (
+    SELECT email, COUNT(*) AS quick
+    FROM Complaints
+    WHERE status = 'Resolved' AND resolved_at IS NOT NULL
+      AND {quick_resolution()}
+    GROUP BY email
+) q ON q.email = p.email
+"""
+
+BADGES_QUERY = "SELECT id, name, description, icon, requirement_type, requirement_value FROM Badges"
+
+
+def _qualifies_predicate(badges):
+    """SQL matching a Badges row b against a UserProfiles row p"""
+    types = sorted({requirement_type for _, requirement_type, _ in badges})
+    return " OR ".join(
+        f"(b.requirement_type = '{requirement_type}' AND p.{REQUIREMENT_COLUMNS[requirement_type]} >= b.requirement_value)"
+        for requirement_type in types)
+
+
+class BadgeEngine:
+    """Awards badges from a bounded queue of users with changed counters.
+
+    submit(email) is cheap and never blocks the request: the email is queued
+    (duplicates already pending are dropped) and one of a fixed number of
+    workers evaluates it. Evaluation reads the user's counters and earned
+    badges in one query and compares them with the cached catalogue; only
+    when a new badge qualifies does it run a single set-based INSERT ...
+    OUTPUT. badges() returns the catalogue (rows of BADGES_QUERY as dicts,
+    normally from the reference-data cache); on_award(email, badge_ids) is
+    called for newly earned badges.
+    A full queue drops the event; the counters live in UserProfiles, so the
+    user's next event (or backfill()) still awards the badge.
+    """
+
+    def __init__(self, get_connection, badges, on_award=None, workers=2, max_queue=1000):
+        self.get_connection = get_connection
+        self.badges = badges
+        self.on_award = on_award
+        self._unsupported = set()
+        self.workers = max(1, workers)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._threads = []
+        self._counters = {"queued": 0, "dropped": 0, "evaluated": 0, "awarded": 0, "errors": 0}
+
+    def catalogue(self):
+        """[(id, requirement_type, requirement_value)] for supported requirement types"""
+        catalogue = []
+        for badge in self.badges():
+            if badge["requirement_type"] in REQUIREMENT_COLUMNS:
+                catalogue.append((badge["id"], badge["requirement_type"], badge["requirement_value"]))
+            elif badge["id"] not in self._unsupported:
+                self._unsupported.add(badge["id"])
+                logger.warning("Badge %s has unsupported requirement type %r", badge["id"], badge["requirement_type"])
+        return catalogue
+
+    def start(self):
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"badge-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, email):
+        """Queue a user whose counters changed"""
+        if not email:
+            return
+        with self._pending_lock:
+            if email in self._pending:
+                return
+            try:
+                self._queue.put_nowait(email)
+            except queue.Full:
+                self._counters["dropped"] += 1
+                return
+            self._pending.add(email)
+            self._counters["queued"] += 1
+
+    def _run(self):
+        while True:
+            email = self._queue.get()
+            with self._pending_lock:
+                self._pending.discard(email)
+            try:
+                awarded = self.evaluate(email)
+                if awarded and self.on_award:
+                    self.on_award(email, awarded)
+            except Exception as e:
+                self._counters["errors"] += 1
+                logger.warning("Could not evaluate badges for a user: %s", e)
+
+    def evaluate(self, email):
+        """Award every badge the user now qualifies for; returns the new badge ids"""
+        badges = self.catalogue()
+        self._counters["evaluated"] += 1
+        if not badges:
+            return []
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT p.total_complaints, p.resolved_complaints, p.quick_resolutions, p.points,
+                       (SELECT STRING_AGG(CAST(ub.badge_id AS VARCHAR(12)), ',')
+                        FROM UserBadges ub WHERE ub.user_email = p.email) AS earned
+                FROM UserProfiles p
+                WHERE p.email = ?
+            """, (email,))
+            profile = cursor.fetchone()
+            if profile is None:
+                return []
+            earned = {int(badge_id) for badge_id in (profile.earned or "").split(",") if badge_id}
+            candidates = [badge_id for badge_id, requirement_type, requirement_value in badges
+                          if badge_id not in earned
+                          and (getattr(profile, REQUIREMENT_COLUMNS[requirement_type]) or 0) >= requirement_value]
+            if not candidates:
+                return []
+            cursor.execute(f"""
+                INSERT INTO UserBadges (user_email, badge_id)
+                OUTPUT INSERTED.badge_id
+                SELECT ?, b.id
+                FROM Badges b
+                WHERE b.id IN ({', '.join('?' * len(candidates))})
+                  AND NOT EXISTS (SELECT 1 FROM UserBadges ub WITH (UPDLOCK, HOLDLOCK)
+                                  WHERE ub.user_email = ? AND ub.badge_id = b.id)
+            """, [email] + candidates + [email])
+            awarded = [row.badge_id for row in cursor.fetchall()]
+        self._counters["awarded"] += len(awarded)
+        return awarded
+
+    def backfill(self, recount=True):
+        """Award all historical badges in one set-based statement; returns {badge_id: count}"""
+        badges = self.catalogue()
+        if not badges:
+            return {}
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            if recount:
+                cursor.execute(RECOUNT_QUICK_RESOLUTIONS_SQL)
+            cursor.execute(f"""
+                INSERT INTO UserBadges (user_email, badge_id)
+                OUTPUT INSERTED.badge_id
+                SELECT p.email, b.id
+                FROM UserProfiles p
+                JOIN Badges b ON ({_qualifies_predicate(badges)})
+                WHERE p.email IS NOT NULL
+                  AND NOT EXISTS (SELECT 1 FROM UserBadges ub WITH (UPDLOCK, HOLDLOCK)
+                                  WHERE ub.user_email = p.email AND ub.badge_id = b.id)
+            """)
+            counts = {}
+            for row in cursor.fetchall():
+                counts[row.badge_id] = counts.get(row.badge_id, 0) + 1
+        self._counters["awarded"] += sum(counts.values())
+        return counts
+
+    def stats(self):
+        stats = dict(self._counters)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["workers"] = len(self._threads)
+        return stats
@@ -0,0 +1,350 @@
+"""Benchmark: throughput and latency of the app's main paths, without Azure.
+
+The app is imported in-process with every Azure setting replaced by the
+local stand-ins in local_stack.py: a local SQL Server for Azure SQL, the
+filesystem blob store and a Logic App receiver. Each workload is driven by
+--threads closed-loop clients (Flask and Flask-SocketIO test clients, so
+no HTTP server is measured) for --duration seconds after --warmup seconds.
+Random choices are seeded, so two runs on the same dataset issue the same
+requests. The report gives throughput, latency percentiles, errors and the
+SQL statements and database time per operation (from the app's SQL
+instrumentation), and is written as JSON together with the commit it was
+measured on; --compare prints the change against an earlier report.
+
+    python benchmarks/datagen.py --complaints 100000 --reset
+    python benchmarks/bench_app.py --json before.json
+    git checkout my-branch
+    python benchmarks/bench_app.py --json after.json --compare before.json
+
+Workloads: submit, get_complaints, analytics, comments, upvotes, chat
+(Socket.IO join_complaint and send_message). Workloads whose routes the
+chosen --app does not have are skipped.
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from datagen import SUBJECTS, TYPES, student
+from local_stack import DEFAULT_CONN_STR, ROOT, LogicAppReceiver, app_env, create_schema, is_azure
+
+PERCENTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Context:
+    """Per-thread clients and state for the workloads"""
+
+    def __init__(self, module, index, seed, max_id):
+        self.module = module
+        self.index = index
+        self.rng = random.Random(seed * 1000 + index)
+        self.client = module.app.test_client()
+        self.max_id = max_id
+        self.sequence = 0
+        self.next_cursor = None
+        self.sio = None
+        self.room = None
+
+    def complaint_id(self):
+        return self.rng.randint(1, self.max_id)
+
+    def socketio_client(self):
+        if self.sio is None:
+            self.sio = self.module.socketio.test_client(self.module.app, flask_test_client=self.client)
+        return self.sio
+
+
+class OperationFailed(Exception):
+    """The app answered with an error"""
+
+
+def _check(response):
+    if response.status_code >= 400:
+        raise OperationFailed(f"HTTP {response.status_code}: {response.get_data(as_text=True)[:200]}")
+    return response
+
+
+def submit(ctx):
+    type_ = ctx.rng.choice(TYPES)
+    name, email = student(ctx.rng.randrange(1000))
+    title = ctx.rng.choice(SUBJECTS[type_])
+    _check(ctx.client.post("/submit", data={
+        "title": title, "description": f"{title}, reported by the benchmark", "type": type_,
+        "student_name": name, "email": email,
+    }))
+
+
+def get_complaints(ctx):
+    if ctx.next_cursor and ctx.rng.random() < 0.3:
+        query = {"limit": 20, "cursor": ctx.next_cursor}
+    else:
+        query = {"limit": 20}
+        choice = ctx.rng.randrange(4)
+        if choice == 1:
+            query["status"] = ctx.rng.choice(("Submitted", "Assigned", "Resolved"))
+        elif choice == 2:
+            query["priority"] = ctx.rng.choice(("High", "Medium", "Low"))
+        elif choice == 3:
+            query["type"] = ctx.rng.choice(("Academic", "Hostel", "Infrastructure"))
+    response = _check(ctx.client.get("/get_complaints", query_string=query))
+    ctx.next_cursor = (response.get_json() or {}).get("next_cursor")
+
+
+def analytics(ctx):
+    _check(ctx.client.get("/analytics"))
+
+
+def comments(ctx):
+    complaint_id = ctx.complaint_id()
+    if ctx.rng.random() < 0.2:
+        _check(ctx.client.post(f"/comments/{complaint_id}", json={
+            "user_name": "Benchmark", "user_type": "student", "comment_text": "Any update on this?"}))
+    else:
+        _check(ctx.client.get(f"/comments/{complaint_id}"))
+
+
+def upvotes(ctx):
+    ctx.sequence += 1
+    # A new voter each time, so every vote is accepted and counted
+    _check(ctx.client.post("/upvote_complaint", json={
+        "id": ctx.complaint_id(), "email": f"bench{ctx.index}-{ctx.sequence}@example.edu"}))
+
+
+def chat(ctx):
+    sio = ctx.socketio_client()
+    ctx.sequence += 1
+    if ctx.room is None or ctx.sequence % 50 == 0:
+        if ctx.room is not None:
+            sio.emit("leave_complaint", {"complaint_id": ctx.room})
+        ctx.room = ctx.complaint_id()
+        sio.emit("join_complaint", {"complaint_id": ctx.room})
+    sio.emit("send_message", {"complaint_id": ctx.room, "sender_name": f"Bench {ctx.index}",
+                              "sender_type": "student", "message": f"Message {ctx.sequence}"})
+    for packet in sio.get_received():
+        if packet["name"] == "error":
+            raise OperationFailed(f"error event: {packet['args']}")
+
+
+# name -> (operation, routes it needs)
+WORKLOADS = {
+    "submit": (submit, ("/submit",)),
+    "get_complaints": (get_complaints, ("/get_complaints",)),
+    "analytics": (analytics, ("/analytics",)),
+    "comments": (comments, ("/comments/<int:complaint_id>",)),
+    "upvotes": (upvotes, ("/upvote_complaint",)),
+    "chat": (chat, ()),
+}
+
+
+def run_workload(operation, contexts, duration, warmup):
+    """Run operation (which raises on failure) from one thread per context until the duration is up"""
+    started = time.monotonic()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+    results = [None] * len(contexts)
+
+    def client(slot, ctx):
+        latencies, errors, total, last_error = [], 0, 0, None
+        while True:
+            now = time.monotonic()
+            if now >= stop_at:
+                break
+            t0 = time.perf_counter()
+            ok = True
+            try:
+                operation(ctx)
+            except Exception as e:
+                ok, last_error = False, f"{type(e).__name__}: {e}"
+            elapsed = (time.perf_counter() - t0) * 1000
+            total += 1
+            if now >= measure_from:
+                latencies.append(elapsed)
+                errors += not ok
+        results[slot] = (latencies, errors, total, last_error)
+
+    threads = [threading.Thread(target=client, args=(slot, ctx), name=f"bench-{slot}")
+               for slot, ctx in enumerate(contexts)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies = sorted(ms for result in results for ms in result[0])
+    errors = sum(result[1] for result in results)
+    last_errors = [result[3] for result in results if result[3]]
+    return latencies, errors, sum(result[2] for result in results), (last_errors[0] if last_errors else None)
+
+
+def summarize(latencies, errors, duration):
+    ops = len(latencies)
+    return {
+        "ops": ops,
+        "errors": errors,
+        "error_rate": round(errors / ops, 4) if ops else None,
+        "throughput_per_s": round(ops / duration, 1),
+        "latency_ms": dict(
+            {"mean": round(statistics.mean(latencies), 2) if latencies else None},
+            **{f"p{int(q * 100)}": round(percentile(latencies, q), 2) if latencies else None for q in PERCENTILES},
+            max=round(latencies[-1], 2) if latencies else None,
+        ),
+    }
+
+
+def _scalar(module, sql):
+    with module.get_db_connection() as conn:
+        return conn.cursor().execute(sql).fetchone()[0]
+
+
+def dataset(module):
+    counts = {}
+    for table in ("Complaints", "Comments", "ChatMessages", "ComplaintUpvotes", "UserProfiles"):
+        counts[table] = _scalar(module, f"SELECT COUNT_BIG(*) FROM {table}")
+    return counts
+
+
+def git_revision():
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    try:
+        return {"commit": git("rev-parse", "HEAD") or None, "dirty": bool(git("status", "--porcelain", "-uno"))}
+    except OSError:
+        return {"commit": None, "dirty": None}
+
+
+def change(new, old):
+    if new is None or not old:
+        return "-"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def print_report(report):
+    print(f"{report['app']}, {report['config']['threads']} threads, {report['config']['duration']}s per workload, "
+          f"{report['dataset'].get('Complaints', '?')} complaints")
+    print(f"{'workload':<16}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}"
+          f"{'sql/op':>8}{'db ms/op':>10}")
+    for name, r in report["workloads"].items():
+        latency = r["latency_ms"]
+        print(f"{name:<16}{r['throughput_per_s']:>10.1f}{latency['p50'] or 0:>10.2f}{latency['p95'] or 0:>10.2f}"
+              f"{latency['p99'] or 0:>10.2f}{r['errors']:>8}{r['sql_per_op'] or 0:>8.1f}{r['db_ms_per_op'] or 0:>10.2f}")
+        if r.get("last_error"):
+            print(f"  last error: {r['last_error']}")
+
+
+def print_comparison(report, baseline):
+    print(f"change vs {(baseline.get('git') or {}).get('commit') or 'baseline'}")
+    print(f"{'workload':<16}{'ops/s':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'sql/op':>10}")
+    for name, r in report["workloads"].items():
+        old = baseline.get("workloads", {}).get(name)
+        if not old:
+            continue
+        print(f"{name:<16}{change(r['throughput_per_s'], old['throughput_per_s']):>10}"
+              + "".join(f"{change(r['latency_ms'][q], old['latency_ms'][q]):>10}" for q in ("p50", "p95", "p99"))
+              + f"{change(r['sql_per_op'], old.get('sql_per_op')):>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conn-str", default=os.getenv("BENCH_SQL_CONN_STRING", DEFAULT_CONN_STR),
+                        help="local SQL Server (default: $BENCH_SQL_CONN_STRING)")
+    parser.add_argument("--app", default="app_enhanced", help="module to benchmark (app_enhanced or app)")
+    parser.add_argument("--workloads", default=",".join(WORKLOADS))
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=20.0, help="measured seconds per workload")
+    parser.add_argument("--warmup", type=float, default=3.0, help="unmeasured seconds before each workload")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--generate", type=int, metavar="N", help="reset the database and load N complaints first")
+    parser.add_argument("--logic-app-latency-ms", type=float, default=50.0,
+                        help="delay of the stand-in Logic App per request")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--compare", help="earlier report (JSON) to compare against")
+    args = parser.parse_args()
+    if is_azure(args.conn_str):
+        sys.exit("Refusing to benchmark against Azure SQL; point --conn-str at a local server")
+    names = [name.strip() for name in args.workloads.split(",") if name.strip()]
+    unknown = [name for name in names if name not in WORKLOADS]
+    if unknown:
+        parser.error(f"unknown workloads: {', '.join(unknown)} (choose from {', '.join(WORKLOADS)})")
+
+    if args.generate:
+        import datagen
+        datagen.load(args.conn_str, args.generate, args.seed, reset=True)
+    else:
+        create_schema(args.conn_str)
+
+    receiver = LogicAppReceiver(latency=args.logic_app_latency_ms / 1000).start()
+    work_dir = tempfile.mkdtemp(prefix="bench_app_")
+    os.environ.update(app_env(args.conn_str, work_dir, receiver.url))
+    sys.path.insert(0, ROOT)
+    module = importlib.import_module(args.app)
+    routes = {rule.rule for rule in module.app.url_map.iter_rules()}
+    instrumentation = getattr(module, "sql_instrumentation", None)
+
+    report = {
+        "app": args.app,
+        "git": git_revision(),
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {"threads": args.threads, "duration": args.duration, "warmup": args.warmup, "seed": args.seed,
+                   "logic_app_latency_ms": args.logic_app_latency_ms},
+        "dataset": dataset(module),
+        "workloads": {},
+    }
+    try:
+        for name in names:
+            operation, needed = WORKLOADS[name]
+            missing = [route for route in needed if route not in routes]
+            if missing:
+                print(f"skipping {name}: {args.app} has no {', '.join(missing)}")
+                continue
+            max_id = _scalar(module, "SELECT COALESCE(MAX(id), 0) FROM Complaints")
+            if not max_id and name != "submit":
+                print(f"skipping {name}: no complaints (run datagen.py or the submit workload first)")
+                continue
+            contexts = [Context(module, index, args.seed, max_id) for index in range(args.threads)]
+            before = instrumentation.stats(0) if instrumentation else None
+            latencies, errors, total, last_error = run_workload(operation, contexts, args.duration, args.warmup)
+            after = instrumentation.stats(0) if instrumentation else None
+            result = summarize(latencies, errors, args.duration)
+            result["sql_per_op"] = (round((after["queries"] - before["queries"]) / total, 2)
+                                    if instrumentation and total else None)
+            result["db_ms_per_op"] = (round((after["total_ms"] - before["total_ms"]) / total, 2)
+                                      if instrumentation and total else None)
+            result["last_error"] = last_error
+            report["workloads"][name] = result
+            print(f"{name}: {result['throughput_per_s']} ops/s, p95 {result['latency_ms']['p95']} ms")
+            for ctx in contexts:
+                if ctx.sio is not None and ctx.sio.is_connected():
+                    ctx.sio.disconnect()
+    finally:
+        report["logic_app"] = receiver.stats()
+        receiver.stop()
+
+    print()
+    print_report(report)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print()
+        print_comparison(report, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
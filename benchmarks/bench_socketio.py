@@ -0,0 +1,194 @@
+"""Load test: Socket.IO connection capacity and fan-out latency by worker count.
+
+For each --workers value the app is started under gunicorn (Azure settings
+blanked, so nothing external is touched), --clients WebSocket clients
+connect through a bounded handshake window, join the admin room and make
+one acknowledged call each under full load. With --message-queue, batches
+are also published through the queue from this process and delivery to
+every client is timed, which exercises cross-worker fan-out.
+
+    pip install "python-socketio[asyncio_client]" gevent
+    python benchmarks/bench_socketio.py --workers 1,2,4 --clients 2000
+    python benchmarks/bench_socketio.py --url http://staging:8000 --clients 5000 \\
+        --message-queue redis://staging:6379/0
+
+Raise the open file limit (ulimit -n) for large client counts.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+import socketio
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def start_server(app, workers, port, async_mode, message_queue):
+    env = dict(os.environ)
+    for name in ("AZURE_SQL_CONN_STRING", "AZURE_STORAGE_CONNECTION_STRING", "LOGIC_APP_WEBHOOK_URL",
+                 "APPINSIGHTS_CONNECTION_STRING"):
+        env[name] = ""
+    env.update({"WEB_CONCURRENCY": str(workers), "PORT": str(port), "SOCKETIO_ASYNC_MODE": async_mode,
+                "SOCKETIO_MESSAGE_QUEUE": message_queue or ""})
+    process = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", app],
+                               cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"{url}/metrics", timeout=2)
+            return process, url
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError("gunicorn exited during startup")
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("server did not start within 60s")
+
+
+class BenchClient:
+    def __init__(self, received):
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.received = received
+
+        @self.sio.on("events")
+        async def on_events(events):
+            now = time.time()
+            for item in events:
+                if item.get("event") == "bench":
+                    self.received.setdefault(item["data"]["seq"], []).append((now - item["data"]["sent"]) * 1000)
+
+
+async def run_clients(url, clients, concurrency, connect_timeout, hold, message_queue, broadcasts):
+    received = {}
+    connected = []
+    connect_ms, ack_ms = [], []
+    failures = 0
+    handshakes = asyncio.Semaphore(concurrency)
+
+    async def connect_one():
+        nonlocal failures
+        client = BenchClient(received)
+        async with handshakes:
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(client.sio.connect(url, transports=["websocket"], wait_timeout=connect_timeout),
+                                       connect_timeout)
+            except Exception:
+                failures += 1
+                await client.sio.shutdown()
+                return
+            connect_ms.append((time.perf_counter() - started) * 1000)
+        connected.append(client)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(connect_one() for _ in range(clients)))
+    ramp_s = time.perf_counter() - started
+
+    async def call_one(client):
+        t0 = time.perf_counter()
+        try:
+            await client.sio.call("join_role", {"role": "admin"}, timeout=connect_timeout)
+            ack_ms.append((time.perf_counter() - t0) * 1000)
+        except Exception:
+            pass
+    await asyncio.gather(*(call_one(client) for client in connected))
+
+    if message_queue and broadcasts:
+        from realtime import create_emitter
+        emitter = create_emitter(message_queue)
+        loop = asyncio.get_running_loop()
+        for seq in range(broadcasts):
+            payload = [{"event": "bench", "data": {"seq": seq, "sent": time.time()}}]
+            await loop.run_in_executor(None, lambda: emitter.emit("events", payload, to="role_admin"))
+            await asyncio.sleep(0.5)
+    await asyncio.sleep(hold)
+
+    still_connected = sum(1 for client in connected if client.sio.connected)
+    await asyncio.gather(*(asyncio.wait_for(client.sio.disconnect(), connect_timeout) for client in connected),
+                         return_exceptions=True)
+
+    deliveries = [ms for latencies in received.values() for ms in latencies]
+    expected = len(ack_ms) * broadcasts if message_queue else 0
+    return {
+        "clients": clients,
+        "connected": len(connected),
+        "failed": failures,
+        "held": still_connected,
+        "ramp_s": round(ramp_s, 2),
+        "connect_p50_ms": percentile(connect_ms, 0.5),
+        "connect_p95_ms": percentile(connect_ms, 0.95),
+        "ack_p50_ms": percentile(ack_ms, 0.5),
+        "ack_p95_ms": percentile(ack_ms, 0.95),
+        "fanout_delivered": len(deliveries),
+        "fanout_expected": expected,
+        "fanout_p50_ms": percentile(deliveries, 0.5),
+        "fanout_p95_ms": percentile(deliveries, 0.95),
+    }
+
+
+def fmt(value):
+    return "-" if value is None else f"{value:.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated gunicorn worker counts to compare")
+    parser.add_argument("--url", help="test an already running deployment instead of spawning gunicorn")
+    parser.add_argument("--app", default="app:app")
+    parser.add_argument("--async-mode", default="gevent", choices=("threading", "eventlet", "gevent"))
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100, help="simultaneous handshakes")
+    parser.add_argument("--connect-timeout", type=float, default=10.0)
+    parser.add_argument("--hold", type=float, default=5.0, help="seconds to hold all connections open")
+    parser.add_argument("--message-queue", help="broker URL for the fan-out test (e.g. redis://localhost:6379/0)")
+    parser.add_argument("--broadcasts", type=int, default=10)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    scenarios = [("url", None)] if args.url else [("workers", int(w)) for w in args.workers.split(",")]
+    results = []
+    for kind, workers in scenarios:
+        process = None
+        url = args.url
+        if kind == "workers":
+            process, url = start_server(args.app, workers, args.port, args.async_mode, args.message_queue)
+        try:
+            result = asyncio.run(run_clients(url, args.clients, args.concurrency, args.connect_timeout,
+                                             args.hold, args.message_queue, args.broadcasts))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=30)
+        result["workers"] = workers
+        results.append(result)
+
+    print(f"{args.clients} WebSocket clients, async mode {args.async_mode}")
+    print(f"{'workers':>8}{'connected':>11}{'failed':>8}{'held':>7}{'conn p95':>10}{'ack p50':>9}{'ack p95':>9}"
+          f"{'fanout':>13}{'fan p95':>9}")
+    for r in results:
+        fanout = f"{r['fanout_delivered']}/{r['fanout_expected']}" if r["fanout_expected"] else "-"
+        print(f"{r['workers'] or '-':>8}{r['connected']:>11}{r['failed']:>8}{r['held']:>7}"
+              f"{fmt(r['connect_p95_ms']):>10}{fmt(r['ack_p50_ms']):>9}{fmt(r['ack_p95_ms']):>9}"
+              f"{fanout:>13}{fmt(r['fanout_p95_ms']):>9}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
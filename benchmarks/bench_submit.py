@@ -0,0 +1,135 @@
+"""Benchmark: legacy multi-round-trip complaint submission vs the single batch.
+
+Both paths write to the local SQL Server from local_stack.py (never Azure
+SQL). The legacy path issues the statements submit_complaint used to:
+separate INSERTs, SELECT @@IDENTITY and three commits. The batched path
+calls complaint_store.insert_complaint itself. Round trips (executes and
+commits) are counted on the connection, and latency is what the server
+actually takes. A local server makes round trips nearly free, so the
+latency gap grows with the network distance to the database; point
+--conn-str at a (non-Azure) server on another host to measure it.
+
+    python benchmarks/bench_submit.py --iterations 500 --reset
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from local_stack import DEFAULT_CONN_STR, ROOT, create_schema, is_azure
+
+sys.path.insert(0, ROOT)
+from complaint_store import insert_complaint  # noqa: E402
+
+
+class CountingConnection:
+    """pyodbc connection wrapper that counts the calls which cross the network"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.round_trips = 0
+
+    def cursor(self):
+        return CountingCursor(self, self.conn.cursor())
+
+    def commit(self):
+        self.round_trips += 1
+        self.conn.commit()
+
+
+class CountingCursor:
+    def __init__(self, connection, cursor):
+        self.connection = connection
+        self.cursor = cursor
+
+    def execute(self, sql, params=()):
+        self.connection.round_trips += 1
+        self.cursor.execute(sql, params)
+        return self
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+
+def submit_legacy(conn, title, description, type_, student_name, email, priority, due_date):
+    """The original path: separate statements, commits and SELECT @@IDENTITY"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO Complaints (title, description, type, file_url, status, student_name, email, priority, due_date)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (title, description, type_, None, "Submitted", student_name, email, priority, due_date))
+    conn.commit()
+
+    cursor.execute("SELECT @@IDENTITY AS id")
+    complaint_id = cursor.fetchone().id
+
+    cursor.execute("""
+        INSERT INTO ActivityLog (complaint_id, action, performed_by, details)
+        VALUES (?, ?, ?, ?)
+    """, (complaint_id, "Created", student_name, f"Complaint submitted with {priority} priority"))
+    conn.commit()
+
+    cursor.execute("""
+        IF EXISTS (SELECT 1 FROM UserProfiles WHERE email = ?)
+            UPDATE UserProfiles SET total_complaints = total_complaints + 1, points = points + 10 WHERE email = ?
+        ELSE
+            INSERT INTO UserProfiles (email, name, total_complaints, points) VALUES (?, ?, 1, 10)
+    """, (email, email, email, student_name))
+    conn.commit()
+    return complaint_id
+
+
+def submit_batched(conn, title, description, type_, student_name, email, priority, due_date):
+    """The app's path: complaint_store.insert_complaint, then one commit"""
+    submitted = insert_complaint(conn.cursor(), title, description, type_, None, student_name, email,
+                                 priority, due_date)
+    conn.commit()
+    return submitted.id
+
+
+def run(conn_str, path, iterations):
+    import pyodbc
+    with pyodbc.connect(conn_str) as raw:
+        conn = CountingConnection(raw)
+        latencies = []
+        due_date = datetime.now() + timedelta(days=3)
+        for i in range(iterations):
+            started = time.perf_counter()
+            path(conn, f"Benchmark complaint {i}", "Water leaking in hostel room " * 5, "Hostel",
+                 f"Bench Student {i % 50}", f"bench{i % 50}@example.edu", "Medium", due_date)
+            latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return {
+        "round_trips_per_submit": conn.round_trips / iterations,
+        "mean_ms": statistics.mean(latencies),
+        "p50_ms": latencies[len(latencies) // 2],
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "throughput_per_s": iterations / (sum(latencies) / 1000),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conn-str", default=os.getenv("BENCH_SQL_CONN_STRING", DEFAULT_CONN_STR),
+                        help="local SQL Server (default: $BENCH_SQL_CONN_STRING)")
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--reset", action="store_true", help="drop and recreate every table first")
+    args = parser.parse_args()
+    if is_azure(args.conn_str):
+        sys.exit("Refusing to write benchmark rows to Azure SQL; point --conn-str at a local server")
+
+    create_schema(args.conn_str, reset=args.reset)
+    results = {name: run(args.conn_str, path, args.iterations)
+               for name, path in (("legacy", submit_legacy), ("batched", submit_batched))}
+
+    print(f"{args.iterations} submissions per path")
+    print(f"{'path':<10}{'round trips':>13}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'submits/s':>12}")
+    for name, r in results.items():
+        print(f"{name:<10}{r['round_trips_per_submit']:>13.1f}{r['mean_ms']:>10.2f}{r['p50_ms']:>10.2f}"
+              f"{r['p95_ms']:>10.2f}{r['throughput_per_s']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
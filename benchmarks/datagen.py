@@ -0,0 +1,190 @@
+"""Load a reproducible complaint dataset into the local benchmark database.
+
+The same --seed and --complaints always produce the same rows (timestamps
+are relative to midnight today), so runs on different commits read the
+same data. Complaints come with their activity log entries, comments, chat
+messages and upvotes, and user profiles are recomputed from them. Rows are
+bulk-inserted with fast_executemany in --chunk-size batches, which loads
+1M complaints in minutes on a local SQL Server.
+
+    python benchmarks/datagen.py --complaints 100000 --seed 1 --reset
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from local_stack import DEFAULT_CONN_STR, ROOT, create_schema, is_azure
+
+sys.path.insert(0, ROOT)
+from badge_engine import quick_resolution  # noqa: E402
+
+TYPES = ("Academic", "Hostel", "Infrastructure", "Cafeteria", "Transport", "Library", "Other")
+STATUSES = (("Submitted", 35), ("Assigned", 25), ("In Progress", 15), ("Resolved", 25))
+PRIORITIES = (("High", 20), ("Medium", 50), ("Low", 30))
+DUE_DAYS = {"High": 1, "Medium": 3, "Low": 7}
+SUBJECTS = {
+    "Academic": ("Exam timetable clash", "Missing grades", "Lecture recording unavailable", "Lab not open"),
+    "Hostel": ("Water leaking in room", "No hot water", "Broken window", "Wi-Fi down on floor"),
+    "Infrastructure": ("Lift out of order", "Street light broken", "Classroom projector faulty", "Power cut"),
+    "Cafeteria": ("Food quality", "Long queues at lunch", "Card payment failing", "Hygiene concern"),
+    "Transport": ("Bus late every morning", "Shuttle overcrowded", "Parking permit issue", "Route changed"),
+    "Library": ("Books not returned to shelves", "Study rooms overbooked", "Printer jammed", "Noise at night"),
+    "Other": ("Lost ID card", "Event registration", "Suggestion for campus", "Website error"),
+}
+URGENCY = ("", "", "", "Please look into this soon.", "This is urgent.", "It needs attention immediately.")
+COMMENTS = ("We are looking into it.", "Any update on this?", "Still happening today.", "Thanks for the quick fix.")
+CHAT = ("Hello, is anyone there?", "Can you share a photo?", "Uploaded it now.", "A technician is on the way.",
+        "Is it fixed on your side?", "Yes, all good now.")
+
+COMPLAINT_SQL = """
+    INSERT INTO Complaints (id, title, description, type, file_url, status, student_name, email, assigned_to,
+                            priority, due_date, submitted_at, resolved_at, rating, upvotes)
+    VALUES (?, ?, ?, ?, NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+ACTIVITY_SQL = ("INSERT INTO ActivityLog (complaint_id, action, performed_by, details, created_at) "
+                "VALUES (?, ?, ?, ?, ?)")
+COMMENT_SQL = ("INSERT INTO Comments (complaint_id, user_name, user_type, comment_text, created_at) "
+               "VALUES (?, ?, ?, ?, ?)")
+CHAT_SQL = ("INSERT INTO ChatMessages (complaint_id, sender_name, sender_type, message, is_read, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)")
+UPVOTE_SQL = "INSERT INTO ComplaintUpvotes (complaint_id, voter, created_at) VALUES (?, ?, ?)"
+
+# Profiles are derived from the complaints, as the app's write paths would have left them
+PROFILES_SQL = f"""
+MERGE UserProfiles AS p
+USING (
+    SELECT email, MAX(student_name) AS name, COUNT(*) AS total,
+           SUM(CASE WHEN status = 'Resolved' THEN 1 ELSE 0 END) AS resolved,
+           SUM(CASE WHEN status = 'Resolved' AND {quick_resolution()} THEN 1 ELSE 0 END) AS quick
+    FROM Complaints
+    WHERE email IS NOT NULL
+    GROUP BY email
+) AS s ON p.email = s.email
+WHEN MATCHED THEN UPDATE SET total_complaints = s.total, resolved_complaints = s.resolved,
+    quick_resolutions = s.quick, points = s.total * 10 + s.resolved * 50
+WHEN NOT MATCHED THEN INSERT (email, name, total_complaints, resolved_complaints, quick_resolutions, points)
+    VALUES (s.email, s.name, s.total, s.resolved, s.quick, s.total * 10 + s.resolved * 50);
+"""
+
+
+def _weighted(rng, choices):
+    return rng.choices([value for value, _ in choices], [weight for _, weight in choices])[0]
+
+
+def _count(rng, mean):
+    """Non-negative integer with the given mean (geometric, so a few rows get many)"""
+    if mean <= 0:
+        return 0
+    return int(rng.expovariate(1 / mean) + 0.5)
+
+
+def student(index):
+    return f"Student {index}", f"student{index}@example.edu"
+
+
+def generate(count, seed=1, first_id=1, students=None, days=365, comments=1.0, chat=2.0, upvotes=2.0,
+             anchor=None):
+    """Yield (table, row) pairs for count complaints, deterministic for a given seed and anchor"""
+    rng = random.Random(seed)
+    students = students or max(1, count // 5)
+    anchor = anchor or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    for complaint_id in range(first_id, first_id + count):
+        type_ = rng.choice(TYPES)
+        status = _weighted(rng, STATUSES)
+        priority = _weighted(rng, PRIORITIES)
+        name, email = student(rng.randrange(students))
+        submitted_at = anchor - timedelta(seconds=rng.randrange(days * 86400))
+        resolved_at = (submitted_at + timedelta(hours=rng.expovariate(1 / 48))) if status == "Resolved" else None
+        title = f"{rng.choice(SUBJECTS[type_])} #{complaint_id}"
+        description = f"{title}. Reported by {name}. {rng.choice(URGENCY)}".strip()
+        votes = _count(rng, upvotes)
+        yield "Complaints", (
+            complaint_id, title, description, type_, status, name, email,
+            "admin@example.edu" if status != "Submitted" else None, priority,
+            submitted_at + timedelta(days=DUE_DAYS[priority]), submitted_at, resolved_at,
+            rng.randint(1, 5) if status == "Resolved" and rng.random() < 0.6 else None, votes,
+        )
+        yield "ActivityLog", (complaint_id, "Created", name, f"Complaint submitted with {priority} priority",
+                              submitted_at)
+        for n in range(_count(rng, comments)):
+            admin = n % 2 == 0
+            yield "Comments", (complaint_id, "Admin" if admin else name, "admin" if admin else "student",
+                               rng.choice(COMMENTS), submitted_at + timedelta(minutes=30 * (n + 1)))
+        for n in range(_count(rng, chat)):
+            admin = n % 2 == 1
+            yield "ChatMessages", (complaint_id, "Admin" if admin else name, "admin" if admin else "student",
+                                   rng.choice(CHAT), 1, submitted_at + timedelta(minutes=5 * (n + 1)))
+        for voter in sorted(rng.sample(range(students), min(votes, students))):
+            yield "ComplaintUpvotes", (complaint_id, student(voter)[1], submitted_at + timedelta(hours=1))
+
+
+def load(conn_str, count, seed=1, chunk_size=5000, reset=False, **options):
+    """Insert a generated dataset; returns rows inserted per table"""
+    import pyodbc
+    create_schema(conn_str, reset=reset)
+    statements = {"Complaints": COMPLAINT_SQL, "ActivityLog": ACTIVITY_SQL, "Comments": COMMENT_SQL,
+                  "ChatMessages": CHAT_SQL, "ComplaintUpvotes": UPVOTE_SQL}
+    inserted = dict.fromkeys(statements, 0)
+    with pyodbc.connect(conn_str) as conn:
+        cursor = conn.cursor()
+        cursor.fast_executemany = True
+        first_id = cursor.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM Complaints").fetchone()[0]
+        pending = {table: [] for table in statements}
+
+        def flush(table):
+            rows = pending[table]
+            if not rows:
+                return
+            if table == "Complaints":
+                cursor.execute("SET IDENTITY_INSERT Complaints ON")
+            cursor.executemany(statements[table], rows)
+            if table == "Complaints":
+                cursor.execute("SET IDENTITY_INSERT Complaints OFF")
+            inserted[table] += len(rows)
+            pending[table] = []
+
+        for table, row in generate(count, seed, first_id, **options):
+            pending[table].append(row)
+            if len(pending[table]) >= chunk_size:
+                # Parents first: child rows may reference complaints still pending
+                flush("Complaints")
+                flush(table)
+                conn.commit()
+        for table in statements:
+            flush(table)
+        cursor.execute(PROFILES_SQL)
+        conn.commit()
+    return inserted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conn-str", default=os.getenv("BENCH_SQL_CONN_STRING", DEFAULT_CONN_STR),
+                        help="local SQL Server (default: $BENCH_SQL_CONN_STRING)")
+    parser.add_argument("--complaints", type=int, default=10000, help="complaints to add (10k to 1M)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--students", type=int, help="distinct submitters (default: complaints / 5)")
+    parser.add_argument("--days", type=int, default=365, help="spread submissions over this many days")
+    parser.add_argument("--comments", type=float, default=1.0, help="mean comments per complaint")
+    parser.add_argument("--chat", type=float, default=2.0, help="mean chat messages per complaint")
+    parser.add_argument("--upvotes", type=float, default=2.0, help="mean upvotes per complaint")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--reset", action="store_true", help="drop and recreate every table first")
+    args = parser.parse_args()
+    if is_azure(args.conn_str):
+        sys.exit("Refusing to load benchmark data into Azure SQL; point --conn-str at a local server")
+
+    started = time.perf_counter()
+    inserted = load(args.conn_str, args.complaints, args.seed, args.chunk_size, args.reset,
+                    students=args.students, days=args.days, comments=args.comments, chat=args.chat,
+                    upvotes=args.upvotes)
+    elapsed = time.perf_counter() - started
+    print(", ".join(f"{count} {table}" for table, count in inserted.items()))
+    print(f"loaded in {elapsed:.1f}s ({inserted['Complaints'] / elapsed:.0f} complaints/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Local stand-ins for the Azure services, shared by the benchmarks.
+
+- Database: a local SQL Server (the app's queries are T-SQL: TOP, OUTPUT,
+  MERGE, GETDATE, so SQLite cannot run them). create_schema() builds the
+  Complaints table schema.sql assumes exists, then runs schema.sql batch by
+  batch. Any SQL Server 2019+ works, e.g.
+
+      docker run -e ACCEPT_EULA=Y -e MSSQL_SA_PASSWORD='Bench!Passw0rd' \\
+          -p 1433:1433 -d mcr.microsoft.com/mssql/server:2022-latest
+
+- Blob storage: the app's own filesystem store (BLOB_BACKEND=local) in a
+  temporary directory.
+- Logic App: LogicAppReceiver, an HTTP endpoint that accepts and counts
+  notifications, optionally after a fixed delay.
+
+app_env() returns the environment that points an imported app at these;
+every Azure setting is blanked so nothing in .env is ever contacted.
+"""
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_CONN_STR = ("DRIVER={ODBC Driver 18 for SQL Server};SERVER=localhost,1433;DATABASE=complaints_bench;"
+                    "UID=sa;PWD=Bench!Passw0rd;TrustServerCertificate=yes")
+
+# The base table predates schema.sql, which only adds columns and indexes to it
+BASE_SCHEMA = """
+IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'Complaints')
+BEGIN
+    CREATE TABLE Complaints (
+        id INT PRIMARY KEY IDENTITY(1,1),
+        title VARCHAR(255),
+        description NVARCHAR(MAX),
+        type VARCHAR(100),
+        file_url VARCHAR(500),
+        status VARCHAR(50) DEFAULT 'Submitted',
+        student_name VARCHAR(255),
+        email VARCHAR(255),
+        assigned_to VARCHAR(255) NULL,
+        submitted_at DATETIME DEFAULT GETDATE()
+    );
+END
+"""
+
+# Children first, so foreign keys never block a reset
+TABLES = ("ComplaintUpvotes", "ChatMessages", "Comments", "ActivityLog", "UserBadges", "Notifications",
+          "NotificationOutbox", "Complaints", "Badges", "UserProfiles", "ResponseTemplates", "PriorityRules")
+
+AZURE_SETTINGS = ("AZURE_SQL_CONN_STRING", "AZURE_STORAGE_CONNECTION_STRING", "LOGIC_APP_WEBHOOK_URL",
+                  "APPINSIGHTS_CONNECTION_STRING")
+
+
+def is_azure(conn_str):
+    """True for Azure SQL connection strings, which the benchmarks never write to"""
+    return ".database.windows.net" in conn_str.lower()
+
+
+def schema_batches(path=os.path.join(ROOT, "schema.sql")):
+    """BASE_SCHEMA followed by the batches of schema.sql (split on GO lines)"""
+    with open(path, encoding="utf-8") as f:
+        script = f.read()
+    batches = [BASE_SCHEMA] + re.split(r"^\s*GO\s*$", script, flags=re.M | re.I)
+    return [batch.strip() for batch in batches if batch.strip()]
+
+
+def _database_name(conn_str):
+    match = re.search(r"(?:^|;)\s*(?:DATABASE|Initial Catalog)\s*=\s*([^;]+)", conn_str, re.I)
+    return match.group(1).strip() if match else None
+
+
+def ensure_database(conn_str):
+    """Create the connection string's database on the server if it does not exist"""
+    import pyodbc
+    name = _database_name(conn_str)
+    if not name:
+        return
+    master = re.sub(r"((?:^|;)\s*(?:DATABASE|Initial Catalog)\s*=)\s*[^;]+", r"\1master", conn_str, flags=re.I)
+    literal, identifier = name.replace("'", "''"), name.replace("]", "]]")
+    with pyodbc.connect(master, autocommit=True) as conn:
+        conn.cursor().execute(f"IF DB_ID(N'{literal}') IS NULL CREATE DATABASE [{identifier}]")
+
+
+def create_schema(conn_str, reset=False):
+    """Create (or with reset, recreate empty) every table the app uses"""
+    import pyodbc
+    ensure_database(conn_str)
+    with pyodbc.connect(conn_str, autocommit=True) as conn:
+        cursor = conn.cursor()
+        if reset:
+            for table in TABLES:
+                cursor.execute(f"IF OBJECT_ID(N'{table}', N'U') IS NOT NULL DROP TABLE {table}")
+        for batch in schema_batches():
+            cursor.execute(batch)
+
+
+class LogicAppReceiver:
+    """Stand-in for the Logic App webhook: accepts POSTs and counts notifications"""
+
+    def __init__(self, latency=0.0, status=202):
+        self.latency = latency
+        self.status = status
+        self.requests = 0
+        self.notifications = 0
+        self._lock = threading.Lock()
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                try:
+                    payload = json.loads(body or b"null")
+                except ValueError:
+                    payload = None
+                if receiver.latency:
+                    time.sleep(receiver.latency)
+                with receiver._lock:
+                    receiver.requests += 1
+                    receiver.notifications += len(payload) if isinstance(payload, list) else 1
+                self.send_response(receiver.status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/notify"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="logic-app-receiver", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self):
+        with self._lock:
+            return {"requests": self.requests, "notifications": self.notifications}
+
+
+def app_env(conn_str, work_dir, logic_app_url=None, **overrides):
+    """Environment for importing the app against the local stand-ins"""
+    env = {name: "" for name in AZURE_SETTINGS}
+    env.update({
+        "AZURE_SQL_CONN_STRING": conn_str,
+        "LOGIC_APP_WEBHOOK_URL": logic_app_url or "",
+        "BLOB_BACKEND": "local",
+        "LOCAL_BLOB_DIR": os.path.join(work_dir, "blobs"),
+        "UPVOTE_LOG_DIR": os.path.join(work_dir, "upvotes"),
+        "OUTBOX_SPOOL_DIR": os.path.join(work_dir, "outbox"),
+        "SOCKETIO_ASYNC_MODE": "threading",
+        "SOCKETIO_MESSAGE_QUEUE": "",
+        "FLASK_SECRET_KEY": "benchmark",
+    })
+    env.update({name: str(value) for name, value in overrides.items()})
+    return env
@@ -0,0 +1,112 @@
+"""Versioned feed of changed complaints for delta sync (/changes and its SSE stream)"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class ChangeFeed:
+    """Complaint ids stamped with a version that grows by one per committed write.
+
+    Writers call record(complaint_id, email) after committing; readers keep
+    the token from their last response and ask for what changed since, so an
+    idle client costs a dict comparison instead of a full listing. Only the
+    latest version of each complaint is kept, for at most max_entries
+    complaints. Tokens carry a per-process epoch: a token from another
+    worker, from before a restart or older than the retained window yields
+    reset=True, telling the client to reload everything. With resync_interval
+    (seconds, 0 = off) tokens also expire that often, bounding how long a
+    change made through another worker goes unseen.
+    """
+
+    def __init__(self, max_entries=10000, resync_interval=0.0):
+        self.max_entries = max_entries
+        self.resync_interval = resync_interval
+        self._epoch = uuid.uuid4().hex[:8]
+        self._version = 0
+        self._floor = 0  # versions at or below this may have been evicted
+        self._entries = OrderedDict()  # complaint_id -> (version, email), oldest version first
+        self._changed = threading.Condition()
+        self._counters = {"recorded": 0, "reads": 0, "resets": 0}
+
+    def _period(self):
+        return int(time.time() // self.resync_interval) if self.resync_interval else 0
+
+    def token(self, version=None):
+        """Opaque position in the feed (the current one by default)"""
+        with self._changed:
+            version = self._version if version is None else version
+        return f"{self._epoch}.{self._period()}.{version}"
+
+    def _parse(self, token):
+        """Version for a token issued by this feed in the current period, else None"""
+        try:
+            epoch, period, version = token.split(".")
+            version = int(version)
+        except (AttributeError, ValueError):
+            return None
+        if epoch != self._epoch or period != str(self._period()) or version < 0:
+            return None
+        return version
+
+    def record(self, complaint_id, email=None):
+        """Stamp a complaint as changed; email (its owner) is kept from earlier records if omitted"""
+        complaint_id = int(complaint_id)
+        with self._changed:
+            self._version += 1
+            previous = self._entries.pop(complaint_id, None)
+            if email is None and previous is not None:
+                email = previous[1]
+            self._entries[complaint_id] = (self._version, email.strip().lower() if email else None)
+            while len(self._entries) > self.max_entries:
+                _, (version, _) = self._entries.popitem(last=False)
+                self._floor = version
+            self._counters["recorded"] += 1
+            self._changed.notify_all()
+
+    def since(self, token, email=None, limit=500):
+        """(new token, complaint ids changed after token, reset).
+
+        With email, only complaints recorded for that owner (or whose owner
+        is not known) are returned; callers should check the rows they load.
+        reset is True when the client must reload instead of applying ids.
+        """
+        version = self._parse(token) if token else None
+        email = email.strip().lower() if email else None
+        with self._changed:
+            self._counters["reads"] += 1
+            current = self._version
+            if version is None or version < self._floor or version > current:
+                self._counters["resets"] += 1
+                return self.token(current), [], True
+            ids = []
+            # Newest first: stop at the first entry the client has already seen
+            for complaint_id, (entry_version, owner) in reversed(self._entries.items()):
+                if entry_version <= version:
+                    break
+                if email is None or owner is None or owner == email:
+                    ids.append(complaint_id)
+                    if len(ids) > limit:
+                        self._counters["resets"] += 1
+                        return self.token(current), [], True
+        return self.token(current), ids, False
+
+    def wait(self, token, timeout):
+        """Block until something is recorded after token (or it expires), at most timeout seconds"""
+        version = self._parse(token)
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while version is not None and self._version <= version:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                if self.resync_interval:
+                    remaining = min(remaining, self.resync_interval - time.time() % self.resync_interval + 0.01)
+                self._changed.wait(remaining)
+                if self._parse(token) is None:
+                    return True
+            return True
+
+    def stats(self):
+        with self._changed:
+            return dict(self._counters, version=self._version, entries=len(self._entries), epoch=self._epoch)
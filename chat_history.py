@@ -0,0 +1,200 @@
+"""Recent chat messages per complaint in memory, older pages from ChatMessages"""
+import logging
+import threading
+from collections import OrderedDict, deque
+
+from complaint_queries import DATETIME_FORMAT, decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+# Newest first; the keyset predicate selects rows older than the cursor
+HISTORY_QUERY = """
+    SELECT TOP (?) id, sender_name, sender_type, message, is_read, created_at
+    FROM ChatMessages
+    WHERE complaint_id = ?{predicate}
+    ORDER BY created_at DESC, id DESC
+"""
+
+# The cursor value is cast back to DATETIME so it compares equal to the stored value
+KEYSET_PREDICATE = (" AND (created_at < CAST(? AS DATETIME)"
+                    " OR (created_at = CAST(? AS DATETIME) AND id < ?))")
+
+EXISTS_QUERY = "SELECT 1 FROM Complaints WHERE id = ?"
+
+# Explicit ids per mark_read call (well under the 2100 parameter limit)
+MAX_MARK_IDS = 1000
+
+
+def _fetch(cursor, complaint_id, limit, cursor_token=None):
+    predicate, params = "", []
+    if cursor_token:
+        created_at, message_id = decode_cursor(cursor_token)
+        if created_at is None:
+            raise ValueError("Invalid cursor")
+        predicate, params = KEYSET_PREDICATE, [created_at, created_at, message_id]
+    # One extra row tells whether another page exists
+    cursor.execute(HISTORY_QUERY.format(predicate=predicate), [limit + 1, complaint_id] + params)
+    return cursor.fetchall()
+
+
+def _serialize_row(row):
+    return serialize_message(row.sender_name, row.sender_type, row.message, row.created_at,
+                             id=row.id, is_read=bool(row.is_read))
+
+
+def history_page(cursor, complaint_id, limit, cursor_token=None):
+    """(messages newest first, next_cursor) for one page of a complaint's chat"""
+    rows = _fetch(cursor, complaint_id, limit, cursor_token)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    messages = [_serialize_row(row) for row in rows]
+    next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None
+    return messages, next_cursor
+
+
+def mark_read(cursor, complaint_id, reader_type=None, ids=None):
+    """Mark a complaint's unread messages read in one UPDATE; returns the number marked.
+
+    reader_type skips the reader's own messages (an admin reading marks the
+    student's messages); ids limits the update to those messages.
+    """
+    sql = "UPDATE ChatMessages SET is_read = 1 WHERE complaint_id = ? AND is_read = 0"
+    params = [complaint_id]
+    if reader_type:
+        sql += " AND (sender_type IS NULL OR sender_type <> ?)"
+        params.append(reader_type)
+    if ids is not None:
+        ids = [int(message_id) for message_id in ids]
+        if not ids or len(ids) > MAX_MARK_IDS:
+            raise ValueError(f"ids must list 1 to {MAX_MARK_IDS} messages")
+        sql += f" AND id IN ({', '.join('?' * len(ids))})"
+        params += ids
+    cursor.execute(sql, params)
+    return cursor.rowcount
+
+
+def serialize_message(sender_name, sender_type, message, created_at, **extra):
+    """A chat message as sent to clients (the new_message payload plus created_at)"""
+    return dict({
+        "sender_name": sender_name,
+        "sender_type": sender_type,
+        "message": message,
+        "timestamp": created_at.strftime('%H:%M:%S'),
+        "created_at": created_at.strftime(DATETIME_FORMAT),
+    }, **extra)
+
+
+class _Room:
+    __slots__ = ("messages", "loaded", "complete", "exists")
+
+    def __init__(self, size):
+        self.messages = deque(maxlen=size)  # (created_at, payload), oldest first
+        self.loaded = False    # older messages have been read from the database
+        self.complete = False  # nothing older exists
+        self.exists = False    # the complaint was found in the database
+
+
+class ChatHistory:
+    """The last `size` messages of each recently active complaint room.
+
+    add() records every message this process sends (before the chat writer
+    has saved it); recent() returns a room's buffer for replay on join,
+    filling it from the database the first time the room is asked for.
+    Rows are only taken from the database if they are older than the first
+    buffered message, so messages still waiting to be saved are neither
+    lost nor shown twice. If that load fails, the buffer alone is replayed. At most max_rooms rooms are kept, least recently
+    used first out. Messages sent through other workers are not seen.
+    """
+
+    def __init__(self, size=50, max_rooms=1000):
+        self.size = size
+        self.max_rooms = max_rooms
+        self._rooms = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"replays": 0, "loads": 0}
+
+    def _room(self, complaint_id):
+        room = self._rooms.get(complaint_id)
+        if room is None:
+            room = self._rooms[complaint_id] = _Room(self.size)
+            while len(self._rooms) > self.max_rooms:
+                self._rooms.popitem(last=False)
+        self._rooms.move_to_end(complaint_id)
+        return room
+
+    def add(self, complaint_id, payload, created_at):
+        complaint_id = int(complaint_id)
+        with self._lock:
+            room = self._room(complaint_id)
+            if len(room.messages) == self.size:
+                room.complete = False
+            room.messages.append((created_at, payload))
+
+    def exists(self, complaint_id, get_connection):
+        """True if the complaint exists; asks the database once per room while it is kept"""
+        complaint_id = int(complaint_id)
+        with self._lock:
+            room = self._rooms.get(complaint_id)
+            if room is not None and room.exists:
+                return True
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(EXISTS_QUERY, complaint_id)
+            found = cursor.fetchone() is not None
+        if found:
+            with self._lock:
+                self._room(complaint_id).exists = True
+        return found
+
+    def recent(self, complaint_id, get_connection):
+        """(messages oldest first, cursor for the next older page or None)"""
+        complaint_id = int(complaint_id)
+        with self._lock:
+            room = self._room(complaint_id)
+            loaded = room.loaded
+        rows = None
+        if not loaded:
+            try:
+                with get_connection() as conn:
+                    rows = _fetch(conn.cursor(), complaint_id, self.size)
+            except Exception as e:
+                if not room.messages:
+                    raise
+                # Replay what this process has; the database is tried again on the next join
+                logger.warning("Could not load chat history for complaint %s: %s", complaint_id, e)
+        if rows is not None:
+            with self._lock:
+                room = self._room(complaint_id)
+                if not room.loaded:
+                    self._merge(room, rows)
+                    self._counters["loads"] += 1
+        with self._lock:
+            self._counters["replays"] += 1
+            if not room.messages:
+                return [], None
+            oldest_at, oldest = room.messages[0]
+            messages = [payload for _, payload in room.messages]
+            if room.complete:
+                return messages, None
+            # Positioned just before the oldest buffered message (id 0 sorts below every row)
+            return messages, encode_cursor(oldest_at, oldest.get("id", 0))
+
+    def _merge(self, room, rows):
+        """Put rows (newest first, up to size + 1) in front of the messages added meanwhile"""
+        first_live = room.messages[0][0] if room.messages else None
+        room.complete = len(rows) <= self.size
+        for row in rows[:self.size]:
+            # DATETIME rounds to 1/300 s: a row that close to the first live message is one of them
+            if first_live is not None and (first_live - row.created_at).total_seconds() < 0.004:
+                continue
+            if len(room.messages) == self.size:
+                room.complete = False
+                break
+            room.messages.appendleft((row.created_at, _serialize_row(row)))
+        room.loaded = True
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, rooms=len(self._rooms),
+                        messages=sum(len(room.messages) for room in self._rooms.values()))
+
@@ -0,0 +1,198 @@
+"""Write-behind persistence for chat messages, bulk-inserted in batches"""
+import atexit
+import logging
+import queue
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import pyodbc
+
+from metrics import latency_summary
+
+logger = logging.getLogger(__name__)
+
+INSERT_SQL = """
+    INSERT INTO ChatMessages (complaint_id, sender_name, sender_type, message, created_at)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+# (type, size, precision) per INSERT_SQL parameter; size 0 binds the message as
+# NVARCHAR(MAX) so fast_executemany does not size its buffer from the first row
+INPUT_SIZES = [None, (pyodbc.SQL_WVARCHAR, 255, 0), (pyodbc.SQL_WVARCHAR, 50, 0),
+               (pyodbc.SQL_WVARCHAR, 0, 0), None]
+
+# Errors about the rows themselves (an unknown complaint, an oversized value);
+# retrying them can never succeed, unlike a dropped connection or timeout
+PERMANENT_ERRORS = (pyodbc.IntegrityError, pyodbc.DataError)
+
+
+class ChatQueueFull(Exception):
+    """The writer is too far behind the database to accept another message"""
+
+
+class ChatWriter:
+    """Queues chat messages and inserts them with fast_executemany in the background.
+
+    write() only enqueues, so the message can be emitted to the room without
+    waiting for Azure SQL. A writer thread inserts whatever is queued once
+    batch_size messages are waiting or flush_interval seconds after the
+    first one, in one transaction. When the queue holds max_queue messages
+    write() blocks for up to enqueue_timeout seconds, then raises
+    ChatQueueFull. A batch the database rejects (PERMANENT_ERRORS, e.g. an
+    unknown complaint) is retried row by row and the rejected rows are
+    dropped and counted. Any other error means the database is unreachable:
+    the unsaved messages are retried with backoff while the queue fills up.
+    Messages still queued at exit are flushed, waiting at most
+    shutdown_timeout seconds.
+    """
+
+    def __init__(self, get_connection, batch_size=200, flush_interval=0.05, max_queue=10000,
+                 enqueue_timeout=0.5, max_delay=30.0, shutdown_timeout=10.0):
+        self.get_connection = get_connection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.max_delay = max_delay
+        self.shutdown_timeout = shutdown_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+        self._unsaved = []  # batch the writer thread was retrying when it stopped
+        self._stats_lock = threading.Lock()
+        self._latencies = deque(maxlen=1000)  # write() -> committed, ms
+        self._counters = {"written": 0, "batches": 0, "rejected": 0, "dropped": 0, "failed_batches": 0}
+        self._last_error = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="chat-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, complaint_id, sender_name, sender_type, message, created_at=None):
+        """Queue a message for insertion; raises ChatQueueFull when the writer is saturated"""
+        row = (complaint_id, sender_name, sender_type, message, created_at or datetime.now())
+        try:
+            self._queue.put((row, time.monotonic()), timeout=self.enqueue_timeout)
+        except queue.Full:
+            with self._stats_lock:
+                self._counters["rejected"] += 1
+            raise ChatQueueFull("Chat is busy, please resend your message") from None
+
+    def _take(self):
+        """Block for the first queued message, then gather a batch until it is full or due"""
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        failures = 0
+        while not self._stop.is_set():
+            batch = self._take()
+            while batch and not self._stop.is_set():
+                batch = self._write(batch)
+                if not batch:
+                    failures = 0
+                    break
+                failures += 1
+                delay = min(self.max_delay, 0.5 * 2 ** (failures - 1))
+                self._stop.wait(delay * random.uniform(0.5, 1.0))
+            if batch and self._stop.is_set():
+                self._unsaved = batch
+
+    def _insert(self, rows):
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.fast_executemany = True
+            cursor.setinputsizes(INPUT_SIZES)
+            cursor.executemany(INSERT_SQL, rows)
+
+    def _write(self, batch):
+        """Insert a batch; returns the messages to retry once the database is reachable"""
+        try:
+            self._insert([row for row, _ in batch])
+            self._written(batch)
+            return []
+        except PERMANENT_ERRORS as e:
+            self._failed(e)
+        except Exception as e:
+            self._failed(e)
+            logger.warning("Could not save %d chat messages, will retry: %s", len(batch), e)
+            return batch
+
+        written, retry, dropped = [], [], 0
+        for i, item in enumerate(batch):
+            try:
+                self._insert([item[0]])
+                written.append(item)
+            except PERMANENT_ERRORS as e:
+                logger.error("Dropping chat message for complaint %s: %s", item[0][0], e)
+                dropped += 1
+            except Exception as e:
+                self._failed(e)
+                logger.warning("Could not save %d chat messages, will retry: %s", len(batch) - i, e)
+                retry = batch[i:]
+                break
+        if written:
+            self._written(written)
+        with self._stats_lock:
+            self._counters["dropped"] += dropped
+        return retry
+
+    def _failed(self, error):
+        with self._stats_lock:
+            self._counters["failed_batches"] += 1
+            self._last_error = f"{type(error).__name__}: {error}"
+
+    def _written(self, batch):
+        now = time.monotonic()
+        with self._stats_lock:
+            self._counters["written"] += len(batch)
+            self._counters["batches"] += 1
+            for _, queued_at in batch:
+                self._latencies.append((now - queued_at) * 1000)
+
+    def close(self):
+        """Stop the writer thread and insert whatever is still queued"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(self.shutdown_timeout)
+        batch, self._unsaved = self._unsaved, []
+        deadline = time.monotonic() + self.shutdown_timeout
+        while time.monotonic() < deadline:
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                break
+            batch = self._write(batch)
+            if batch:
+                break
+        lost = len(batch) + self._queue.qsize()
+        if lost:
+            logger.error("Shutting down with %d unsaved chat messages", lost)
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._counters)
+            stats["latency_ms"] = latency_summary(self._latencies)
+            stats["last_error"] = self._last_error
+        stats["queue_depth"] = self._queue.qsize()
+        stats["batch_size"] = self.batch_size
+        return stats
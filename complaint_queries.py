@@ -0,0 +1,300 @@
+"""Query building for complaint listings: filters, projection and keyset cursors"""
+import base64
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+COUNT_CACHE_TTL = 60  # seconds a filtered count estimate is reused
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+logger = logging.getLogger(__name__)
+
+# Unfiltered row count from metadata, cheapest first: the DMV needs VIEW
+# DATABASE STATE, sys.partitions only metadata visibility on the table
+ROW_COUNT_QUERIES = (
+    """
+    SELECT SUM(row_count) AS total
+    FROM sys.dm_db_partition_stats
+    WHERE object_id = OBJECT_ID('Complaints') AND index_id IN (0, 1)
+    """,
+    """
+    SELECT SUM(rows) AS total
+    FROM sys.partitions
+    WHERE object_id = OBJECT_ID('Complaints') AND index_id IN (0, 1)
+    """,
+)
+
+
+def _format_datetime(value):
+    return value.strftime(DATETIME_FORMAT) if value else None
+
+
+# Public field name -> (column, formatter). Order matches the legacy response.
+LIST_FIELDS = {
+    "id": ("id", None),
+    "title": ("title", None),
+    "description": ("description", None),
+    "type": ("type", None),
+    "file_url": ("file_url", None),
+    "status": ("status", None),
+    "priority": ("priority", None),
+    "rating": ("rating", None),
+    "upvotes": ("upvotes", None),
+    "due_date": ("due_date", _format_datetime),
+    "is_overdue": (None, None),  # derived from due_date and status
+    "submitted_at": ("submitted_at", lambda value: _format_datetime(value) or "N/A"),
+    "student_name": ("student_name", None),
+    "email": ("email", None),
+}
+
+# Columns every listing query selects regardless of projection
+_KEY_COLUMNS = ("id", "submitted_at")
+_OVERDUE_COLUMNS = ("due_date", "status")
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+KEYSET_CURSOR = "keyset"
+OFFSET_CURSOR = "offset"
+
+
+def _encode_payload(payload):
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_payload(token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(payload, dict):
+        raise InvalidCursor("Invalid cursor")
+    return payload
+
+
+def cursor_kind(token):
+    """KEYSET_CURSOR or OFFSET_CURSOR (tokens issued before kinds were recorded are told apart by their keys)"""
+    payload = _decode_payload(token)
+    kind = payload.get("k") or (OFFSET_CURSOR if "o" in payload else KEYSET_CURSOR)
+    if kind not in (KEYSET_CURSOR, OFFSET_CURSOR):
+        raise InvalidCursor("Invalid cursor")
+    return kind
+
+
+def encode_cursor(submitted_at, complaint_id):
+    """Opaque token for the position after (submitted_at, id)"""
+    return _encode_payload({"k": KEYSET_CURSOR, "s": submitted_at.isoformat() if submitted_at else None,
+                            "i": complaint_id})
+
+
+def decode_cursor(token):
+    """Inverse of encode_cursor; returns (submitted_at, id)"""
+    payload = _decode_payload(token)
+    try:
+        if payload.get("k", KEYSET_CURSOR) != KEYSET_CURSOR:
+            raise ValueError(payload.get("k"))
+        submitted_at = datetime.fromisoformat(payload["s"]) if payload["s"] else None
+        return submitted_at, int(payload["i"])
+    except Exception:
+        raise InvalidCursor("Invalid cursor")
+
+
+def encode_offset_cursor(offset):
+    """Opaque token for ranked (search) results, which page by offset"""
+    return _encode_payload({"k": OFFSET_CURSOR, "o": offset})
+
+
+def decode_offset_cursor(token):
+    """Inverse of encode_offset_cursor"""
+    payload = _decode_payload(token)
+    try:
+        if payload.get("k", OFFSET_CURSOR) != OFFSET_CURSOR:
+            raise ValueError(payload.get("k"))
+        offset = int(payload["o"])
+    except Exception:
+        raise InvalidCursor("Invalid cursor")
+    if offset < 0:
+        raise InvalidCursor("Invalid cursor")
+    return offset
+
+
+def parse_limit(value):
+    """Clamp the requested page size to 1..MAX_PAGE_SIZE"""
+    if not value:
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def parse_fields(value):
+    """Requested projection as a list of public field names (all fields when empty)"""
+    if not value:
+        return list(LIST_FIELDS)
+    fields = [f.strip() for f in value.split(",") if f.strip()]
+    unknown = [f for f in fields if f not in LIST_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    if "id" not in fields:
+        fields.insert(0, "id")
+    return fields
+
+
+def select_columns(fields):
+    """Columns needed to serialize the given fields"""
+    columns = list(_KEY_COLUMNS)
+    for field in fields:
+        column = LIST_FIELDS[field][0]
+        needed = _OVERDUE_COLUMNS if field == "is_overdue" else (column,)
+        for col in needed:
+            if col not in columns:
+                columns.append(col)
+    return columns
+
+
+def build_filters(args):
+    """WHERE clause (starting with 'WHERE 1=1') and params for the listing filters"""
+    where = "WHERE 1=1"
+    params = []
+
+    status_filter = args.get('status', '')
+    if status_filter:
+        where += " AND status = ?"
+        params.append(status_filter)
+
+    priority_filter = args.get('priority', '')
+    if priority_filter:
+        where += " AND priority = ?"
+        params.append(priority_filter)
+
+    type_filter = args.get('type', '')
+    if type_filter:
+        where += " AND type = ?"
+        params.append(type_filter)
+
+    search_query = args.get('search', '')
+    if search_query:
+        where += " AND (title LIKE ? OR description LIKE ?)"
+        params.extend([f'%{search_query}%', f'%{search_query}%'])
+
+    return where, params
+
+
+def _parse_date_arg(value, name):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO date or datetime (YYYY-MM-DD[THH:MM:SS])")
+
+
+def date_range_filter(args):
+    """Predicate and params for the from/to submitted_at range (a bare 'to' date includes that whole day)"""
+    predicate = ""
+    params = []
+    start = args.get('from', '')
+    if start:
+        predicate += " AND submitted_at >= ?"
+        params.append(_parse_date_arg(start, "from"))
+    end = args.get('to', '')
+    if end:
+        end_value = _parse_date_arg(end, "to")
+        if len(end) == 10:
+            end_value += timedelta(days=1)
+            predicate += " AND submitted_at < ?"
+        else:
+            predicate += " AND submitted_at <= ?"
+        params.append(end_value)
+    return predicate, params
+
+
+def keyset_predicate(cursor_token):
+    """Predicate selecting rows strictly after the cursor in (submitted_at DESC, id DESC) order.
+
+    The cursor value is cast back to DATETIME so it compares equal to the
+    stored value despite DATETIME's 1/300s precision.
+    """
+    submitted_at, complaint_id = decode_cursor(cursor_token)
+    if submitted_at is None:
+        # NULL submitted_at sorts last in DESC order; only lower ids remain
+        return " AND submitted_at IS NULL AND id < ?", [complaint_id]
+    return (
+        " AND (submitted_at < CAST(? AS DATETIME)"
+        " OR (submitted_at = CAST(? AS DATETIME) AND id < ?)"
+        " OR submitted_at IS NULL)",
+        [submitted_at, submitted_at, complaint_id],
+    )
+
+
+def serialize_row(row, fields, now=None):
+    """Dict for one listing row, restricted to the projected fields"""
+    item = {}
+    for field in fields:
+        if field == "is_overdue":
+            is_overdue = False
+            if row.due_date and row.status != 'Resolved':
+                is_overdue = (now or datetime.now()) > row.due_date
+            item[field] = is_overdue
+            continue
+        column, formatter = LIST_FIELDS[field]
+        value = getattr(row, column)
+        item[field] = formatter(value) if formatter else value
+    return item
+
+
+class CountEstimator:
+    """Cheap total counts for listing responses.
+
+    Unfiltered totals come from partition metadata (no table scan), trying
+    each of ROW_COUNT_QUERIES until one is permitted; if none is, they are
+    counted like filtered totals, which are counted once and reused for
+    COUNT_CACHE_TTL seconds.
+    """
+
+    def __init__(self, ttl=COUNT_CACHE_TTL):
+        self.ttl = ttl
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._metadata_query = 0  # index of the first ROW_COUNT_QUERIES entry not known to fail
+
+    def _metadata_count(self, cursor):
+        while self._metadata_query < len(ROW_COUNT_QUERIES):
+            index = self._metadata_query
+            try:
+                cursor.execute(ROW_COUNT_QUERIES[index])
+                return int(cursor.fetchone().total or 0)
+            except Exception as e:
+                logger.warning("Row count from metadata unavailable (%s), falling back: %s", index, e)
+                self._metadata_query = index + 1
+        return None
+
+    def estimate(self, cursor, where, params):
+        if where == "WHERE 1=1":
+            total = self._metadata_count(cursor)
+            if total is not None:
+                return total
+
+        key = (where, tuple(params))
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and now - cached[1] < self.ttl:
+                return cached[0]
+
+        cursor.execute(f"SELECT COUNT(*) AS total FROM Complaints {where}", params)
+        total = cursor.fetchone().total
+        with self._lock:
+            if len(self._cache) > 1000:
+                self._cache.clear()
+            self._cache[key] = (total, now)
+        return total
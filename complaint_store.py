@@ -0,0 +1,63 @@
+"""Batched write statements for complaints"""
+import json
+
+# One round trip, one transaction: the complaint row, its "Created" activity
+# entry, the submitter's profile counters and (optionally) the outbox row for
+# its notification. OUTPUT ... INTO a table
+# variable returns the new id and, unlike @@IDENTITY, is not affected by
+# identity values generated inside triggers; the submitter's updated profile
+# totals come back with it for the leaderboard.
+SUBMIT_COMPLAINT_SQL = """
+SET NOCOUNT ON;
+SET XACT_ABORT ON;
+
+DECLARE @inserted TABLE (id INT);
+DECLARE @profile TABLE (points INT, total_complaints INT, resolved_complaints INT);
+
+INSERT INTO Complaints (title, description, type, file_url, status, student_name, email, priority, due_date)
+OUTPUT INSERTED.id INTO @inserted
+VALUES (?, ?, ?, ?, 'Submitted', ?, ?, ?, ?);
+
+DECLARE @id INT = (SELECT id FROM @inserted);
+
+INSERT INTO ActivityLog (complaint_id, action, performed_by, details)
+VALUES (@id, 'Created', ?, ?);
+
+MERGE UserProfiles WITH (HOLDLOCK) AS target
+USING (SELECT ? AS email, ? AS name) AS source
+ON target.email = source.email
+WHEN MATCHED THEN
+    UPDATE SET total_complaints = target.total_complaints + 1, points = target.points + 10
+WHEN NOT MATCHED AND source.email IS NOT NULL THEN
+    INSERT (email, name, total_complaints, points) VALUES (source.email, source.name, 1, 10)
+OUTPUT INSERTED.points, INSERTED.total_complaints, INSERTED.resolved_complaints INTO @profile;
+
+-- Logic App notification, delivered later by the outbox workers
+DECLARE @notification NVARCHAR(MAX) = ?;
+IF @notification IS NOT NULL
+    INSERT INTO NotificationOutbox (payload) VALUES (JSON_MODIFY(@notification, '$.complaint_id', @id));
+
+SELECT @id AS id, p.points, p.total_complaints, p.resolved_complaints
+FROM (SELECT 1 AS one) AS r
+LEFT JOIN @profile AS p ON 1 = 1;
+"""
+
+
+def insert_complaint(cursor, title, description, type_, file_url, student_name, email, priority, due_date,
+                     notification=None):
+    """Insert a complaint with its activity entry and profile update.
+
+    Returns a row with the new complaint's id and the submitter's updated
+    points, total_complaints and resolved_complaints (NULL without an email).
+
+    notification, if given, is queued in NotificationOutbox with the new
+    complaint_id added. The caller commits (leaving the `with
+    get_db_connection()` block does).
+    """
+    cursor.execute(SUBMIT_COMPLAINT_SQL, (
+        title, description, type_, file_url, student_name, email, priority, due_date,
+        student_name, f"Complaint submitted with {priority} priority",
+        email, student_name,
+        json.dumps(notification) if notification is not None else None,
+    ))
+    return cursor.fetchone()
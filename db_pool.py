@@ -0,0 +1,306 @@
+"""Bounded, health-checked connection pool for Azure SQL (pyodbc)"""
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection could be checked out within the wait timeout"""
+
+
+class _Record:
+    """A raw connection plus the bookkeeping the pool needs for it"""
+
+    __slots__ = ("raw", "created_at", "last_used")
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class PooledConnection:
+    """Checked-out connection; behaves like the pyodbc connection it wraps.
+
+    Used as a context manager it mirrors pyodbc (commit on success, rollback
+    on error) and then hands the connection back to the pool instead of
+    leaving it open until garbage collection.
+    """
+
+    def __init__(self, pool, record):
+        self._pool = pool
+        self._record = record
+
+    def __getattr__(self, name):
+        record = self.__dict__.get("_record")
+        if record is None:
+            raise AttributeError(f"Connection already returned to pool ({name})")
+        return getattr(record.raw, name)
+
+    def cursor(self):
+        cursor = self.__getattr__("cursor")()
+        wrap = self._pool.wrap_cursor
+        return wrap(cursor) if wrap is not None else cursor
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record = self._record
+        if record is None:
+            return False
+        broken = False
+        try:
+            if exc_type is None:
+                record.raw.commit()
+            else:
+                record.raw.rollback()
+        except Exception:
+            broken = True
+        self.close(discard=broken)
+        return False
+
+    def close(self, discard=False):
+        """Return the connection to the pool (or drop it when discard is set)"""
+        record, self._record = self._record, None
+        if record is not None:
+            self._pool._release(record, discard=discard)
+
+
+class ConnectionPool:
+    """Thread-safe bounded pool.
+
+    - min_size connections are opened by warm() and kept when idle
+    - at most max_size connections exist; further checkouts wait up to
+      timeout seconds and then raise PoolTimeoutError
+    - connections idle longer than ping_interval are pinged before reuse
+    - connections older than max_lifetime are recycled
+    - a thread gets back the connection it used last when it is idle, so
+      Socket.IO handler threads keep hitting the same session
+    - wrap_cursor, if given, is applied to every cursor handed out by a
+      checked-out connection (the pool's own pings are not wrapped)
+    """
+
+    def __init__(self, connect, min_size=1, max_size=10, timeout=15.0,
+                 max_lifetime=1800.0, idle_timeout=300.0, ping_interval=30.0,
+                 ping_query="SELECT 1", wrap_cursor=None):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size, max_size >= 1")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.idle_timeout = idle_timeout
+        self.ping_interval = ping_interval
+        self.ping_query = ping_query
+        self.wrap_cursor = wrap_cursor
+
+        self._cond = threading.Condition(threading.Lock())
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._affinity = threading.local()
+
+        # Stats
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._failed_pings = 0
+        self._checkout_time_total = 0.0
+        self._checkout_time_max = 0.0
+
+    # Public API
+
+    def connection(self, timeout=None):
+        """Check out a connection; use with `with` to return it automatically"""
+        started = time.perf_counter()
+        record = self._checkout(self.timeout if timeout is None else timeout)
+        elapsed = time.perf_counter() - started
+        with self._cond:
+            self._checkout_time_total += elapsed
+            if elapsed > self._checkout_time_max:
+                self._checkout_time_max = elapsed
+        self._affinity.record = record
+        return PooledConnection(self, record)
+
+    def warm(self):
+        """Open connections until min_size are available"""
+        opened = []
+        try:
+            while True:
+                with self._cond:
+                    if self._size >= self.min_size:
+                        break
+                    self._size += 1
+                try:
+                    opened.append(self._new_record())
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+        finally:
+            with self._cond:
+                for record in opened:
+                    self._idle.append(record)
+                self._cond.notify_all()
+
+    def close(self):
+        """Close every idle connection; checked-out ones close on return"""
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for record in idle:
+            self._close_raw(record)
+
+    def stats(self):
+        """Snapshot of pool counters for sizing and monitoring"""
+        with self._cond:
+            checkouts = self._checkouts
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "checkouts": checkouts,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "connections_created": self._created,
+                "connections_recycled": self._recycled,
+                "failed_pings": self._failed_pings,
+                "avg_checkout_ms": round(self._checkout_time_total * 1000 / checkouts, 3) if checkouts else 0.0,
+                "max_checkout_ms": round(self._checkout_time_max * 1000, 3),
+            }
+
+    # Internals
+
+    def _checkout(self, timeout):
+        deadline = time.monotonic() + timeout
+        waited = False
+        with self._cond:
+            while True:
+                record = self._take_idle()
+                if record is not None:
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(
+                        f"Timed out after {timeout:.1f}s waiting for a database connection "
+                        f"({self._in_use}/{self.max_size} in use); "
+                        "raise DB_POOL_MAX_SIZE or look for slow queries"
+                    )
+                if not waited:
+                    waited = True
+                    self._waits += 1
+                self._cond.wait(remaining)
+            self._in_use += 1
+            self._checkouts += 1
+
+        if record is not None:
+            if self._is_usable(record):
+                return record
+            # Stale or expired: drop it and open a fresh one in the same slot
+            self._close_raw(record)
+        try:
+            return self._new_record()
+        except Exception:
+            self._forget()
+            raise
+
+    def _take_idle(self):
+        if not self._idle:
+            return None
+        preferred = getattr(self._affinity, "record", None)
+        if preferred is not None:
+            try:
+                self._idle.remove(preferred)
+                return preferred
+            except ValueError:
+                pass
+        # LIFO keeps a hot working set and lets surplus connections age out
+        return self._idle.pop()
+
+    def _is_usable(self, record):
+        now = time.monotonic()
+        if self.max_lifetime and now - record.created_at > self.max_lifetime:
+            with self._cond:
+                self._recycled += 1
+            return False
+        if now - record.last_used >= self.ping_interval:
+            try:
+                cursor = record.raw.cursor()
+                cursor.execute(self.ping_query)
+                cursor.fetchall()
+                cursor.close()
+            except Exception as e:
+                logger.warning("Discarding pooled connection that failed pre-ping: %s", e)
+                with self._cond:
+                    self._failed_pings += 1
+                return False
+        return True
+
+    def _new_record(self):
+        record = _Record(self._connect())
+        with self._cond:
+            self._created += 1
+        return record
+
+    def _forget(self):
+        """Give back a slot whose connection could not be (re)opened"""
+        with self._cond:
+            self._size -= 1
+            self._in_use -= 1
+            self._cond.notify()
+
+    def _release(self, record, discard=False):
+        now = time.monotonic()
+        expired = self.max_lifetime and now - record.created_at > self.max_lifetime
+        surplus = []
+        with self._cond:
+            self._in_use -= 1
+            if discard or expired:
+                self._size -= 1
+                if expired:
+                    self._recycled += 1
+            else:
+                record.last_used = now
+                self._idle.append(record)
+                record = None
+            # Trim connections idle for too long, oldest first, down to min_size
+            while (self._idle and self._size > self.min_size
+                   and now - self._idle[0].last_used > self.idle_timeout):
+                surplus.append(self._idle.popleft())
+                self._size -= 1
+            self._cond.notify()
+        if record is not None:
+            self._close_raw(record)
+        for stale in surplus:
+            self._close_raw(stale)
+
+    @staticmethod
+    def _close_raw(record):
+        try:
+            record.raw.close()
+        except Exception:
+            pass
+
+
+def iter_rows(cursor, chunk_size=1000):
+    """Yield rows from an executed cursor in fetchmany() chunks"""
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield from rows
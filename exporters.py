@@ -0,0 +1,205 @@
+"""Constant-memory complaint exports"""
+import csv
+import io
+import json
+import os
+import tempfile
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+
+from openpyxl import Workbook
+
+from db_pool import iter_rows
+
+EXCEL_COLUMNS = ("id", "title", "type", "status", "priority", "student_name", "email",
+                 "submitted_at", "resolved_at", "rating")
+EXCEL_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def write_excel(cursor, where, params, fileobj, chunk_size=1000):
+    """Stream matching complaints into an .xlsx written to fileobj.
+
+    Rows are pulled from the server in fetchmany() chunks and appended to a
+    write-only worksheet, which openpyxl spools to disk instead of keeping
+    cell objects in memory. Returns the number of rows written.
+    """
+    cursor.execute(f"""
+        SELECT {', '.join(EXCEL_COLUMNS)}
+        FROM Complaints
+        {where}
+        ORDER BY submitted_at DESC, id DESC
+    """, params)
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Complaints")
+    sheet.append(EXCEL_COLUMNS)
+    count = 0
+    for row in iter_rows(cursor, chunk_size):
+        sheet.append(list(row))
+        count += 1
+    workbook.save(fileobj)
+    return count
+
+
+def spool_excel(cursor, where, params, directory=None):
+    """Write the export to a temporary .xlsx file and return its path (caller deletes it)"""
+    fd, path = tempfile.mkstemp(suffix=".xlsx", prefix="complaints_", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write_excel(cursor, where, params, f)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+# Bulk pulls (/export/stream)
+
+STREAM_COLUMNS = ("id", "title", "description", "type", "status", "priority", "student_name", "email",
+                  "file_url", "upvotes", "rating", "assigned_to", "submitted_at", "due_date", "resolved_at")
+STREAM_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+STREAM_INCLUDES = {
+    "comments": """
+        SELECT complaint_id, id, user_name, user_type, comment_text, created_at
+        FROM Comments
+        WHERE complaint_id IN ({ids})
+        ORDER BY complaint_id, created_at
+    """,
+    "activity": """
+        SELECT complaint_id, id, action, performed_by, details, created_at
+        FROM ActivityLog
+        WHERE complaint_id IN ({ids})
+        ORDER BY complaint_id, created_at
+    """,
+}
+# Complaint ids per include query (well under the 2100 parameter limit)
+MAX_RELATED_IDS = 1000
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _row_dict(cursor_description, row):
+    return {column[0]: _json_value(value) for column, value in zip(cursor_description, row)}
+
+
+def _fetch_related(cursor, include, ids):
+    """{name: {complaint_id: [rows]}} for one chunk of complaint ids.
+
+    One query per include for every MAX_RELATED_IDS ids, so a large
+    chunk_size cannot exceed the server's parameter limit.
+    """
+    related = {name: {} for name in include}
+    for start in range(0, len(ids), MAX_RELATED_IDS):
+        batch = ids[start:start + MAX_RELATED_IDS]
+        placeholders = ", ".join("?" * len(batch))
+        for name in include:
+            cursor.execute(STREAM_INCLUDES[name].format(ids=placeholders), batch)
+            description = cursor.description
+            grouped = related[name]
+            for row in cursor.fetchall():
+                item = _row_dict(description, row)
+                grouped.setdefault(item.pop("complaint_id"), []).append(item)
+    return related
+
+
+def iter_export(get_connection, where, params, fmt="ndjson", include=(), chunk_size=1000):
+    """Validate the options and return a generator of export text chunks.
+
+    Raises ValueError up front, before any response has been started.
+    """
+    if fmt not in STREAM_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(STREAM_FORMATS)}")
+    unknown = [name for name in include if name not in STREAM_INCLUDES]
+    if unknown:
+        raise ValueError(f"include must be any of: {', '.join(STREAM_INCLUDES)}")
+    return _iter_export(get_connection, where, params, fmt, tuple(include), chunk_size)
+
+
+def _iter_export(get_connection, where, params, fmt, include, chunk_size):
+    """Yield an export as text chunks, one per fetchmany() batch.
+
+    Nothing is buffered beyond a single chunk, so memory stays flat however
+    many rows match and the client starts receiving data immediately.
+    Comments/activity are fetched per chunk with one IN query each, on a
+    second connection because the first is still streaming its result set.
+    In CSV they are embedded as a JSON column. When the generator finishes
+    or is closed by a disconnect, cursors are closed and the read
+    transaction rolled back before the connections go back to the pool.
+    """
+    conn = get_connection()
+    cursor = related_conn = related_cursor = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT {', '.join(STREAM_COLUMNS)}
+            FROM Complaints
+            {where}
+            ORDER BY submitted_at, id
+        """, params)
+        if include:
+            related_conn = get_connection()
+            related_cursor = related_conn.cursor()
+
+        buffer = io.StringIO()
+        writer = None
+        if fmt == "csv":
+            writer = csv.writer(buffer, lineterminator="\n")
+            writer.writerow(STREAM_COLUMNS + tuple(include))
+            yield buffer.getvalue()
+
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            related = {}
+            if related_cursor is not None:
+                related = _fetch_related(related_cursor, include, [row.id for row in rows])
+            buffer.seek(0)
+            buffer.truncate()
+            for row in rows:
+                if writer is not None:
+                    extra = [json.dumps(related[name].get(row.id, [])) for name in include]
+                    writer.writerow([_json_value(value) for value in row] + extra)
+                else:
+                    item = {column: _json_value(value) for column, value in zip(STREAM_COLUMNS, row)}
+                    for name in include:
+                        item[name] = related[name].get(row.id, [])
+                    buffer.write(json.dumps(item))
+                    buffer.write("\n")
+            yield buffer.getvalue()
+    finally:
+        if related_conn is not None:
+            _release(related_conn, related_cursor)
+        _release(conn, cursor)
+
+
+def _release(conn, cursor):
+    """Close the cursor (discarding unread rows), roll back and return the connection to the pool"""
+    try:
+        if cursor is not None:
+            cursor.close()
+        conn.rollback()
+    except Exception:
+        conn.close(discard=True)  # state unknown; don't hand it to the next request
+    else:
+        conn.close()
+
+
+def gzip_chunks(chunks, level=6):
+    """Gzip-compress a stream of text chunks on the fly"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
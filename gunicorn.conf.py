@@ -0,0 +1,26 @@
+"""Gunicorn settings for the Socket.IO app.
+
+    SOCKETIO_ASYNC_MODE=eventlet WEB_CONCURRENCY=4 SOCKETIO_MESSAGE_QUEUE=redis://localhost:6379/0 \
+        gunicorn -c gunicorn.conf.py app:app
+
+More than one worker needs SOCKETIO_MESSAGE_QUEUE (so emits reach clients on
+every worker) and either WebSocket-only clients or sticky sessions in front
+of the workers; see "Scaling the Real-Time Tier" in README.md.
+"""
+import os
+
+_mode = os.getenv("SOCKETIO_ASYNC_MODE", "threading")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = {"eventlet": "eventlet", "gevent": "gevent"}.get(_mode, "gthread")
+# Cooperative workers: concurrent connections per worker; gthread: one thread per connection
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "1000"))
+threads = int(os.getenv("GUNICORN_THREADS", "100"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+
+if workers > 1 and not os.getenv("SOCKETIO_MESSAGE_QUEUE"):
+    print("Warning: WEB_CONCURRENCY > 1 without SOCKETIO_MESSAGE_QUEUE; "
+          "Socket.IO events will only reach clients on the emitting worker.")
@@ -0,0 +1,98 @@
+"""Conditional GET (ETag / 304) for read endpoints from in-process change counters"""
+import functools
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import Response, make_response, request
+
+
+class HttpCache:
+    """Validators derived from change counters instead of from the response body.
+
+    Writers call bump(scope, key) after committing; read endpoints decorated
+    with conditional() build their ETag from the counters of the scopes they
+    depend on, so a matching If-None-Match is answered with 304 before the
+    view (and its queries) runs. The counters live in this process: the ETag
+    includes a per-process epoch so another worker or a restart never
+    validates them, and max_staleness (seconds, 0 = off) additionally rolls
+    the ETag over periodically to bound how long a change made by another
+    process or directly in the database can go unnoticed.
+    """
+
+    def __init__(self, max_staleness=0.0, max_scopes=100000):
+        self.max_staleness = max_staleness
+        self.max_scopes = max_scopes
+        self._lock = threading.Lock()
+        self._reset()
+        self._counters = {"not_modified": 0, "served": 0}
+
+    def _reset(self):
+        self._epoch = uuid.uuid4().hex[:8]
+        self._started = datetime.now(timezone.utc)
+        self._versions = {}  # scope -> (version, changed_at)
+
+    @staticmethod
+    def _scope(name, key=None):
+        return name if key is None else f"{name}:{key}"
+
+    def bump(self, name, key=None):
+        """Record a committed change to a scope (e.g. bump("complaint", 42))"""
+        scope = self._scope(name, key)
+        with self._lock:
+            if scope not in self._versions and len(self._versions) >= self.max_scopes:
+                self._reset()  # forget everything; old ETags stop matching
+            version, _ = self._versions.get(scope, (0, None))
+            self._versions[scope] = (version + 1, datetime.now(timezone.utc))
+
+    def validators(self, scopes, max_staleness=None):
+        """(etag, last_modified) for a list of scope names or (name, key) pairs"""
+        max_staleness = self.max_staleness if max_staleness is None else max_staleness
+        with self._lock:
+            parts = [self._epoch]
+            last_modified = self._started
+            for scope in scopes:
+                name, key = (scope, None) if isinstance(scope, str) else scope
+                version, changed_at = self._versions.get(self._scope(name, key), (0, None))
+                parts.append(str(version))
+                if changed_at is not None and changed_at > last_modified:
+                    last_modified = changed_at
+        if max_staleness:
+            parts.append(str(int(time.time() // max_staleness)))
+        return "-".join(parts), last_modified
+
+    def conditional(self, scopes, cache_control="no-cache", max_staleness=None):
+        """Decorate a view: scopes(**view_args) -> the scopes it depends on.
+
+        GET/HEAD requests whose If-None-Match matches get an empty 304 without
+        calling the view; successful responses get ETag, Last-Modified and
+        the given Cache-Control. Other methods pass straight through.
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method not in ("GET", "HEAD"):
+                    return view(*args, **kwargs)
+                # Read before the view runs: a change made meanwhile yields a newer ETag next time.
+                # "*" is not honoured: without running the view we don't know the resource exists
+                etag, last_modified = self.validators(scopes(**kwargs), max_staleness)
+                if not request.if_none_match.star_tag and request.if_none_match.contains_weak(etag):
+                    self._counters["not_modified"] += 1
+                    response = Response(status=304)
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    self._counters["served"] += 1
+                response.set_etag(etag, weak=True)
+                response.last_modified = last_modified
+                response.headers["Cache-Control"] = cache_control
+                return response
+            return wrapper
+        return decorator
+
+    def stats(self):
+        with self._lock:
+            scopes = len(self._versions)
+        return dict(self._counters, scopes=scopes, epoch=self._epoch)
@@ -0,0 +1,245 @@
+"""In-memory ranked leaderboard behind /leaderboard"""
+import bisect
+import threading
+from datetime import datetime, timedelta
+
+from reconciler import Reconciler
+
+# Points awarded by submit_complaint and update_status
+SUBMIT_POINTS = 10
+RESOLVE_POINTS = 50
+
+WINDOWS = ("all", "weekly", "monthly")
+
+PROFILE_QUERY = """
+    SELECT email, name, points, total_complaints, resolved_complaints
+    FROM UserProfiles
+    WHERE email IS NOT NULL
+"""
+
+# Points earned since the start of the earlier of this week and this month, one row per award
+WINDOW_QUERY = f"""
+    SELECT 'submit' AS kind, id, email, submitted_at AS earned_at, {SUBMIT_POINTS} AS points
+    FROM Complaints WHERE submitted_at >= ? AND email IS NOT NULL
+    UNION ALL
+    SELECT 'resolve', id, email, resolved_at, {RESOLVE_POINTS}
+    FROM Complaints WHERE status = 'Resolved' AND resolved_at >= ? AND email IS NOT NULL
+"""
+
+
+def period_starts(now):
+    """Midnight on Monday of this week and on the 1st of this month"""
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - timedelta(days=today.weekday()), today.replace(day=1)
+
+
+class _Board:
+    """Points per user plus a list sorted by (-points, email)"""
+
+    def __init__(self):
+        self.points = {}
+        self.order = []
+
+    def add(self, email, delta):
+        self.set(email, self.points.get(email, 0) + delta)
+
+    def set(self, email, points):
+        old = self.points.get(email)
+        if old is not None:
+            del self.order[bisect.bisect_left(self.order, (-old, email))]
+        self.points[email] = points
+        bisect.insort(self.order, (-points, email))
+
+    def load(self, points):
+        """Replace the board with {email: points}, sorting once"""
+        self.points = dict(points)
+        self.order = sorted((-value, email) for email, value in self.points.items())
+
+    def rank(self, email):
+        """Competition rank (ties share a rank), or None if the user has no points here"""
+        points = self.points.get(email)
+        if points is None:
+            return None
+        return bisect.bisect_left(self.order, (-points,)) + 1
+
+    def position(self, email):
+        points = self.points.get(email)
+        if points is None:
+            return None
+        return bisect.bisect_left(self.order, (-points, email))
+
+    def page(self, start, stop):
+        return [(email, -neg_points, bisect.bisect_left(self.order, (neg_points,)) + 1)
+                for neg_points, email in self.order[max(0, start):stop]]
+
+
+class _State:
+    def __init__(self, now):
+        self.week_start, self.month_start = period_starts(now)
+        self.boards = {window: _Board() for window in WINDOWS}
+        self.profiles = {}  # email -> [name, total_complaints, resolved_complaints]
+        self.awards = {}  # (kind, complaint_id) -> earned_at, for awards counted in the weekly/monthly boards
+
+    def roll(self, now):
+        """Start empty weekly/monthly boards when a new period begins"""
+        week_start, month_start = period_starts(now)
+        if (week_start, month_start) == (self.week_start, self.month_start):
+            return
+        if week_start != self.week_start:
+            self.week_start = week_start
+            self.boards["weekly"] = _Board()
+        if month_start != self.month_start:
+            self.month_start = month_start
+            self.boards["monthly"] = _Board()
+        since = min(week_start, month_start)
+        self.awards = {award: earned_at for award, earned_at in self.awards.items() if earned_at >= since}
+
+    def award(self, email, award, points, earned_at):
+        """Add one award to the weekly/monthly boards it falls in, once"""
+        if award in self.awards:
+            return
+        self.awards[award] = earned_at
+        if earned_at >= self.week_start:
+            self.boards["weekly"].add(email, points)
+        if earned_at >= self.month_start:
+            self.boards["monthly"].add(email, points)
+
+    def set_profile(self, email, profile, name=None):
+        """Take the user's UserProfiles totals (never moving them backwards)"""
+        current = self.profiles.setdefault(email, [name, 0, 0])
+        if name and not current[0]:
+            current[0] = name
+        current[1] = max(current[1], profile.total_complaints or 0)
+        current[2] = max(current[2], profile.resolved_complaints or 0)
+        board = self.boards["all"]
+        board.set(email, max(board.points.get(email, 0), profile.points or 0))
+
+    def entry(self, email, points, rank):
+        name, total_complaints, resolved_complaints = self.profiles.get(email, (None, 0, 0))
+        return {"rank": rank, "name": name, "email": email, "points": points,
+                "total_complaints": total_complaints, "resolved_complaints": resolved_complaints}
+
+
+class Leaderboard:
+    """User rankings kept in memory and updated on every points change.
+
+    Each window (all time, this week, this month) keeps a list sorted by
+    points, so top-N pages and a user's rank are bisect lookups instead of
+    an ORDER BY over UserProfiles. Call on_submit/on_resolved after each
+    committed points update with the user's UserProfiles row as updated
+    (OUTPUT INSERTED...): all-time points and profile counters are set from
+    it rather than incremented, and weekly/monthly awards are keyed by
+    complaint, so replaying a hook is harmless. rebuild_from() reloads
+    everything from the database to correct drift (points changed by other
+    processes, failed hooks); hooks that fire while it is reading are
+    replayed on top, and those the snapshot already saw change nothing.
+    Weekly and monthly boards restart empty when a new period begins.
+    """
+
+    def __init__(self, clock=datetime.now):
+        self.clock = clock
+        self.ready = False
+        self._lock = threading.Lock()
+        self._state = _State(clock())
+        self._journal = None
+        self._reconciler = Reconciler("Leaderboard")
+
+    # Write hooks
+
+    def on_submit(self, email, complaint_id, profile, name=None):
+        self._apply(email, ("submit", complaint_id), SUBMIT_POINTS, profile, name)
+
+    def on_resolved(self, email, complaint_id, profile):
+        self._apply(email, ("resolve", complaint_id), RESOLVE_POINTS, profile)
+
+    def _apply(self, email, award, points, profile, name=None):
+        if not email:
+            return
+        try:
+            award = (award[0], int(award[1]))
+        except (TypeError, ValueError):
+            return
+        with self._lock:
+            now = self.clock()
+            self._state.roll(now)
+            self._state.award(email, award, points, now)
+            self._state.set_profile(email, profile, name)
+            if self._journal is not None:
+                self._journal.append((email, award, points, now, profile, name))
+
+    # Reads
+
+    @staticmethod
+    def check_window(window):
+        """Raise ValueError for an unknown window name"""
+        if window not in WINDOWS:
+            raise ValueError(f"window must be one of: {', '.join(WINDOWS)}")
+
+    def top(self, window="all", limit=10, offset=0):
+        """(entries, ranked user count) for one page of the window"""
+        self.check_window(window)
+        with self._lock:
+            self._state.roll(self.clock())
+            board = self._state.boards[window]
+            entries = [self._state.entry(email, points, rank)
+                       for email, points, rank in board.page(offset, offset + limit)]
+            return entries, len(board.order)
+
+    def rank(self, email, window="all"):
+        """The user's rank in the window, or None if they have no points there"""
+        self.check_window(window)
+        with self._lock:
+            self._state.roll(self.clock())
+            return self._state.boards[window].rank(email)
+
+    def around(self, email, window="all", before=2, after=2):
+        """(the user's entry, entries from `before` places above to `after` below), or (None, [])"""
+        self.check_window(window)
+        with self._lock:
+            self._state.roll(self.clock())
+            board = self._state.boards[window]
+            position = board.position(email)
+            if position is None:
+                return None, []
+            entries = [self._state.entry(other, points, rank)
+                       for other, points, rank in board.page(position - before, position + after + 1)]
+            return self._state.entry(email, board.points[email], board.rank(email)), entries
+
+    def stats(self):
+        with self._lock:
+            self._state.roll(self.clock())
+            return {window: len(board.order) for window, board in self._state.boards.items()}
+
+    # Reconciliation
+
+    def rebuild_from(self, cursor):
+        """Reload profiles and this week's/month's points with PROFILE_QUERY and WINDOW_QUERY"""
+        with self._lock:
+            self._journal = []
+        try:
+            now = self.clock()
+            fresh = _State(now)
+            since = min(fresh.week_start, fresh.month_start)
+            cursor.execute(PROFILE_QUERY)
+            points = {}
+            for row in cursor.fetchall():
+                fresh.profiles[row.email] = [row.name, row.total_complaints or 0, row.resolved_complaints or 0]
+                points[row.email] = row.points or 0
+            fresh.boards["all"].load(points)
+            cursor.execute(WINDOW_QUERY, (since, since))
+            for row in cursor.fetchall():
+                fresh.award(row.email, (row.kind, int(row.id)), row.points, row.earned_at)
+            with self._lock:
+                fresh.roll(self.clock())
+                for email, award, points, earned_at, profile, name in self._journal:
+                    fresh.award(email, award, points, earned_at)
+                    fresh.set_profile(email, profile, name)
+                self._state = fresh
+                self.ready = True
+        finally:
+            with self._lock:
+                self._journal = None
+
+    def start_reconciler(self, reconcile, interval):
+        """Run reconcile() now and then every interval seconds in a daemon thread"""
+        self._reconciler.start(reconcile, interval)
@@ -0,0 +1,284 @@
+"""Request, Socket.IO and subsystem metrics in Prometheus text format (/metrics)"""
+import bisect
+import functools
+import logging
+import re
+import threading
+import time
+
+from flask import g, request
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets; +Inf is implied
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _metric_name(*parts):
+    return re.sub(r"[^a-zA-Z0-9_]", "_", "_".join(str(part) for part in parts if part != ""))
+
+
+def latency_summary(latencies):
+    """p50/p95/max of recent latency samples (ms) for a subsystem's stats(), or None without samples"""
+    latencies = sorted(latencies)
+    if not latencies:
+        return None
+    return {
+        "p50": round(latencies[len(latencies) // 2], 1),
+        "p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1),
+        "max": round(latencies[-1], 1),
+    }
+
+
+class Histogram:
+    """Counts per latency bucket; observe() is one bisect and two additions"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate by linear interpolation inside the bucket holding the q-th observation"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[index - 1] if index else 0.0
+                if index == len(self.buckets):
+                    return lower  # beyond the last bound
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def samples(self, name, **labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            yield f"{name}_bucket{_labels(**labels, le=bound)} {cumulative}"
+        yield f"{name}_sum{_labels(**labels)} {self.sum:.6f}"
+        yield f"{name}_count{_labels(**labels)} {self.count}"
+
+
+class Metrics:
+    """In-process counters and histograms rendered for Prometheus.
+
+    instrument_app() times every Flask request by route template (so label
+    cardinality stays bounded) and tracks in-flight requests;
+    instrument_socketio() wraps handlers registered afterwards with
+    socketio.on() to count events and time them. register() adds a
+    collector whose stats() dict is exported as gauges when /metrics is
+    scraped, so existing subsystem counters cost nothing until then.
+    Values are per process: scrape every worker.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._requests = {}    # (endpoint, method) -> [requests, errors, Histogram]
+        self._in_flight = {}   # endpoint -> requests being handled
+        self._events = {}      # event -> [events, errors, Histogram]
+        self._collectors = {}  # prefix -> stats function
+        self._started = time.time()
+
+    # Flask
+
+    def instrument_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    @staticmethod
+    def _endpoint():
+        rule = request.url_rule
+        return rule.rule if rule is not None else "unmatched"
+
+    def _before_request(self):
+        g.metrics_started = time.perf_counter()
+        endpoint = self._endpoint()
+        with self._lock:
+            self._in_flight[endpoint] = self._in_flight.get(endpoint, 0) + 1
+
+    def _after_request(self, response):
+        g.metrics_status = response.status_code
+        return response
+
+    def _teardown_request(self, exc):
+        started = g.pop("metrics_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        status = 500 if exc is not None else g.pop("metrics_status", 500)
+        endpoint = self._endpoint()
+        key = (endpoint, request.method)
+        with self._lock:
+            self._in_flight[endpoint] -= 1
+            entry = self._requests.get(key)
+            if entry is None:
+                entry = self._requests[key] = [0, 0, Histogram(self.buckets)]
+            entry[0] += 1
+            if status >= 500:
+                entry[1] += 1
+            entry[2].observe(elapsed)
+
+    # Socket.IO
+
+    def instrument_socketio(self, socketio):
+        """Time handlers registered with socketio.on() from now on"""
+        on = socketio.on
+
+        def instrumented_on(message, namespace=None):
+            register = on(message, namespace)
+
+            def decorator(handler):
+                register(self._timed_event(message, handler))
+                return handler
+            return decorator
+
+        socketio.on = instrumented_on
+
+    def _timed_event(self, event, handler):
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            failed = True
+            try:
+                result = handler(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    entry = self._events.get(event)
+                    if entry is None:
+                        entry = self._events[event] = [0, 0, Histogram(self.buckets)]
+                    entry[0] += 1
+                    entry[1] += failed
+                    entry[2].observe(elapsed)
+        return wrapper
+
+    # Subsystem stats
+
+    def register(self, prefix, stats):
+        """Export the numbers in stats() (nested dicts flattened) as app_<prefix>_<key> gauges"""
+        self._collectors[prefix] = stats
+
+    def _collect(self):
+        errors = []
+        for prefix, stats in list(self._collectors.items()):
+            try:
+                values = stats()
+            except Exception as e:
+                logger.warning("Metrics collector %s failed: %s", prefix, e)
+                errors.append(prefix)
+                continue
+            yield from self._flatten(("app", prefix), values)
+        for prefix in errors:
+            yield _metric_name("app", "collector_failed") + _labels(collector=prefix), 1
+
+    def _flatten(self, parts, value):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                yield from self._flatten(parts + (key,), item)
+        elif isinstance(value, bool):
+            yield _metric_name(*parts), int(value)
+        elif isinstance(value, (int, float)):
+            yield _metric_name(*parts), value
+
+    # Exposition
+
+    def render(self):
+        with self._lock:
+            requests = [(key, entry[0], entry[1], self._copy(entry[2])) for key, entry in self._requests.items()]
+            in_flight = dict(self._in_flight)
+            events = [(event, entry[0], entry[1], self._copy(entry[2])) for event, entry in self._events.items()]
+
+        lines = []
+        family = lines.append
+
+        family("# HELP http_requests_total Requests handled, by route template and method")
+        family("# TYPE http_requests_total counter")
+        for (endpoint, method), count, _, _ in requests:
+            family(f"http_requests_total{_labels(endpoint=endpoint, method=method)} {count}")
+        family("# HELP http_request_errors_total Requests that failed with a 5xx status or an exception")
+        family("# TYPE http_request_errors_total counter")
+        for (endpoint, method), _, errors, _ in requests:
+            family(f"http_request_errors_total{_labels(endpoint=endpoint, method=method)} {errors}")
+        family("# HELP http_request_duration_seconds Request latency")
+        family("# TYPE http_request_duration_seconds histogram")
+        for (endpoint, method), _, _, histogram in requests:
+            lines.extend(histogram.samples("http_request_duration_seconds", endpoint=endpoint, method=method))
+        family("# HELP http_request_duration_quantile_seconds Latency quantiles estimated from the histogram")
+        family("# TYPE http_request_duration_quantile_seconds gauge")
+        for (endpoint, method), _, _, histogram in requests:
+            for q in QUANTILES:
+                value = histogram.quantile(q)
+                if value is not None:
+                    family(f"http_request_duration_quantile_seconds"
+                           f"{_labels(endpoint=endpoint, method=method, quantile=q)} {value:.6f}")
+        family("# HELP http_requests_in_flight Requests currently being handled")
+        family("# TYPE http_requests_in_flight gauge")
+        for endpoint, count in in_flight.items():
+            family(f"http_requests_in_flight{_labels(endpoint=endpoint)} {count}")
+
+        family("# HELP socketio_events_total Socket.IO events handled")
+        family("# TYPE socketio_events_total counter")
+        for event, count, _, _ in events:
+            family(f"socketio_events_total{_labels(event=event)} {count}")
+        family("# HELP socketio_event_errors_total Socket.IO handlers that raised")
+        family("# TYPE socketio_event_errors_total counter")
+        for event, _, errors, _ in events:
+            family(f"socketio_event_errors_total{_labels(event=event)} {errors}")
+        family("# HELP socketio_event_duration_seconds Socket.IO handler duration")
+        family("# TYPE socketio_event_duration_seconds histogram")
+        for event, _, _, histogram in events:
+            lines.extend(histogram.samples("socketio_event_duration_seconds", event=event))
+
+        threads = {}
+        for thread in threading.enumerate():
+            name = re.sub(r"[-_ ]?\d+.*$", "", thread.name) or thread.name
+            threads[name] = threads.get(name, 0) + 1
+        family("# HELP app_threads Live threads by name (numbered pool threads grouped)")
+        family("# TYPE app_threads gauge")
+        for name, count in sorted(threads.items()):
+            family(f"app_threads{_labels(name=name)} {count}")
+        family("# TYPE process_start_time_seconds gauge")
+        family(f"process_start_time_seconds {self._started:.3f}")
+
+        seen = set()
+        for name, value in self._collect():
+            base = name.split("{", 1)[0]
+            if base not in seen:
+                seen.add(base)
+                family(f"# TYPE {base} gauge")
+            family(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _copy(histogram):
+        copy = Histogram(histogram.buckets)
+        copy.counts = list(histogram.counts)
+        copy.sum = histogram.sum
+        copy.count = histogram.count
+        return copy
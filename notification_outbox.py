@@ -0,0 +1,374 @@
+"""Durable outbox for Logic App notifications, drained by a fixed worker pool"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import latency_summary
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxMessage:
+    """A claimed notification awaiting delivery"""
+
+    __slots__ = ("id", "payload", "attempts", "created_at")
+
+    def __init__(self, id, payload, attempts, created_at):
+        self.id = id
+        self.payload = payload
+        self.attempts = attempts
+        self.created_at = created_at
+
+
+class SqlOutboxStore:
+    """Outbox rows in the NotificationOutbox table.
+
+    transactional is True: submissions write their row in the same batch as
+    the complaint (see complaint_store.insert_complaint), so a committed
+    complaint always has its notification and a rolled back one never does.
+    Claims use READPAST/UPDLOCK with a lease, so several workers and app
+    instances can drain the table without handing out the same row twice.
+    """
+
+    transactional = True
+
+    def __init__(self, get_connection):
+        self.get_connection = get_connection
+
+    def enqueue(self, payload):
+        with self.get_connection() as conn:
+            conn.cursor().execute("INSERT INTO NotificationOutbox (payload) VALUES (?)", (json.dumps(payload),))
+
+    def claim(self, limit, lease_seconds):
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                WITH batch AS (
+                    SELECT TOP (?) *
+                    FROM NotificationOutbox WITH (READPAST, UPDLOCK, ROWLOCK)
+                    WHERE status = 'pending'
+                      AND next_attempt_at <= SYSUTCDATETIME()
+                      AND (claimed_until IS NULL OR claimed_until < SYSUTCDATETIME())
+                    ORDER BY id
+                )
+                UPDATE batch
+                SET claimed_until = DATEADD(second, ?, SYSUTCDATETIME()), attempts = attempts + 1
+                OUTPUT INSERTED.id, INSERTED.payload, INSERTED.attempts, INSERTED.created_at
+            """, (limit, lease_seconds))
+            rows = cursor.fetchall()
+        return [OutboxMessage(row.id, json.loads(row.payload), row.attempts, row.created_at) for row in rows]
+
+    def mark_delivered(self, messages):
+        ids = [message.id for message in messages]
+        with self.get_connection() as conn:
+            conn.cursor().execute(f"""
+                UPDATE NotificationOutbox
+                SET status = 'delivered', delivered_at = SYSUTCDATETIME(), claimed_until = NULL, last_error = NULL
+                WHERE id IN ({', '.join('?' * len(ids))})
+            """, ids)
+
+    def mark_failed(self, messages, error, next_attempt_at):
+        """Schedule a retry at next_attempt_at (UTC), or dead-letter when it is None"""
+        ids = [message.id for message in messages]
+        placeholders = ', '.join('?' * len(ids))
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            if next_attempt_at is None:
+                cursor.execute(f"""
+                    UPDATE NotificationOutbox
+                    SET status = 'dead', claimed_until = NULL, last_error = LEFT(?, 1000)
+                    WHERE id IN ({placeholders})
+                """, [error] + ids)
+            else:
+                cursor.execute(f"""
+                    UPDATE NotificationOutbox
+                    SET next_attempt_at = ?, claimed_until = NULL, last_error = LEFT(?, 1000)
+                    WHERE id IN ({placeholders})
+                """, [next_attempt_at, error] + ids)
+
+    def depth(self):
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) AS depth FROM NotificationOutbox WHERE status = 'pending'")
+            return cursor.fetchone().depth
+
+    def purge(self, retention_days):
+        with self.get_connection() as conn:
+            conn.cursor().execute("""
+                DELETE FROM NotificationOutbox
+                WHERE status = 'delivered' AND delivered_at < DATEADD(day, -?, SYSUTCDATETIME())
+            """, (retention_days,))
+
+
+class SpoolOutboxStore:
+    """Outbox as one JSON file per notification in a local directory.
+
+    For deployments without a database. Files are written atomically and
+    deleted once delivered; dead letters move to dead/. Claims are tracked
+    in memory, so only one process should drain a spool directory.
+    """
+
+    transactional = False
+
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+        self.dead_directory = os.path.join(self.directory, "dead")
+        self._lock = threading.Lock()
+        self._claimed = set()
+
+    def _path(self, message_id):
+        return os.path.join(self.directory, message_id)
+
+    def _write(self, message_id, record):
+        os.makedirs(self.dead_directory, exist_ok=True)
+        partial = self._path(message_id) + ".tmp"
+        with open(partial, "w", encoding="utf-8") as f:
+            json.dump(record, f)
+        os.replace(partial, self._path(message_id))
+
+    def enqueue(self, payload):
+        now = datetime.utcnow()
+        message_id = f"{now.strftime('%Y%m%d%H%M%S%f')}_{uuid.uuid4().hex}.json"
+        self._write(message_id, {"payload": payload, "attempts": 0, "created_at": now.isoformat(),
+                                 "next_attempt_at": now.isoformat()})
+
+    def _pending(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name for name in os.listdir(self.directory) if name.endswith(".json"))
+
+    def claim(self, limit, lease_seconds):
+        now = datetime.utcnow()
+        messages = []
+        with self._lock:
+            for name in self._pending():
+                if len(messages) >= limit:
+                    break
+                if name in self._claimed:
+                    continue
+                try:
+                    with open(self._path(name), encoding="utf-8") as f:
+                        record = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                if datetime.fromisoformat(record["next_attempt_at"]) > now:
+                    continue
+                self._claimed.add(name)
+                messages.append(OutboxMessage(name, record["payload"], record["attempts"] + 1,
+                                              datetime.fromisoformat(record["created_at"])))
+        return messages
+
+    def _release(self, messages):
+        with self._lock:
+            for message in messages:
+                self._claimed.discard(message.id)
+
+    def mark_delivered(self, messages):
+        for message in messages:
+            try:
+                os.remove(self._path(message.id))
+            except FileNotFoundError:
+                pass
+        self._release(messages)
+
+    def mark_failed(self, messages, error, next_attempt_at):
+        for message in messages:
+            record = {"payload": message.payload, "attempts": message.attempts,
+                      "created_at": message.created_at.isoformat(), "last_error": error[:1000]}
+            if next_attempt_at is None:
+                self._write(message.id, record)
+                os.replace(self._path(message.id), os.path.join(self.dead_directory, message.id))
+            else:
+                record["next_attempt_at"] = next_attempt_at.isoformat()
+                self._write(message.id, record)
+        self._release(messages)
+
+    def depth(self):
+        return len(self._pending())
+
+    def purge(self, retention_days):
+        pass  # delivered notifications are deleted immediately
+
+
+class NotificationOutbox:
+    """Delivers queued notifications to a webhook with a fixed pool of workers.
+
+    Workers share one requests.Session (keep-alive connections to the Logic
+    App). With batch=True each claim is POSTed as a single JSON array.
+    Failures are retried with exponential backoff and jitter up to
+    max_attempts, then dead-lettered. Call notify() after enqueueing so an
+    idle worker picks the message up without waiting for the next poll.
+    enqueue() writes to fallback_store (e.g. a local spool) when the store
+    fails, such as the database a failed submission could not reach; the
+    workers drain both.
+    """
+
+    def __init__(self, store, url, workers=4, batch_size=20, batch=False, max_attempts=8,
+                 base_delay=2.0, max_delay=600.0, timeout=5.0, poll_interval=5.0, lease_seconds=60,
+                 retention_days=7, fallback_store=None):
+        self.store = store
+        self.fallback_store = fallback_store
+        self._stores = [store] if fallback_store is None else [store, fallback_store]
+        self.url = url
+        self.workers = max(1, workers)
+        self.batch_size = batch_size if batch else 1
+        self.batch = batch
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.lease_seconds = max(lease_seconds, int(timeout * self.batch_size) + 5)
+        self.retention_days = retention_days
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._threads = []
+        self._wake = threading.Condition()
+        self._stats_lock = threading.Lock()
+        self._latencies = deque(maxlen=1000)  # enqueue -> delivered, ms
+        self._counters = {"delivered": 0, "failed_attempts": 0, "dead_lettered": 0, "spooled": 0}
+        self._last_error = None
+        self._depth = None
+        self._depth_checked = 0.0
+        self._last_purge = 0.0
+
+    @property
+    def enabled(self):
+        return bool(self.url)
+
+    def start(self):
+        """Start the worker threads (no-op without a webhook URL)"""
+        if self._threads or not self.enabled:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"outbox-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def enqueue(self, payload):
+        """Queue a notification outside of a complaint transaction"""
+        try:
+            self.store.enqueue(payload)
+        except Exception as e:
+            if self.fallback_store is None:
+                raise
+            logger.warning("Outbox store unavailable, spooling notification: %s", e)
+            self.fallback_store.enqueue(payload)
+            with self._stats_lock:
+                self._counters["spooled"] += 1
+        self.notify()
+
+    def notify(self):
+        with self._wake:
+            self._wake.notify()
+
+    def _run(self):
+        while True:
+            claimed = False
+            for store in self._stores:
+                try:
+                    messages = store.claim(self.batch_size, self.lease_seconds)
+                except Exception as e:
+                    logger.warning("Could not claim notifications: %s", e)
+                    continue
+                if not messages:
+                    continue
+                claimed = True
+                try:
+                    self._deliver(store, messages)
+                except Exception as e:
+                    # Bookkeeping failed; the lease expires and the rows are claimed again
+                    logger.warning("Could not record notification delivery: %s", e)
+            if not claimed:
+                self._maybe_purge()
+                with self._wake:
+                    self._wake.wait(self.poll_interval)
+
+    def _post(self, body):
+        response = self.session.post(self.url, json=body, timeout=self.timeout)
+        response.raise_for_status()
+
+    def _deliver(self, store, messages):
+        if self.batch:
+            try:
+                self._post([message.payload for message in messages])
+            except Exception as e:
+                self._failed(store, messages, e)
+            else:
+                self._delivered(store, messages)
+            return
+        for message in messages:
+            try:
+                self._post(message.payload)
+            except Exception as e:
+                self._failed(store, [message], e)
+            else:
+                self._delivered(store, [message])
+
+    def _delivered(self, store, messages):
+        store.mark_delivered(messages)
+        now = datetime.utcnow()
+        with self._stats_lock:
+            self._counters["delivered"] += len(messages)
+            for message in messages:
+                self._latencies.append(max(0.0, (now - message.created_at).total_seconds() * 1000))
+
+    def _failed(self, store, messages, error):
+        attempts = max(message.attempts for message in messages)
+        error = f"{type(error).__name__}: {error}"
+        if attempts >= self.max_attempts:
+            next_attempt_at = None
+            logger.error("Dropping notification after %d attempts: %s", attempts, error)
+        else:
+            delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+            next_attempt_at = datetime.utcnow() + timedelta(seconds=delay * random.uniform(0.5, 1.0))
+        store.mark_failed(messages, error, next_attempt_at)
+        with self._stats_lock:
+            self._counters["failed_attempts"] += len(messages)
+            if next_attempt_at is None:
+                self._counters["dead_lettered"] += len(messages)
+            self._last_error = error
+
+    def _maybe_purge(self):
+        if time.monotonic() - self._last_purge < 3600:
+            return
+        self._last_purge = time.monotonic()
+        try:
+            for store in self._stores:
+                store.purge(self.retention_days)
+        except Exception as e:
+            logger.warning("Could not purge delivered notifications: %s", e)
+
+    def queue_depth(self, max_age=5.0):
+        """Pending notifications, cached for max_age seconds"""
+        now = time.monotonic()
+        if self._depth is None or now - self._depth_checked > max_age:
+            self._depth = sum(store.depth() for store in self._stores)
+            self._depth_checked = now
+        return self._depth
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._counters)
+            stats["latency_ms"] = latency_summary(self._latencies)
+            stats["last_error"] = self._last_error
+        try:
+            stats["queue_depth"] = self.queue_depth()
+        except Exception:
+            stats["queue_depth"] = None
+        stats["workers"] = len(self._threads)
+        stats["batch_size"] = self.batch_size
+        return stats
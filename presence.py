@@ -0,0 +1,153 @@
+"""Complaint room membership counts and debounced typing indicators"""
+import logging
+import threading
+import time
+
+from event_dispatcher import complaint_room
+
+logger = logging.getLogger(__name__)
+
+
+class _Typing:
+    __slots__ = ("user_name", "last", "expires")
+
+    def __init__(self, user_name, now, timeout):
+        self.user_name = user_name
+        self.last = now
+        self.expires = now + timeout
+
+
+class Presence:
+    """Who is in each complaint room and who is typing there.
+
+    Clients send a 'typing' event per keystroke; only transitions reach the
+    room: one user_typing {typing: true} when a user starts and one
+    {typing: false} when they send a message, say they stopped, leave, or
+    send nothing for typing_timeout seconds (checked by a background sweep).
+    Keystrokes closer together than min_interval are ignored outright, so
+    the cost per user stays constant however fast they type. Membership is
+    counted per connection; changes are published as coalesced 'presence'
+    events so a burst of joins costs one message per room. Counts cover the
+    connections of this process only, so with several workers sharing rooms
+    through a message queue pass publish_counts=False: each worker would
+    otherwise overwrite the room's count with its own share.
+    """
+
+    def __init__(self, socketio, publish, typing_timeout=3.0, min_interval=0.5, sweep_interval=0.5,
+                 publish_counts=True):
+        self.socketio = socketio
+        self.publish = publish
+        self.publish_counts = publish_counts
+        self.typing_timeout = typing_timeout
+        self.min_interval = min_interval
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._members = {}  # complaint_id -> set of sids
+        self._rooms = {}    # sid -> set of complaint_ids
+        self._typing = {}   # (complaint_id, sid) -> _Typing
+        self._sweeper = None
+        self._counters = {"typing_events": 0, "throttled": 0, "typing_emitted": 0}
+
+    # Membership
+
+    def join(self, sid, complaint_id):
+        complaint_id = int(complaint_id)
+        with self._lock:
+            members = self._members.setdefault(complaint_id, set())
+            if sid in members:
+                return
+            members.add(sid)
+            self._rooms.setdefault(sid, set()).add(complaint_id)
+            count = len(members)
+        self._publish_count(complaint_id, count)
+
+    def leave(self, sid, complaint_id):
+        complaint_id = int(complaint_id)
+        self.stop_typing(sid, complaint_id)
+        with self._lock:
+            members = self._members.get(complaint_id)
+            if not members or sid not in members:
+                return
+            members.discard(sid)
+            if not members:
+                del self._members[complaint_id]
+            rooms = self._rooms.get(sid)
+            if rooms:
+                rooms.discard(complaint_id)
+                if not rooms:
+                    del self._rooms[sid]
+            count = len(members)
+        self._publish_count(complaint_id, count)
+
+    def disconnect(self, sid):
+        with self._lock:
+            rooms = list(self._rooms.get(sid, ()))
+        for complaint_id in rooms:
+            self.leave(sid, complaint_id)
+
+    def count(self, complaint_id):
+        with self._lock:
+            return len(self._members.get(int(complaint_id), ()))
+
+    def _publish_count(self, complaint_id, count):
+        if not self.publish_counts:
+            return
+        self.publish('presence', {'complaint_id': complaint_id, 'viewers': count},
+                     [complaint_room(complaint_id)], coalesce_key=complaint_id)
+
+    # Typing
+
+    def typing(self, sid, complaint_id, user_name, typing=True):
+        """Handle one client typing event; emits only on start/stop transitions"""
+        if not typing:
+            self.stop_typing(sid, complaint_id)
+            return
+        key = (int(complaint_id), sid)
+        now = time.monotonic()
+        with self._lock:
+            self._counters["typing_events"] += 1
+            state = self._typing.get(key)
+            if state is not None:
+                if now - state.last < self.min_interval:
+                    self._counters["throttled"] += 1
+                else:
+                    state.last = now
+                    state.expires = now + self.typing_timeout
+                return
+            self._typing[key] = _Typing(user_name, now, self.typing_timeout)
+            if self._sweeper is None:
+                self._sweeper = self.socketio.start_background_task(self._sweep)
+        self._emit_typing(key, user_name, True)
+
+    def stop_typing(self, sid, complaint_id):
+        key = (int(complaint_id), sid)
+        with self._lock:
+            state = self._typing.pop(key, None)
+        if state is not None:
+            self._emit_typing(key, state.user_name, False)
+
+    def _emit_typing(self, key, user_name, typing):
+        complaint_id, sid = key
+        self.socketio.emit('user_typing', {'complaint_id': complaint_id, 'user_name': user_name, 'typing': typing},
+                           to=complaint_room(complaint_id), skip_sid=sid)
+        with self._lock:
+            self._counters["typing_emitted"] += 1
+
+    def _sweep(self):
+        while True:
+            self.socketio.sleep(self.sweep_interval)
+            now = time.monotonic()
+            with self._lock:
+                expired = [(key, state) for key, state in self._typing.items() if state.expires <= now]
+                for key, _ in expired:
+                    del self._typing[key]
+            for key, state in expired:
+                try:
+                    self._emit_typing(key, state.user_name, False)
+                except Exception as e:
+                    logger.warning("Could not send typing stop: %s", e)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, rooms=len(self._members), connections=len(self._rooms),
+                        typing=len(self._typing))
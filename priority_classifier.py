@@ -0,0 +1,153 @@
+"""Keyword-based complaint priority classifier compiled into a single regex"""
+import json
+import re
+
+PRIORITY_LEVELS = ("High", "Medium", "Low")  # most to least severe
+DEFAULT_PRIORITY = "Low"
+DUE_DAYS = {"High": 1, "Medium": 3, "Low": 7}  # days from submission until a complaint is due
+
+DEFAULT_RULES = [
+    {"keyword": "urgent", "priority": "High", "weight": 1.0},
+    {"keyword": "emergency", "priority": "High", "weight": 1.0},
+    {"keyword": "critical", "priority": "High", "weight": 1.0},
+    {"keyword": "immediately", "priority": "High", "weight": 1.0},
+    {"keyword": "asap", "priority": "High", "weight": 1.0},
+    {"keyword": "severe", "priority": "High", "weight": 1.0},
+    {"keyword": "important", "priority": "Medium", "weight": 1.0},
+    {"keyword": "soon", "priority": "Medium", "weight": 1.0},
+    {"keyword": "attention", "priority": "Medium", "weight": 1.0},
+    {"keyword": "issue", "priority": "Medium", "weight": 1.0},
+]
+
+# Score a level needs to be assigned; with weight 1.0 rules a single match is enough
+DEFAULT_THRESHOLDS = {"High": 1.0, "Medium": 1.0}
+
+
+def _normalize(keyword):
+    return " ".join(keyword.lower().split())
+
+
+class PriorityClassifier:
+    """Weighted multi-pattern matcher.
+
+    All keywords are compiled into one case-insensitive alternation with word
+    boundaries, so a text is scanned once no matter how many rules exist and
+    "tissue" no longer counts as "issue". A keyword ending in "*" matches as
+    a prefix ("leak*" matches "leaking"); spaces in a keyword match any
+    whitespace. Each match adds the rule's weight to its priority; the most
+    severe priority whose total reaches its threshold wins.
+    """
+
+    def __init__(self, rules=None, thresholds=None, default=DEFAULT_PRIORITY):
+        self.rules = [dict(rule) for rule in (DEFAULT_RULES if rules is None else rules)]
+        self.thresholds = dict(DEFAULT_THRESHOLDS if thresholds is None else thresholds)
+        if default not in PRIORITY_LEVELS:
+            raise ValueError(f"Unknown default priority {default!r}")
+        self.default = default
+
+        self._exact = {}    # normalized keyword -> (priority, weight)
+        self._prefixes = []  # (prefix, priority, weight)
+        patterns = []
+        for rule in self.rules:
+            keyword = rule["keyword"].strip()
+            priority = rule["priority"]
+            if priority not in PRIORITY_LEVELS:
+                raise ValueError(f"Unknown priority {priority!r} for keyword {keyword!r}")
+            weight = float(rule.get("weight", 1.0))
+            is_prefix = keyword.endswith("*")
+            keyword = _normalize(keyword.rstrip("*"))
+            if not keyword:
+                continue
+            body = r"\s+".join(re.escape(part) for part in keyword.split(" "))
+            if is_prefix:
+                self._prefixes.append((keyword, priority, weight))
+                patterns.append(body + r"\w*")
+            else:
+                self._exact[keyword] = (priority, weight)
+                patterns.append(body)
+        # Longest first so overlapping phrases prefer the more specific rule
+        patterns.sort(key=len, reverse=True)
+        self._regex = re.compile(r"\b(?:" + "|".join(patterns) + r")\b", re.IGNORECASE) if patterns else None
+        self._levels = [level for level in PRIORITY_LEVELS if level in self.thresholds]
+
+    @classmethod
+    def from_file(cls, path):
+        """Load {"rules": [...], "thresholds": {...}} from a JSON file"""
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+        return cls(config.get("rules"), config.get("thresholds"), config.get("default", DEFAULT_PRIORITY))
+
+    @classmethod
+    def from_db(cls, cursor, thresholds=None):
+        """Load active rules from the PriorityRules table"""
+        cursor.execute("SELECT keyword, priority, weight FROM PriorityRules WHERE is_active = 1")
+        rules = [{"keyword": row.keyword, "priority": row.priority, "weight": row.weight}
+                 for row in cursor.fetchall()]
+        return cls(rules, thresholds)
+
+    def _rule_for(self, matched):
+        key = _normalize(matched)
+        rule = self._exact.get(key)
+        if rule is not None:
+            return rule
+        for prefix, priority, weight in self._prefixes:
+            if key.startswith(prefix):
+                return priority, weight
+        return None
+
+    def classify_text(self, text):
+        if self._regex is None or not text:
+            return self.default
+        top = self._levels[0] if self._levels else None
+        totals = {}
+        for match in self._regex.finditer(text):
+            rule = self._rule_for(match.group(0))
+            if rule is None:
+                continue
+            priority, weight = rule
+            totals[priority] = totals.get(priority, 0.0) + weight
+            # Nothing can outrank the most severe level; stop scanning early
+            if priority == top and totals[priority] >= self.thresholds[top]:
+                return top
+        for level in self._levels:
+            if totals.get(level, 0.0) >= self.thresholds[level]:
+                return level
+        return self.default
+
+    def classify(self, title, description):
+        """Priority for a complaint's title and description"""
+        return self.classify_text(f"{title or ''}\n{description or ''}")
+
+
+def rescore_complaints(conn, classifier, include_resolved=False, chunk_size=1000):
+    """Re-classify stored complaints and write back only the priorities that changed.
+
+    A changed priority also moves the due date to DUE_DAYS after submission.
+    Rows are streamed in fetchmany() chunks and updates are sent with
+    fast_executemany. Returns a list of (id, new_priority).
+    """
+    cursor = conn.cursor()
+    query = "SELECT id, title, description, priority FROM Complaints"
+    if not include_resolved:
+        query += " WHERE status IS NULL OR status != 'Resolved'"
+    cursor.execute(query)
+
+    changes = []
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        for row in rows:
+            priority = classifier.classify(row.title, row.description)
+            if priority != row.priority:
+                changes.append((row.id, priority))
+
+    if changes:
+        writer = conn.cursor()
+        writer.fast_executemany = True
+        for start in range(0, len(changes), chunk_size):
+            chunk = changes[start:start + chunk_size]
+            writer.executemany(
+                "UPDATE Complaints SET priority = ?, due_date = DATEADD(day, ?, submitted_at) WHERE id = ?",
+                [(priority, DUE_DAYS[priority], complaint_id) for complaint_id, priority in chunk])
+    return changes
@@ -0,0 +1,213 @@
+"""Cached QR code rendering (PNG, SVG and printable PDF sheets)"""
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import qrcode
+from PIL import Image
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+QR_FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+
+BOX_SIZE = 10
+BORDER = 5
+# Bump when the rendering changes so ETags and disk cache entries are not reused
+RENDER_VERSION = 1
+# Complaints per printable sheet request
+MAX_SHEET_IDS = 500
+
+
+def qr_matrix(data):
+    """Module grid (rows of booleans, border included) for data"""
+    qr = qrcode.QRCode(version=1, box_size=BOX_SIZE, border=BORDER)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+
+def _runs(matrix):
+    """(x, y, width) for each horizontal run of dark modules"""
+    for y, row in enumerate(matrix):
+        x = 0
+        size = len(row)
+        while x < size:
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < size and row[x]:
+                x += 1
+            yield start, y, x - start
+
+
+def render_png(matrix, box_size=BOX_SIZE):
+    size = len(matrix)
+    img = Image.new("1", (size, size), 1)
+    img.putdata([0 if dark else 1 for row in matrix for dark in row])
+    img = img.resize((size * box_size, size * box_size), Image.NEAREST)
+    out = BytesIO()
+    img.save(out, "PNG", optimize=True)
+    return out.getvalue()
+
+
+def render_svg(matrix):
+    """One <path> with a subpath per run of dark modules; scales to any size"""
+    size = len(matrix)
+    path = "".join(f"M{x},{y}h{width}v1h-{width}z" for x, y, width in _runs(matrix))
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" '
+            f'width="{size * BOX_SIZE}" height="{size * BOX_SIZE}" shape-rendering="crispEdges">'
+            f'<rect width="{size}" height="{size}" fill="#fff"/><path d="{path}" fill="#000"/></svg>').encode()
+
+
+def parse_sheet_ids(ranges, ids=(), limit=MAX_SHEET_IDS):
+    """Unique complaint ids, in order, from a list plus "1,2,5-9" ranges.
+
+    Ranges are sized before they are expanded, so a huge range is refused
+    without building it; raises ValueError for bad, reversed or too many ids.
+    """
+    ids = list(ids)
+    if len(ids) > limit:
+        raise ValueError(f"at most {limit} are allowed")
+    unique = dict.fromkeys(int(complaint_id) for complaint_id in ids)
+    for part in ranges.split(","):
+        part = part.strip()
+        if "-" in part:
+            first, last = (int(value) for value in part.split("-", 1))
+            if last < first:
+                raise ValueError(f"range {part} is reversed")
+            if len(unique) + last - first + 1 > limit:
+                raise ValueError(f"at most {limit} are allowed")
+            unique.update(dict.fromkeys(range(first, last + 1)))
+        elif part:
+            unique[int(part)] = None
+        if len(unique) > limit:
+            raise ValueError(f"at most {limit} are allowed")
+    if not unique:
+        raise ValueError("no ids given")
+    return list(unique)
+
+
+class QRCache:
+    """Rendered QR codes in a bounded LRU, with an optional on-disk tier.
+
+    Output depends only on the encoded data and format, so entries never go
+    stale; etag() is computed from those inputs without rendering, which
+    lets callers answer If-None-Match before doing any work. Disk entries
+    survive restarts and are shared by every worker pointing at cache_dir.
+    """
+
+    def __init__(self, max_entries=512, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "disk_hits": 0, "renders": 0}
+
+    @staticmethod
+    def etag(data, fmt="png"):
+        if fmt not in QR_FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(QR_FORMATS)}")
+        return hashlib.sha1(f"{RENDER_VERSION}|{fmt}|{data}".encode()).hexdigest()
+
+    def _get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def _put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def matrix(self, data):
+        key = ("matrix", data)
+        matrix = self._get(key)
+        if matrix is None:
+            matrix = qr_matrix(data)
+            self._put(key, matrix)
+        return matrix
+
+    def render(self, data, fmt="png"):
+        """Encoded image bytes for data"""
+        etag = self.etag(data, fmt)
+        body = self._get(etag)
+        if body is not None:
+            self._counters["hits"] += 1
+            return body
+        path = os.path.join(self.cache_dir, f"{etag}.{fmt}") if self.cache_dir else None
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                body = f.read()
+            self._counters["disk_hits"] += 1
+        else:
+            matrix = self.matrix(data)
+            body = render_svg(matrix) if fmt == "svg" else render_png(matrix)
+            self._counters["renders"] += 1
+            if path:
+                self._write(path, body)
+        self._put(etag, body)
+        return body
+
+    def _write(self, path, body):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".part")
+            with os.fdopen(fd, "wb") as f:
+                f.write(body)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"Warning: Could not write QR cache file: {e}")
+
+    def stats(self):
+        with self._lock:
+            entries = len(self._entries)
+        return dict(self._counters, entries=entries)
+
+    def sheet(self, items, title=None, columns=4, rows=5):
+        """Printable letter-size PDF of QR codes for (data, label) pairs, columns x rows per page"""
+        width, height = letter
+        margin = 36
+        header = 30 if title else 0
+        cell_w = (width - 2 * margin) / columns
+        cell_h = (height - 2 * margin - header) / rows
+        label_h = 14
+        side = min(cell_w, cell_h - label_h) - 8
+
+        buffer = BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=letter)
+        per_page = columns * rows
+        for index, (data, label) in enumerate(items):
+            slot = index % per_page
+            if slot == 0:
+                if index:
+                    pdf.showPage()
+                if title:
+                    pdf.setFont("Helvetica-Bold", 14)
+                    pdf.drawString(margin, height - margin - 14, title)
+            col, row = slot % columns, slot // columns
+            x = margin + col * cell_w + (cell_w - side) / 2
+            y = height - margin - header - (row + 1) * cell_h + label_h + 4
+            self._draw(pdf, self.matrix(data), x, y, side)
+            pdf.setFont("Helvetica", 9)
+            pdf.drawCentredString(margin + col * cell_w + cell_w / 2, y - label_h + 2, label)
+        pdf.showPage()
+        pdf.save()
+        return buffer.getvalue()
+
+    @staticmethod
+    def _draw(pdf, matrix, x, y, side):
+        """Draw the matrix as vector rectangles, one per run of dark modules"""
+        module = side / len(matrix)
+        path = pdf.beginPath()
+        for run_x, run_y, run_width in _runs(matrix):
+            path.rect(x + run_x * module, y + side - (run_y + 1) * module, run_width * module, module)
+        pdf.setFillColorRGB(0, 0, 0)
+        pdf.drawPath(path, stroke=0, fill=1)
@@ -0,0 +1,108 @@
+"""Socket.IO server configuration for single- and multi-process deployments"""
+import os
+
+ASYNC_MODES = ("threading", "eventlet", "gevent")
+
+
+def async_mode():
+    """Async mode from SOCKETIO_ASYNC_MODE (threading, eventlet or gevent)"""
+    mode = os.getenv("SOCKETIO_ASYNC_MODE", "threading")
+    if mode not in ASYNC_MODES:
+        raise ValueError(f"SOCKETIO_ASYNC_MODE must be one of: {', '.join(ASYNC_MODES)}")
+    return mode
+
+
+def monkey_patch():
+    """Make the standard library cooperative for eventlet/gevent; no-op in threading mode.
+
+    Must run before anything else imports socket, threading or ssl. The
+    gunicorn eventlet/gevent workers patch on their own, so this matters
+    for `python app.py`.
+    """
+    mode = async_mode()
+    if mode == "eventlet":
+        import eventlet
+        eventlet.monkey_patch()
+    elif mode == "gevent":
+        from gevent import monkey
+        monkey.patch_all()
+
+
+def create_socketio(app):
+    """SocketIO server for the configured async mode and message queue.
+
+    With SOCKETIO_MESSAGE_QUEUE set (redis://host:6379/0, amqp://..., or
+    memory:// for single-process tests), every emit is published to the
+    queue and each worker delivers it to its own clients, so rooms work
+    across processes and hosts.
+    """
+    from flask_socketio import SocketIO
+
+    return SocketIO(
+        app,
+        cors_allowed_origins="*",
+        async_mode=async_mode(),
+        message_queue=os.getenv("SOCKETIO_MESSAGE_QUEUE") or None,
+        channel=os.getenv("SOCKETIO_CHANNEL", "flask-socketio"),
+    )
+
+
+def shares_rooms():
+    """True when SOCKETIO_MESSAGE_QUEUE spreads rooms over several processes"""
+    message_queue = os.getenv("SOCKETIO_MESSAGE_QUEUE") or ""
+    return bool(message_queue) and not message_queue.startswith("memory://")
+
+
+def create_emitter(message_queue, channel="flask-socketio"):
+    """Write-only Socket.IO emitter for processes that serve no clients (jobs, load tests)"""
+    from flask_socketio import SocketIO
+
+    return SocketIO(message_queue=message_queue, channel=channel)
+
+
+class _ThreadedProxy:
+    """Runs an object's method calls in a native thread pool.
+
+    pyodbc calls block in C, which would stall every green thread in an
+    eventlet/gevent worker; routing them through the hub's thread pool keeps
+    the worker responsive. Methods named in wrap_names return proxies too
+    (connection.cursor() -> proxied cursor).
+    """
+
+    def __init__(self, obj, run, wrap_names=()):
+        object.__setattr__(self, "_obj", obj)
+        object.__setattr__(self, "_run", run)
+        object.__setattr__(self, "_wrap_names", wrap_names)
+
+    def __getattr__(self, name):
+        value = getattr(self._obj, name)
+        if not callable(value):
+            return value
+        run = self._run
+        wrap = name in self._wrap_names
+
+        def call(*args, **kwargs):
+            result = run(value, *args, **kwargs)
+            return _ThreadedProxy(result, run) if wrap else result
+        return call
+
+    def __setattr__(self, name, value):
+        setattr(self._obj, name, value)
+
+
+def cooperative_connect(connect):
+    """Wrap a blocking DB-API connect() for the configured async mode"""
+    mode = async_mode()
+    if mode == "eventlet":
+        from eventlet import tpool
+
+        def run(fn, *args, **kwargs):
+            return tpool.execute(fn, *args, **kwargs)
+    elif mode == "gevent":
+        import gevent
+
+        def run(fn, *args, **kwargs):
+            return gevent.get_hub().threadpool.apply(fn, args, kwargs)
+    else:
+        return connect
+    return lambda: _ThreadedProxy(run(connect), run, wrap_names=("cursor",))
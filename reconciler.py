@@ -0,0 +1,41 @@
+"""Periodic background rebuilds for the in-memory read models"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Reconciler:
+    """Runs a rebuild job now and then every interval seconds in a daemon thread.
+
+    Failures are logged and retried at the next interval; request() wakes
+    the thread early (e.g. after an admin change the hooks cannot follow).
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._thread = None
+        self._wake = threading.Event()
+
+    def start(self, reconcile, interval):
+        """Start the loop; later calls are ignored"""
+        if self._thread is not None:
+            return
+
+        def loop():
+            while True:
+                started = time.monotonic()
+                self._wake.clear()
+                try:
+                    reconcile()
+                except Exception as e:
+                    logger.warning("%s reconciliation failed: %s", self.name, e)
+                self._wake.wait(max(1.0, interval - (time.monotonic() - started)))
+
+        self._thread = threading.Thread(target=loop, name=f"{self.name}-reconciler", daemon=True)
+        self._thread.start()
+
+    def request(self):
+        """Run the job now instead of waiting for the next interval"""
+        self._wake.set()
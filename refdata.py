@@ -0,0 +1,122 @@
+"""In-memory cache for small, rarely changing reference tables"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# After a failed reload with a value to fall back on, wait this long before trying again
+RETRY_SECONDS = 30.0
+
+
+def sql_loader(get_connection, sql, params=()):
+    """Loader returning the rows of a query as a list of dicts"""
+    def load():
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    return load
+
+
+class _Entry:
+    __slots__ = ("loader", "ttl", "on_change", "value", "loaded_at", "expires_at", "lock", "loads", "errors")
+
+    def __init__(self, loader, ttl, on_change):
+        self.loader = loader
+        self.ttl = ttl
+        self.on_change = on_change
+        self.value = None
+        self.loaded_at = None
+        self.expires_at = 0.0
+        self.lock = threading.Lock()
+        self.loads = 0
+        self.errors = 0
+
+
+class RefData:
+    """Named lookups loaded once and served from memory until their TTL expires.
+
+    register() a loader per lookup (ResponseTemplates, Badges, ...); get()
+    returns the cached value, reloading it when expired. Concurrent misses
+    share one load. If a reload fails the previous value keeps being served
+    and the load is retried after RETRY_SECONDS; only a lookup that has never
+    loaded raises. on_change() is called when a reload returns a different
+    value, so dependent caches (ETags, derived indexes) can be invalidated.
+    """
+
+    def __init__(self, default_ttl=300.0):
+        self.default_ttl = default_ttl
+        self._entries = {}
+
+    def register(self, name, loader, ttl=None, on_change=None):
+        self._entries[name] = _Entry(loader, self.default_ttl if ttl is None else ttl, on_change)
+
+    def _entry(self, name):
+        try:
+            return self._entries[name]
+        except KeyError:
+            raise KeyError(f"Unknown reference data: {name}") from None
+
+    def get(self, name):
+        entry = self._entry(name)
+        if entry.loaded_at is not None and time.monotonic() < entry.expires_at:
+            return entry.value
+        with entry.lock:
+            if entry.loaded_at is not None and time.monotonic() < entry.expires_at:
+                return entry.value
+            self._load(name, entry, fallback=entry.loaded_at is not None)
+            return entry.value
+
+    def _load(self, name, entry, fallback):
+        try:
+            value = entry.loader()
+        except Exception as e:
+            entry.errors += 1
+            if not fallback:
+                raise
+            logger.warning("Reloading %s failed, serving the cached copy: %s", name, e)
+            entry.expires_at = time.monotonic() + RETRY_SECONDS
+            return
+        changed = entry.loaded_at is not None and value != entry.value
+        entry.value = value
+        entry.loaded_at = time.time()
+        entry.expires_at = time.monotonic() + entry.ttl
+        entry.loads += 1
+        if changed and entry.on_change:
+            entry.on_change()
+
+    def invalidate(self, name=None):
+        """Expire one lookup (or all); the next get() reloads it"""
+        for entry in ([self._entry(name)] if name else self._entries.values()):
+            entry.expires_at = 0.0
+
+    def refresh(self, names=None):
+        """Reload now; returns {name: None or error message}"""
+        results = {}
+        for name in names or list(self._entries):
+            entry = self._entry(name)
+            with entry.lock:
+                try:
+                    self._load(name, entry, fallback=False)
+                    results[name] = None
+                except Exception as e:
+                    results[name] = str(e)
+        return results
+
+    def warm(self):
+        """Load every lookup (at startup), logging failures instead of raising"""
+        for name, error in self.refresh().items():
+            if error:
+                logger.warning("Could not warm reference data %s: %s", name, error)
+
+    def stats(self):
+        now = time.monotonic()
+        return {name: {
+            "loaded": entry.loaded_at is not None,
+            "age_seconds": round(time.time() - entry.loaded_at, 1) if entry.loaded_at else None,
+            "expires_in": round(max(0.0, entry.expires_at - now), 1) if entry.loaded_at else None,
+            "loads": entry.loads,
+            "errors": entry.errors,
+        } for name, entry in self._entries.items()}
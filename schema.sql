@@ -55,6 +55,7 @@ BEGIN
         avatar_url VARCHAR(500),
         total_complaints INT DEFAULT 0,
         resolved_complaints INT DEFAULT 0,
+        quick_resolutions INT NOT NULL DEFAULT 0,
         points INT DEFAULT 0,
         created_at DATETIME DEFAULT GETDATE()
     );
@@ -159,3 +160,91 @@ BEGIN
         ('Need More Info', 'Query', 'We need additional information to process your complaint. Please provide more details about the issue.', 'system');
 END
 GO
+
+-- Keyset pagination index for complaint listings (ORDER BY submitted_at DESC, id DESC)
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_Complaints_submitted_at_id' AND object_id = OBJECT_ID(N'Complaints'))
+BEGIN
+    CREATE INDEX IX_Complaints_submitted_at_id ON Complaints (submitted_at DESC, id DESC)
+        INCLUDE (status, priority);
+END
+GO
+
+-- Priority Classification Rules (keyword ending in * matches as a prefix)
+IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'PriorityRules')
+BEGIN
+    CREATE TABLE PriorityRules (
+        id INT PRIMARY KEY IDENTITY(1,1),
+        keyword VARCHAR(100) NOT NULL,
+        priority VARCHAR(20) NOT NULL,
+        weight FLOAT DEFAULT 1.0,
+        is_active BIT DEFAULT 1,
+        created_at DATETIME DEFAULT GETDATE()
+    );
+
+    INSERT INTO PriorityRules (keyword, priority, weight)
+    VALUES
+        ('urgent', 'High', 1.0),
+        ('emergency', 'High', 1.0),
+        ('critical', 'High', 1.0),
+        ('immediately', 'High', 1.0),
+        ('asap', 'High', 1.0),
+        ('severe', 'High', 1.0),
+        ('important', 'Medium', 1.0),
+        ('soon', 'Medium', 1.0),
+        ('attention', 'Medium', 1.0),
+        ('issue', 'Medium', 1.0);
+END
+GO
+
+-- Notification Outbox (Logic App notifications queued with the complaint, delivered by background workers)
+IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'NotificationOutbox')
+BEGIN
+    CREATE TABLE NotificationOutbox (
+        id BIGINT PRIMARY KEY IDENTITY(1,1),
+        payload NVARCHAR(MAX) NOT NULL,
+        status VARCHAR(20) NOT NULL DEFAULT 'pending',
+        attempts INT NOT NULL DEFAULT 0,
+        next_attempt_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME(),
+        claimed_until DATETIME2 NULL,
+        last_error NVARCHAR(1000) NULL,
+        created_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME(),
+        delivered_at DATETIME2 NULL
+    );
+
+    CREATE INDEX IX_NotificationOutbox_pending ON NotificationOutbox (next_attempt_at, id)
+        WHERE status = 'pending';
+END
+GO
+
+-- Badge engine: complaints resolved within 24 hours of submission, per submitter
+IF NOT EXISTS (SELECT * FROM sys.columns WHERE object_id = OBJECT_ID(N'UserProfiles') AND name = 'quick_resolutions')
+BEGIN
+    ALTER TABLE UserProfiles ADD quick_resolutions INT NOT NULL DEFAULT 0;
+END
+GO
+
+-- Earned-badge lookups and duplicate checks by user
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_UserBadges_user_email' AND object_id = OBJECT_ID(N'UserBadges'))
+BEGIN
+    CREATE INDEX IX_UserBadges_user_email ON UserBadges (user_email, badge_id);
+END
+GO
+
+-- One upvote per (complaint, voter); the upvote counter inserts here and bumps Complaints.upvotes
+IF NOT EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'ComplaintUpvotes') AND type in (N'U'))
+BEGIN
+    CREATE TABLE ComplaintUpvotes (
+        complaint_id INT NOT NULL FOREIGN KEY REFERENCES Complaints(id),
+        voter VARCHAR(255) NOT NULL,
+        created_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME(),
+        PRIMARY KEY (complaint_id, voter)
+    );
+END
+GO
+
+-- Chat history pages and unread lookups per complaint
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_ChatMessages_complaint_created' AND object_id = OBJECT_ID(N'ChatMessages'))
+BEGIN
+    CREATE INDEX IX_ChatMessages_complaint_created ON ChatMessages (complaint_id, created_at);
+END
+GO
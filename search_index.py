@@ -0,0 +1,374 @@
+"""Full-text search over complaints (in-process BM25 index or SQLite FTS5)"""
+import bisect
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("a an and are as at be by for from has have i in is it of on or the to was were with".split())
+
+FILTER_FIELDS = ("status", "priority", "type")
+
+
+def tokenize(text):
+    """Lowercased alphanumeric tokens without stopwords"""
+    if not text:
+        return []
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def parse_query(query):
+    """Split a query into exact terms plus a trailing prefix term.
+
+    The last token is matched as a prefix so results update while the user
+    is still typing ("hos" finds "hostel").
+    """
+    tokens = TOKEN_RE.findall((query or "").lower())
+    if not tokens:
+        return [], None
+    *terms, prefix = tokens
+    return [t for t in terms if t not in STOPWORDS], prefix
+
+
+def _doc_key(doc_id):
+    """Complaint ids arrive as int, Decimal (@@IDENTITY) or JSON strings"""
+    try:
+        return int(doc_id)
+    except (TypeError, ValueError):
+        return None
+
+
+class _Doc:
+    __slots__ = ("fields_tf", "comments_tf", "comment_ids", "length", "status", "priority", "type")
+
+    def __init__(self):
+        self.fields_tf = Counter()
+        self.comments_tf = Counter()
+        self.comment_ids = set()
+        self.length = 0.0
+        self.status = None
+        self.priority = None
+        self.type = None
+
+
+class InMemorySearchIndex:
+    """Inverted index with BM25 ranking, kept entirely in process memory.
+
+    Title terms count title_weight times; description and comment terms
+    count once. All query terms must match (AND), the last one as a prefix
+    expanded to at most max_prefix_terms vocabulary terms (results are
+    flagged approximate when a prefix matches more).
+    """
+
+    def __init__(self, k1=1.2, b=0.75, title_weight=2.0, max_prefix_terms=200):
+        self.k1 = k1
+        self.b = b
+        self.title_weight = title_weight
+        self.max_prefix_terms = max_prefix_terms
+        self.ready = False
+        self._lock = threading.RLock()
+        self._journal = None  # writes made while bulk_load is building a replacement
+        self._postings = {}  # term -> {doc_id: weighted term frequency}
+        self._docs = {}
+        self._vocabulary = []  # sorted terms, for prefix lookups
+        self._total_length = 0.0
+
+    def __len__(self):
+        return len(self._docs)
+
+    # Writes
+
+    def upsert(self, doc_id, title, description, status=None, priority=None, type=None):
+        """Index (or re-index) a complaint's title and description"""
+        doc_id = _doc_key(doc_id)
+        if doc_id is None:
+            return
+        tf = Counter()
+        for term in tokenize(title):
+            tf[term] += self.title_weight
+        tf.update(tokenize(description))
+        with self._lock:
+            self._record("upsert", doc_id, title, description, status, priority, type)
+            doc = self._docs.get(doc_id)
+            if doc is None:
+                doc = self._docs[doc_id] = _Doc()
+            else:
+                self._unlink(doc_id, doc)
+            doc.fields_tf = tf
+            doc.status, doc.priority, doc.type = status, priority, type
+            self._link(doc_id, doc)
+
+    def add_comment(self, doc_id, text, comment_id=None):
+        """Make a comment's text searchable under its complaint (once per comment_id)"""
+        doc_id = _doc_key(doc_id)
+        if doc_id is None:
+            return
+        tokens = tokenize(text)
+        if not tokens:
+            return
+        comment_id = _doc_key(comment_id)
+        with self._lock:
+            self._record("add_comment", doc_id, text, comment_id)
+            doc = self._docs.get(doc_id)
+            if doc is None:
+                doc = self._docs[doc_id] = _Doc()
+            elif comment_id in doc.comment_ids:
+                return
+            else:
+                self._unlink(doc_id, doc)
+            if comment_id is not None:
+                doc.comment_ids.add(comment_id)
+            doc.comments_tf.update(tokens)
+            self._link(doc_id, doc)
+
+    def update_fields(self, doc_id, **fields):
+        """Update filterable fields (status/priority/type) without re-tokenizing"""
+        doc_id = _doc_key(doc_id)
+        if doc_id is None:
+            return
+        with self._lock:
+            self._record("update_fields", doc_id, **fields)
+            doc = self._docs.get(doc_id)
+            if doc is None:
+                return
+            for name, value in fields.items():
+                if name in FILTER_FIELDS:
+                    setattr(doc, name, value)
+
+    def bulk_load(self, complaints, comments=()):
+        """Replace the index contents.
+
+        complaints yields (id, title, description, status, priority, type);
+        comments yields (complaint_id, comment_text, comment_id). The new
+        contents are built aside and swapped in, so searches keep using the
+        old ones meanwhile; writes made during the load are replayed on top.
+        """
+        with self._lock:
+            self._journal = []
+        try:
+            fresh = InMemorySearchIndex(self.k1, self.b, self.title_weight, self.max_prefix_terms)
+            for doc_id, title, description, status, priority, type_ in complaints:
+                fresh.upsert(doc_id, title, description, status, priority, type_)
+            for doc_id, text, comment_id in comments:
+                fresh.add_comment(doc_id, text, comment_id)
+            with self._lock:
+                for name, args, fields in self._journal:
+                    getattr(fresh, name)(*args, **fields)
+                self._postings, self._docs = fresh._postings, fresh._docs
+                self._vocabulary, self._total_length = fresh._vocabulary, fresh._total_length
+                self.ready = True
+        finally:
+            with self._lock:
+                self._journal = None
+
+    def _record(self, name, *args, **fields):
+        if self._journal is not None:
+            self._journal.append((name, args, fields))
+
+    def _link(self, doc_id, doc):
+        tf = doc.fields_tf + doc.comments_tf
+        doc.length = float(sum(tf.values()))
+        self._total_length += doc.length
+        for term, freq in tf.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                bisect.insort(self._vocabulary, term)
+            postings[doc_id] = freq
+
+    def _unlink(self, doc_id, doc):
+        self._total_length -= doc.length
+        for term in doc.fields_tf.keys() | doc.comments_tf.keys():
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+                i = bisect.bisect_left(self._vocabulary, term)
+                if i < len(self._vocabulary) and self._vocabulary[i] == term:
+                    del self._vocabulary[i]
+
+    # Reads
+
+    def search(self, query, status=None, priority=None, type=None, limit=20, offset=0):
+        """Ranked matches as ([(doc_id, score), ...], total_matches, approximate).
+
+        approximate is True when the prefix matched more than
+        max_prefix_terms terms, so rarer completions were left out.
+        """
+        terms, prefix = parse_query(query)
+        if prefix is None:
+            return [], 0, False
+        filters = [(name, value) for name, value in
+                   (("status", status), ("priority", priority), ("type", type)) if value]
+
+        with self._lock:
+            n_docs = len(self._docs)
+            if not n_docs:
+                return [], 0, False
+            avg_length = self._total_length / n_docs or 1.0
+
+            # One group per query position; a doc must match every group
+            expanded, approximate = self._expand_prefix(prefix)
+            groups = [[t] for t in terms]
+            groups.append(expanded)
+
+            postings_groups = []
+            for group in groups:
+                lists = [(term, self._postings[term]) for term in group if term in self._postings]
+                if not lists:
+                    return [], 0, False
+                postings_groups.append(lists)
+
+            # Start from the rarest group to keep the candidate set small
+            postings_groups.sort(key=lambda lists: sum(len(p) for _, p in lists))
+            candidates = None
+            for lists in postings_groups:
+                ids = set().union(*(p.keys() for _, p in lists))
+                candidates = ids if candidates is None else candidates & ids
+                if not candidates:
+                    return [], 0, approximate
+
+            scores = {}
+            for doc_id in candidates:
+                doc = self._docs[doc_id]
+                if any(getattr(doc, name) != value for name, value in filters):
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * doc.length / avg_length)
+                score = 0.0
+                for lists in postings_groups:
+                    for term, postings in lists:
+                        freq = postings.get(doc_id)
+                        if freq:
+                            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                            score += idf * freq * (self.k1 + 1) / (freq + norm)
+                scores[doc_id] = score
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+        return ranked[offset:offset + limit], len(ranked), approximate
+
+    def _expand_prefix(self, prefix):
+        """(vocabulary terms starting with prefix, whether more were cut off)"""
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        expanded = []
+        for term in self._vocabulary[start:start + self.max_prefix_terms + 1]:
+            if not term.startswith(prefix):
+                break
+            expanded.append(term)
+        return expanded[:self.max_prefix_terms], len(expanded) > self.max_prefix_terms
+
+
+class SQLiteSearchIndex:
+    """Same interface backed by an SQLite FTS5 table (rowid = complaint id)"""
+
+    def __init__(self, path=":memory:", title_weight=2.0):
+        self.title_weight = title_weight
+        self.ready = False
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS complaints_fts USING fts5(
+                title, description, comments,
+                status UNINDEXED, priority UNINDEXED, type UNINDEXED,
+                tokenize = 'unicode61'
+            )
+        """)
+        # Ids of the comments already appended, so a comment is never added twice
+        self._db.execute("CREATE TABLE IF NOT EXISTS indexed_comments (id INTEGER PRIMARY KEY)")
+        self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM complaints_fts").fetchone()[0]
+
+    def upsert(self, doc_id, title, description, status=None, priority=None, type=None):
+        doc_id = _doc_key(doc_id)
+        if doc_id is None:
+            return
+        with self._lock:
+            row = self._db.execute("SELECT comments FROM complaints_fts WHERE rowid = ?", (doc_id,)).fetchone()
+            self._db.execute("DELETE FROM complaints_fts WHERE rowid = ?", (doc_id,))
+            self._db.execute(
+                "INSERT INTO complaints_fts (rowid, title, description, comments, status, priority, type) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (doc_id, title or "", description or "", row[0] if row else "", status, priority, type))
+            self._db.commit()
+
+    def add_comment(self, doc_id, text, comment_id=None):
+        doc_id = _doc_key(doc_id)
+        if doc_id is None:
+            return
+        with self._lock:
+            self._add_comment(doc_id, text, _doc_key(comment_id))
+            self._db.commit()
+
+    def _add_comment(self, doc_id, text, comment_id):
+        if comment_id is not None:
+            cur = self._db.execute("INSERT OR IGNORE INTO indexed_comments (id) VALUES (?)", (comment_id,))
+            if cur.rowcount == 0:
+                return
+        cur = self._db.execute(
+            "UPDATE complaints_fts SET comments = comments || ' ' || ? WHERE rowid = ?", (text or "", doc_id))
+        if cur.rowcount == 0:
+            self._db.execute(
+                "INSERT INTO complaints_fts (rowid, title, description, comments) VALUES (?, '', '', ?)",
+                (doc_id, text or ""))
+
+    def update_fields(self, doc_id, **fields):
+        doc_id = _doc_key(doc_id)
+        fields = {name: value for name, value in fields.items() if name in FILTER_FIELDS}
+        if doc_id is None or not fields:
+            return
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE complaints_fts SET {assignments} WHERE rowid = ?",
+                             (*fields.values(), doc_id))
+            self._db.commit()
+
+    def bulk_load(self, complaints, comments=()):
+        """Replace the index contents in one transaction (searches wait rather than see it half loaded)"""
+        with self._lock:
+            self._db.execute("DELETE FROM complaints_fts")
+            self._db.execute("DELETE FROM indexed_comments")
+            self._db.executemany(
+                "INSERT INTO complaints_fts (rowid, title, description, comments, status, priority, type) "
+                "VALUES (?, ?, ?, '', ?, ?, ?)",
+                ((doc_id, title or "", description or "", status, priority, type_)
+                 for doc_id, title, description, status, priority, type_ in complaints))
+            for doc_id, text, comment_id in comments:
+                doc_id = _doc_key(doc_id)
+                if doc_id is not None:
+                    self._add_comment(doc_id, text, _doc_key(comment_id))
+            self._db.commit()
+            self.ready = True
+
+    def search(self, query, status=None, priority=None, type=None, limit=20, offset=0):
+        terms, prefix = parse_query(query)
+        if prefix is None:
+            return [], 0, False
+        match = " ".join(f'"{t}"' for t in terms) + f' "{prefix}"*'
+        where = "complaints_fts MATCH ?"
+        params = [match.strip()]
+        for name, value in (("status", status), ("priority", priority), ("type", type)):
+            if value:
+                where += f" AND {name} = ?"
+                params.append(value)
+        with self._lock:
+            total = self._db.execute(f"SELECT COUNT(*) FROM complaints_fts WHERE {where}", params).fetchone()[0]
+            rows = self._db.execute(
+                f"SELECT rowid, -bm25(complaints_fts, ?, 1.0, 1.0) AS score FROM complaints_fts "
+                f"WHERE {where} ORDER BY score DESC, rowid DESC LIMIT ? OFFSET ?",
+                [self.title_weight] + params + [limit, offset]).fetchall()
+        return [(row[0], row[1]) for row in rows], total, False
+
+
+def create_search_index(backend="memory", path=None):
+    """Search index for the configured backend ('memory' or 'sqlite')"""
+    if backend == "sqlite":
+        return SQLiteSearchIndex(path or ":memory:")
+    if backend == "memory":
+        return InMemorySearchIndex()
+    raise ValueError(f"Unknown search backend: {backend}")
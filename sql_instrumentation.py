@@ -0,0 +1,346 @@
+"""Per-statement SQL timing, slow-query log and per-request query budgets"""
+import functools
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from flask import g, has_request_context, request
+
+logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger(__name__ + ".slow")
+
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRINGS = re.compile(r"N?'(?:[^']|'')*'")
+_NUMBERS = re.compile(r"\b(?:0x[0-9a-fA-F]+|\d+(?:\.\d+)?)\b")
+_PLACEHOLDERS = r"\(\s*\?(?:\s*,\s*\?)*\s*\)"
+_IN_LISTS = re.compile(r"\bIN\s*" + _PLACEHOLDERS, re.I)
+_VALUES_LISTS = re.compile(r"(" + _PLACEHOLDERS + r")(?:\s*,\s*" + _PLACEHOLDERS + r")+")
+_SPACES = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=2048)
+def fingerprint(sql):
+    """(id, normalized text) shared by every statement that differs only in literals or list lengths"""
+    text = _COMMENTS.sub(" ", sql)
+    text = _STRINGS.sub("?", text)
+    text = _NUMBERS.sub("?", text)
+    text = _IN_LISTS.sub("IN (...)", text)
+    text = _VALUES_LISTS.sub(r"\1, ...", text)
+    text = _SPACES.sub(" ", text).strip()
+    return hashlib.blake2s(text.encode("utf-8"), digest_size=6).hexdigest(), text
+
+
+def redact(params):
+    """Parameter types and sizes only, never values"""
+    if params is None:
+        return None
+    if not isinstance(params, (list, tuple)):
+        params = [params]
+    redacted = []
+    for value in params:
+        if value is None:
+            redacted.append(None)
+        elif isinstance(value, (str, bytes, bytearray)):
+            redacted.append(f"{type(value).__name__}({len(value)})")
+        else:
+            redacted.append(type(value).__name__)
+    return redacted
+
+
+class QueryBudgetExceeded(Exception):
+    """A request ran more statements than its configured budget"""
+
+
+class _Entry:
+    __slots__ = ("sql", "calls", "errors", "rows", "total_ms", "max_ms", "recent")
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.recent = deque(maxlen=256)  # execute times, ms
+
+    def as_dict(self, fingerprint_id):
+        recent = sorted(self.recent)
+        return {
+            "fingerprint": fingerprint_id,
+            "sql": self.sql,
+            "calls": self.calls,
+            "errors": self.errors,
+            "rows": self.rows,
+            "total_ms": round(self.total_ms, 1),
+            "avg_ms": round(self.total_ms / self.calls, 2) if self.calls else None,
+            "p95_ms": round(recent[min(len(recent) - 1, int(len(recent) * 0.95))], 2) if recent else None,
+            "max_ms": round(self.max_ms, 2),
+        }
+
+
+class InstrumentedCursor:
+    """Times execute()/executemany() and the fetches after them; everything else goes to the cursor"""
+
+    __slots__ = ("_cursor", "_instrumentation", "_current")
+
+    def __init__(self, cursor, instrumentation):
+        object.__setattr__(self, "_cursor", cursor)
+        object.__setattr__(self, "_instrumentation", instrumentation)
+        object.__setattr__(self, "_current", None)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        # e.g. fast_executemany belongs to the real cursor
+        setattr(self._cursor, name, value)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._cursor.close()
+        return False
+
+    def _run(self, method, sql, params, batch):
+        key = fingerprint(sql)
+        object.__setattr__(self, "_current", key[0])
+        started = time.perf_counter()
+        try:
+            result = method(sql, *params)
+        except Exception:
+            self._instrumentation.record(key, (time.perf_counter() - started) * 1000, 0, params, batch, failed=True)
+            raise
+        elapsed = (time.perf_counter() - started) * 1000
+        rowcount = getattr(self._cursor, "rowcount", -1)
+        self._instrumentation.record(key, elapsed, rowcount if rowcount and rowcount > 0 else 0, params, batch)
+        # pyodbc returns the cursor so calls can be chained; keep the chain instrumented
+        return self if result is self._cursor else result
+
+    def execute(self, sql, *params):
+        return self._run(self._cursor.execute, sql, params, False)
+
+    def executemany(self, sql, seq_of_params):
+        return self._run(self._cursor.executemany, sql, (seq_of_params,), True)
+
+    def _fetched(self, started, rows):
+        if self._current is not None:
+            self._instrumentation.record_fetch(self._current, (time.perf_counter() - started) * 1000, rows)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched(started, 0 if row is None else 1)
+        return row
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._fetched(started, len(rows))
+        return rows
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        self._fetched(started, len(rows))
+        return rows
+
+
+class SqlInstrumentation:
+    """Aggregated statement stats keyed by fingerprint, plus per-request accounting.
+
+    Pass wrap_cursor to ConnectionPool so every cursor the app uses is an
+    InstrumentedCursor. Statements are grouped by fingerprint (literals and
+    IN/VALUES list lengths removed), at most max_fingerprints of them; the
+    rest are counted under "other". Statements slower than slow_ms are
+    written to the "sql_instrumentation.slow" logger (and to slow_log_path
+    as JSON lines if given) with parameter values redacted. With
+    instrument_app(), each request counts its statements and DB time:
+    debug_headers (or app.debug) adds X-DB-Query-Count, X-DB-Time-Ms and
+    Server-Timing to the response, and a request running more statements
+    than its budget is logged, or fails with QueryBudgetExceeded when strict
+    (by default, when app.testing is set) so a test suite catches N+1 loops.
+    The same fingerprint run repeat_threshold times in one request is
+    logged once per route as a likely N+1.
+    """
+
+    OTHER = ("other", "(statements beyond max_fingerprints)")
+
+    def __init__(self, slow_ms=500.0, slow_log_path=None, max_fingerprints=500, budget=0, budgets=None,
+                 strict=None, debug_headers=False, repeat_threshold=10):
+        self.slow_ms = slow_ms
+        self.max_fingerprints = max_fingerprints
+        self.budget = budget
+        self.budgets = dict(budgets or {})
+        self.strict = strict
+        self.debug_headers = debug_headers
+        self.repeat_threshold = repeat_threshold
+        self._lock = threading.Lock()
+        self._entries = {}  # fingerprint id -> _Entry
+        self._slow = deque(maxlen=50)
+        self._repeats_logged = set()
+        self._counters = {"queries": 0, "errors": 0, "rows": 0, "slow": 0, "requests": 0,
+                          "budget_exceeded": 0, "repeated": 0}
+        self._total_ms = 0.0
+        self._app = None
+        if slow_log_path:
+            handler = logging.FileHandler(slow_log_path, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            slow_logger.addHandler(handler)
+
+    def wrap_cursor(self, cursor):
+        return InstrumentedCursor(cursor, self)
+
+    # Recording
+
+    def _entry(self, key):
+        entry = self._entries.get(key[0])
+        if entry is None:
+            if len(self._entries) >= self.max_fingerprints:
+                key = self.OTHER
+                entry = self._entries.get(key[0])
+            if entry is None:
+                entry = self._entries[key[0]] = _Entry(key[1])
+        return entry
+
+    def record(self, key, elapsed_ms, rows, params, batch=False, failed=False):
+        with self._lock:
+            entry = self._entry(key)
+            entry.calls += 1
+            entry.errors += failed
+            entry.rows += rows
+            entry.total_ms += elapsed_ms
+            entry.recent.append(elapsed_ms)
+            if elapsed_ms > entry.max_ms:
+                entry.max_ms = elapsed_ms
+            self._counters["queries"] += 1
+            self._counters["errors"] += failed
+            self._counters["rows"] += rows
+            self._total_ms += elapsed_ms
+        state = g.get("sql") if has_request_context() else None
+        if state is not None:
+            state["queries"] += 1
+            state["ms"] += elapsed_ms
+            state["fingerprints"][key[0]] = state["fingerprints"].get(key[0], 0) + 1
+        if elapsed_ms >= self.slow_ms:
+            self._log_slow(key, elapsed_ms, rows, params, batch, failed)
+
+    def record_fetch(self, fingerprint_id, elapsed_ms, rows):
+        with self._lock:
+            entry = self._entries.get(fingerprint_id) or self._entries.get(self.OTHER[0])
+            if entry is not None:
+                entry.rows += rows
+                entry.total_ms += elapsed_ms
+            self._counters["rows"] += rows
+            self._total_ms += elapsed_ms
+        state = g.get("sql") if has_request_context() else None
+        if state is not None:
+            state["ms"] += elapsed_ms
+
+    def _log_slow(self, key, elapsed_ms, rows, params, batch, failed):
+        if batch:
+            seq = params[0] if isinstance(params[0], (list, tuple)) else []
+            redacted = {"batch": len(seq), "first": redact(seq[0]) if seq else None}
+        else:
+            redacted = redact(list(params[0]) if len(params) == 1 and isinstance(params[0], (list, tuple))
+                              else list(params))
+        record = {
+            "at": datetime.now().isoformat(timespec="milliseconds"),
+            "fingerprint": key[0],
+            "ms": round(elapsed_ms, 1),
+            "rows": rows,
+            "failed": failed,
+            "endpoint": _endpoint() if has_request_context() else None,
+            "sql": key[1],
+            "params": redacted,
+        }
+        with self._lock:
+            self._counters["slow"] += 1
+            self._slow.append(record)
+        slow_logger.warning(json.dumps(record, default=str))
+
+    # Flask
+
+    def instrument_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        self._app = app
+
+    def _before_request(self):
+        g.sql = {"queries": 0, "ms": 0.0, "fingerprints": {}}
+
+    def _after_request(self, response):
+        state = g.pop("sql", None)
+        if state is None:
+            return response
+        endpoint = _endpoint()
+        with self._lock:
+            self._counters["requests"] += 1
+        if self.debug_headers or self._app.debug:
+            response.headers["X-DB-Query-Count"] = str(state["queries"])
+            response.headers["X-DB-Time-Ms"] = f"{state['ms']:.1f}"
+            response.headers.add("Server-Timing", f'db;dur={state["ms"]:.1f};desc="{state["queries"]} queries"')
+        self._check_repeats(endpoint, state["fingerprints"])
+        budget = self.budgets.get(endpoint, self.budget)
+        if budget and state["queries"] > budget:
+            with self._lock:
+                self._counters["budget_exceeded"] += 1
+            message = f"{request.method} {endpoint} ran {state['queries']} SQL statements (budget {budget})"
+            if self.strict or (self.strict is None and self._app.testing):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def _check_repeats(self, endpoint, fingerprints):
+        if not self.repeat_threshold:
+            return
+        for fingerprint_id, count in fingerprints.items():
+            if count < self.repeat_threshold:
+                continue
+            with self._lock:
+                self._counters["repeated"] += 1
+                if (endpoint, fingerprint_id) in self._repeats_logged:
+                    continue
+                self._repeats_logged.add((endpoint, fingerprint_id))
+                entry = self._entries.get(fingerprint_id)
+            logger.warning("%s ran the same statement %d times in one request (likely N+1): %s",
+                           endpoint, count, entry.sql if entry else fingerprint_id)
+
+    # Reporting
+
+    def top(self, limit=20, sort="total_ms"):
+        """The fingerprints with the highest `sort` value (total_ms, calls, max_ms, rows or errors)"""
+        if sort not in ("total_ms", "calls", "max_ms", "rows", "errors"):
+            raise ValueError("sort must be one of total_ms, calls, max_ms, rows, errors")
+        with self._lock:
+            entries = sorted(self._entries.items(), key=lambda item: getattr(item[1], sort), reverse=True)
+            return [entry.as_dict(fingerprint_id) for fingerprint_id, entry in entries[:limit]]
+
+    def stats(self, limit=10, sort="total_ms"):
+        top = self.top(limit, sort)
+        with self._lock:
+            return dict(self._counters, total_ms=round(self._total_ms, 1), fingerprints=len(self._entries),
+                        slow_ms=self.slow_ms, budget=self.budget, top=top, recent_slow=list(self._slow))
+
+
+def _endpoint():
+    rule = request.url_rule
+    return rule.rule if rule is not None else "unmatched"
+
+
+def parse_budgets(value):
+    """'/analytics=12,/submit=6' -> {'/analytics': 12, '/submit': 6}"""
+    budgets = {}
+    for item in (value or "").split(","):
+        if "=" in item:
+            rule, budget = item.rsplit("=", 1)
+            budgets[rule.strip()] = int(budget)
+    return budgets
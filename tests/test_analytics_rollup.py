@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from analytics_rollup import AnalyticsRollup, datediff_hours
+
+NOW = datetime(2026, 5, 13, 12, 0)
+
+
+def row(id, status="Submitted", priority="Medium", type="Hostel", submitted_at=NOW, due_date=None,
+        resolved_at=None, rating=None, title=None):
+    return SimpleNamespace(id=id, title=title or f"Complaint {id}", status=status, priority=priority, type=type,
+                           submitted_at=submitted_at, due_date=due_date, resolved_at=resolved_at, rating=rating)
+
+
+def test_datediff_hours_counts_boundaries():
+    assert datediff_hours(datetime(2026, 5, 1, 9, 59), datetime(2026, 5, 1, 10, 1)) == 1
+    assert datediff_hours(datetime(2026, 5, 1, 9, 0), datetime(2026, 5, 1, 9, 59)) == 0
+
+
+def test_hooks_update_the_snapshot():
+    rollup = AnalyticsRollup()
+    rollup.on_submit(1, "Leak", "Hostel", "High", NOW - timedelta(days=1), submitted_at=NOW - timedelta(days=2))
+    rollup.on_submit(2, "Printer", "Library", "Low", NOW + timedelta(days=3), submitted_at=NOW)
+    rollup.on_status_change(2, "Resolved", resolved_at=NOW + timedelta(hours=5))
+    rollup.on_rating(2, 4)
+    snapshot = rollup.snapshot(NOW)
+    assert snapshot["total_complaints"] == 2
+    assert snapshot["by_status"] == {"Submitted": 1, "Resolved": 1}
+    assert snapshot["by_type"] == {"Hostel": 1, "Library": 1}
+    assert snapshot["overdue_count"] == 1
+    assert snapshot["avg_resolution_hours"] == 5.0
+    assert snapshot["top_rated"] == [{"title": "Printer", "rating": 4}]
+
+
+def test_invalid_ratings_are_ignored():
+    rollup = AnalyticsRollup()
+    rollup.on_submit(1, "Leak", "Hostel", "High", None, submitted_at=NOW)
+    rollup.on_rating(1, "great")
+    rollup.on_rating(1, None)
+    rollup.on_rating(1, 9)
+    assert rollup.snapshot(NOW)["top_rated"] == []
+    rollup.on_rating(1, "3")
+    assert rollup.snapshot(NOW)["top_rated"] == [{"title": "Leak", "rating": 3}]
+
+
+def test_hooks_for_unknown_complaints_wait_for_the_rebuild():
+    rollup = AnalyticsRollup()
+    rollup.on_status_change(7, "Resolved")
+    rollup.on_rating("not-an-id", 5)
+    assert rollup.snapshot(NOW)["total_complaints"] == 0
+
+
+def test_rebuild_replays_hooks_fired_while_reading():
+    rollup = AnalyticsRollup()
+
+    def rows():
+        yield row(1, due_date=NOW - timedelta(hours=1))
+        rollup.on_status_change(1, "Resolved", resolved_at=NOW)  # committed after row 1 was read
+        rollup.on_submit(3, "New", "Other", "Low", None, submitted_at=NOW)
+        yield row(2, status="Resolved", resolved_at=NOW, submitted_at=NOW - timedelta(hours=2), rating=5)
+
+    rollup.rebuild(rows())
+    snapshot = rollup.snapshot(NOW)
+    assert rollup.ready
+    assert snapshot["total_complaints"] == 3
+    assert snapshot["by_status"] == {"Resolved": 2, "Submitted": 1}
+    assert snapshot["overdue_count"] == 0
+    assert snapshot["top_rated"] == [{"title": "Complaint 2", "rating": 5}]
@@ -0,0 +1,117 @@
+import threading
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from badge_engine import (QUICK_RESOLUTION_HOURS, RECOUNT_QUICK_RESOLUTIONS_SQL, BadgeEngine,
+                          _qualifies_predicate, quick_resolution)
+
+BADGES = [
+    {"id": 1, "requirement_type": "complaints_submitted", "requirement_value": 1},
+    {"id": 2, "requirement_type": "quick_resolutions", "requirement_value": 3},
+    {"id": 3, "requirement_type": "points", "requirement_value": 100},
+    {"id": 4, "requirement_type": "moon_phase", "requirement_value": 1},
+]
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+
+    def execute(self, sql, params=()):
+        self.db.executed.append(sql)
+        if "FROM UserProfiles p\n                WHERE p.email = ?" in sql:
+            profile = self.db.profiles.get(params[0])
+            self.rows = [profile] if profile else []
+        elif "INSERT INTO UserBadges" in sql:
+            self.rows = [SimpleNamespace(badge_id=badge_id) for badge_id in self.db.awards]
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeDatabase:
+    def __init__(self, profiles=None, awards=()):
+        self.profiles = profiles or {}
+        self.awards = list(awards)
+        self.executed = []
+
+    @contextmanager
+    def connect(self):
+        yield SimpleNamespace(cursor=lambda: FakeCursor(self))
+
+
+def profile(total=0, resolved=0, quick=0, points=0, earned=None):
+    return SimpleNamespace(total_complaints=total, resolved_complaints=resolved, quick_resolutions=quick,
+                           points=points, earned=earned)
+
+
+def test_quick_resolution_compares_elapsed_time():
+    assert quick_resolution("c.submitted_at", "c.resolved_at") == \
+        f"DATEADD(hour, {QUICK_RESOLUTION_HOURS}, c.submitted_at) > c.resolved_at"
+    assert quick_resolution() in RECOUNT_QUICK_RESOLUTIONS_SQL
+    assert "DATEDIFF" not in RECOUNT_QUICK_RESOLUTIONS_SQL
+
+
+def test_qualifies_predicate_covers_each_supported_type():
+    engine = BadgeEngine(None, lambda: BADGES)
+    predicate = _qualifies_predicate(engine.catalogue())
+    assert "p.total_complaints >= b.requirement_value" in predicate
+    assert "p.quick_resolutions >= b.requirement_value" in predicate
+    assert "p.points >= b.requirement_value" in predicate
+    assert "moon_phase" not in predicate
+
+
+def test_evaluate_inserts_only_newly_qualified_badges():
+    db = FakeDatabase({"a@x": profile(total=2, quick=3, points=20, earned="1")}, awards=[2])
+    engine = BadgeEngine(db.connect, lambda: BADGES)
+    assert engine.evaluate("a@x") == [2]
+    insert = db.executed[-1]
+    assert "INSERT INTO UserBadges" in insert and "IN (?)" in insert
+    assert engine.stats()["awarded"] == 1
+
+
+def test_evaluate_skips_the_insert_when_nothing_qualifies():
+    db = FakeDatabase({"a@x": profile(total=1, earned="1")})
+    engine = BadgeEngine(db.connect, lambda: BADGES)
+    assert engine.evaluate("a@x") == []
+    assert engine.evaluate("nobody@x") == []
+    assert not any("INSERT" in sql for sql in db.executed)
+
+
+def test_submit_drops_duplicates_and_overflow():
+    engine = BadgeEngine(None, lambda: BADGES, max_queue=2)
+    for email in ("a@x", "a@x", "b@x", "c@x", None):
+        engine.submit(email)
+    stats = engine.stats()
+    assert (stats["queued"], stats["dropped"], stats["queue_depth"]) == (2, 1, 2)
+
+
+def test_queued_users_are_evaluated_by_the_workers():
+    db = FakeDatabase({"a@x": profile(total=1)}, awards=[1])
+    awarded = []
+    done = threading.Event()
+
+    def on_award(email, badge_ids):
+        awarded.append((email, badge_ids))
+        done.set()
+
+    engine = BadgeEngine(db.connect, lambda: BADGES, on_award=on_award, workers=1)
+    engine.start()
+    engine.submit("a@x")
+    assert done.wait(5)
+    assert awarded == [("a@x", [1])]
+
+
+def test_backfill_recounts_then_awards_in_one_statement():
+    db = FakeDatabase(awards=[1, 1, 3])
+    engine = BadgeEngine(db.connect, lambda: BADGES)
+    assert engine.backfill() == {1: 2, 3: 1}
+    assert db.executed[0] == RECOUNT_QUICK_RESOLUTIONS_SQL
+    assert "JOIN Badges b ON" in db.executed[1]
+    db.executed.clear()
+    engine.backfill(recount=False)
+    assert RECOUNT_QUICK_RESOLUTIONS_SQL not in db.executed
@@ -0,0 +1,63 @@
+import threading
+
+from change_feed import ChangeFeed
+
+
+def test_since_returns_ids_changed_after_the_token_newest_first():
+    feed = ChangeFeed()
+    token = feed.token()
+    feed.record(1, "a@x")
+    feed.record(2, "b@x")
+    feed.record(1)
+    token, ids, reset = feed.since(token)
+    assert (ids, reset) == ([1, 2], False)
+    assert feed.since(token) == (token, [], False)
+
+
+def test_since_filters_by_owner_and_keeps_the_owner_on_later_records():
+    feed = ChangeFeed()
+    token = feed.token()
+    feed.record(1, " A@x ")
+    feed.record(2, "b@x")
+    feed.record(1)
+    feed.record(3)  # owner unknown: returned to everyone
+    _, ids, _ = feed.since(token, email="a@X")
+    assert ids == [3, 1]
+
+
+def test_unknown_or_evicted_tokens_reset():
+    feed = ChangeFeed(max_entries=2)
+    for token in (None, "garbage", "otherepoch.0.0", feed.token(5)):
+        assert feed.since(token)[1:] == ([], True)
+    token = feed.token()
+    for complaint_id in range(3):
+        feed.record(complaint_id)
+    assert feed.since(token)[1:] == ([], True)
+    assert feed.stats()["resets"] == 5
+
+
+def test_too_many_changes_reset():
+    feed = ChangeFeed()
+    token = feed.token()
+    for complaint_id in range(4):
+        feed.record(complaint_id)
+    assert feed.since(token, limit=3)[1:] == ([], True)
+    assert feed.since(token, limit=4)[1] == [3, 2, 1, 0]
+
+
+def test_wait_wakes_on_record_and_times_out_otherwise():
+    feed = ChangeFeed()
+    token = feed.token()
+    assert feed.wait(token, timeout=0.01) is False
+    threading.Timer(0.05, feed.record, (1,)).start()
+    assert feed.wait(token, timeout=5) is True
+
+
+def test_tokens_expire_with_the_resync_interval(monkeypatch):
+    feed = ChangeFeed(resync_interval=60)
+    now = [6000.0]
+    monkeypatch.setattr("change_feed.time.time", lambda: now[0])
+    token = feed.token()
+    assert feed.since(token)[2] is False
+    now[0] += 60
+    assert feed.since(token)[2] is True
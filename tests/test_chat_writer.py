@@ -0,0 +1,120 @@
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+# chat_writer imports pyodbc, which needs the unixODBC driver manager (libodbc) to load
+pyodbc = pytest.importorskip("pyodbc", exc_type=ImportError)
+
+from chat_history import ChatHistory
+from chat_writer import ChatWriter
+
+
+class FakeDatabase:
+    """Complaints 1 and 2 exist; `down` makes every connection attempt fail"""
+
+    def __init__(self):
+        self.complaints = {1, 2}
+        self.saved = []
+        self.down = False
+        self.queries = 0
+
+    @contextmanager
+    def connect(self):
+        if self.down:
+            raise pyodbc.OperationalError("08S01", "Communication link failure")
+        yield self
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.found = False
+
+    def setinputsizes(self, sizes):
+        pass
+
+    def executemany(self, sql, rows):
+        if any(row[0] not in self.db.complaints for row in rows):
+            raise pyodbc.IntegrityError("23000", "FOREIGN KEY constraint FK_ChatMessages_Complaints")
+        self.db.saved.extend(rows)
+
+    def execute(self, sql, complaint_id):
+        self.db.queries += 1
+        self.found = complaint_id in self.db.complaints
+
+    def fetchone(self):
+        return SimpleNamespace() if self.found else None
+
+
+def queued(writer):
+    batch = []
+    while not writer._queue.empty():
+        batch.append(writer._queue.get_nowait())
+    return batch
+
+
+def test_rejected_rows_are_dropped_and_the_rest_saved():
+    db = FakeDatabase()
+    writer = ChatWriter(db.connect)
+    for complaint_id in (1, 99, 2):
+        writer.write(complaint_id, "Asha", "student", "hello")
+    assert writer._write(queued(writer)) == []
+    assert [row[0] for row in db.saved] == [1, 2]
+    stats = writer.stats()
+    assert (stats["written"], stats["dropped"]) == (2, 1)
+    assert stats["last_error"].startswith("IntegrityError")
+
+
+def test_a_lone_rejected_row_is_not_retried():
+    db = FakeDatabase()
+    writer = ChatWriter(db.connect)
+    writer.write(99, "Asha", "student", "hello")
+    assert writer._write(queued(writer)) == []
+    assert writer.stats()["dropped"] == 1
+
+
+def test_every_row_rejected_does_not_stall_the_writer():
+    db = FakeDatabase()
+    writer = ChatWriter(db.connect)
+    writer.write(98, "Asha", "student", "hello")
+    writer.write(99, "Asha", "student", "hello")
+    assert writer._write(queued(writer)) == []
+    assert writer.stats()["dropped"] == 2
+
+
+def test_connectivity_errors_keep_the_batch_for_retry():
+    db = FakeDatabase()
+    db.down = True
+    writer = ChatWriter(db.connect)
+    writer.write(1, "Asha", "student", "hello")
+    writer.write(99, "Asha", "student", "hello")
+    batch = queued(writer)
+    assert writer._write(batch) == batch
+    assert writer.stats()["dropped"] == 0
+    db.down = False
+    assert writer._write(batch) == []
+    assert [row[0] for row in db.saved] == [1]
+
+
+def test_close_flushes_queued_messages():
+    db = FakeDatabase()
+    writer = ChatWriter(db.connect, flush_interval=0.01)
+    writer.start()
+    writer.write(1, "Asha", "student", "hello")
+    writer.close()
+    assert [row[0] for row in db.saved] == [1]
+
+
+def test_complaint_existence_is_cached_per_room():
+    db = FakeDatabase()
+    history = ChatHistory()
+    assert history.exists("1", db.connect)
+    assert history.exists(1, db.connect)
+    assert db.queries == 1
+    assert not history.exists(99, db.connect)
+    assert not history.exists(99, db.connect)
+    assert db.queries == 3
@@ -0,0 +1,116 @@
+import base64
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from complaint_queries import (KEYSET_CURSOR, OFFSET_CURSOR, CountEstimator, InvalidCursor, cursor_kind,
+                               decode_cursor, decode_offset_cursor, encode_cursor, encode_offset_cursor,
+                               keyset_predicate, parse_fields, parse_limit, select_columns)
+
+
+def legacy_token(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+class FakeCursor:
+    """Answers each statement with the next scripted result (an exception is raised)"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.statements = []
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql)
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        self._row = SimpleNamespace(total=result)
+
+    def fetchone(self):
+        return self._row
+
+
+def test_keyset_cursor_round_trip():
+    at = datetime(2026, 5, 1, 12, 30, 15, 123000)
+    token = encode_cursor(at, 42)
+    assert cursor_kind(token) == KEYSET_CURSOR
+    assert decode_cursor(token) == (at, 42)
+
+
+def test_offset_cursor_round_trip():
+    token = encode_offset_cursor(60)
+    assert cursor_kind(token) == OFFSET_CURSOR
+    assert decode_offset_cursor(token) == 60
+
+
+def test_cursor_kinds_are_not_interchangeable():
+    with pytest.raises(InvalidCursor):
+        decode_offset_cursor(encode_cursor(datetime(2026, 5, 1), 1))
+    with pytest.raises(InvalidCursor):
+        decode_cursor(encode_offset_cursor(20))
+
+
+def test_tokens_without_kind_are_still_accepted():
+    keyset = legacy_token({"s": "2026-05-01T00:00:00", "i": 7})
+    offset = legacy_token({"o": 40})
+    assert cursor_kind(keyset) == KEYSET_CURSOR and decode_cursor(keyset) == (datetime(2026, 5, 1), 7)
+    assert cursor_kind(offset) == OFFSET_CURSOR and decode_offset_cursor(offset) == 40
+
+
+@pytest.mark.parametrize("token", ["not base64!", legacy_token([1, 2]), legacy_token({"k": "other"}),
+                                   legacy_token({"o": -1})])
+def test_invalid_cursors(token):
+    with pytest.raises(InvalidCursor):
+        decode = decode_offset_cursor if cursor_kind(token) == OFFSET_CURSOR else decode_cursor
+        decode(token)
+
+
+def test_keyset_predicate_for_null_timestamp():
+    predicate, params = keyset_predicate(encode_cursor(None, 9))
+    assert "IS NULL" in predicate and params == [9]
+
+
+def test_limit_and_fields():
+    assert parse_limit(None) == 50 and parse_limit("0") == 1 and parse_limit("10000") == 200
+    with pytest.raises(ValueError):
+        parse_limit("ten")
+    fields = parse_fields("title,is_overdue")
+    assert fields == ["id", "title", "is_overdue"]
+    assert select_columns(fields) == ["id", "submitted_at", "title", "due_date", "status"]
+    with pytest.raises(ValueError):
+        parse_fields("title,password")
+
+
+def test_unfiltered_count_uses_partition_stats():
+    cursor = FakeCursor(1234)
+    assert CountEstimator().estimate(cursor, "WHERE 1=1", []) == 1234
+    assert "dm_db_partition_stats" in cursor.statements[0]
+
+
+def test_unfiltered_count_falls_back_without_view_database_state():
+    estimator = CountEstimator()
+    cursor = FakeCursor(PermissionError("VIEW DATABASE STATE permission denied"), 99, 100)
+    assert estimator.estimate(cursor, "WHERE 1=1", []) == 99
+    assert "sys.partitions" in cursor.statements[1]
+    # The denied query is not tried again
+    assert estimator.estimate(cursor, "WHERE 1=1", []) == 100
+    assert len(cursor.statements) == 3
+
+
+def test_unfiltered_count_falls_back_to_count_star():
+    estimator = CountEstimator()
+    cursor = FakeCursor(PermissionError("denied"), PermissionError("denied"), 5)
+    assert estimator.estimate(cursor, "WHERE 1=1", []) == 5
+    assert "COUNT(*)" in cursor.statements[-1]
+    # Cached like a filtered count
+    assert estimator.estimate(cursor, "WHERE 1=1", []) == 5
+
+
+def test_filtered_counts_are_cached():
+    estimator = CountEstimator(ttl=60)
+    cursor = FakeCursor(3)
+    assert estimator.estimate(cursor, "WHERE 1=1 AND status = ?", ["Resolved"]) == 3
+    assert estimator.estimate(cursor, "WHERE 1=1 AND status = ?", ["Resolved"]) == 3
+    assert len(cursor.statements) == 1
@@ -0,0 +1,152 @@
+import threading
+
+import pytest
+
+from db_pool import ConnectionPool, PoolTimeoutError, iter_rows
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = [1, 2, 3, 4, 5]
+
+    def execute(self, sql):
+        if self.conn.dead:
+            raise ConnectionError("connection reset")
+
+    def fetchall(self):
+        return []
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.dead = False
+        self.closed = False
+        self.log = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.log.append("commit")
+
+    def rollback(self):
+        self.log.append("rollback")
+        if self.dead:
+            raise ConnectionError("connection reset")
+
+    def close(self):
+        self.closed = True
+
+
+def pool(**options):
+    opened = []
+
+    def connect():
+        opened.append(FakeConnection(len(opened)))
+        return opened[-1]
+
+    return ConnectionPool(connect, **options), opened
+
+
+def test_connections_are_reused_and_commit_on_success():
+    connections, opened = pool()
+    with connections.connection() as conn:
+        conn.cursor().execute("SELECT 1")
+    with connections.connection():
+        pass
+    assert len(opened) == 1
+    assert opened[0].log == ["commit", "commit"]
+    assert connections.stats()["checkouts"] == 2
+
+
+def test_errors_roll_back_and_a_failed_rollback_discards_the_connection():
+    connections, opened = pool()
+    with pytest.raises(ValueError):
+        with connections.connection():
+            opened[0].dead = True
+            raise ValueError("bad row")
+    assert opened[0].log == ["rollback"]
+    assert opened[0].closed
+    assert connections.stats()["size"] == 0
+
+
+def test_checkout_times_out_when_the_pool_is_exhausted():
+    connections, _ = pool(max_size=1)
+    held = connections.connection()
+    with pytest.raises(PoolTimeoutError):
+        connections.connection(timeout=0.01)
+    held.close()
+    connections.connection(timeout=0.01).close()
+    assert connections.stats()["timeouts"] == 1
+
+
+def test_waiting_checkout_gets_the_released_connection():
+    connections, opened = pool(max_size=1)
+    held = connections.connection()
+    threading.Timer(0.05, held.close).start()
+    connections.connection(timeout=5).close()
+    assert len(opened) == 1
+    assert connections.stats()["waits"] == 1
+
+
+def test_stale_connection_is_replaced_after_a_failed_ping():
+    connections, opened = pool(ping_interval=0)
+    connections.connection().close()
+    opened[0].dead = True
+    with connections.connection() as conn:
+        assert conn.number == 1
+    assert opened[0].closed
+    assert connections.stats()["failed_pings"] == 1
+
+
+def test_expired_connections_are_recycled():
+    connections, opened = pool(max_lifetime=0.001)
+    conn = connections.connection()
+    threading.Event().wait(0.01)
+    conn.close()
+    assert opened[0].closed
+    assert connections.stats()["connections_recycled"] == 1
+
+
+def test_failed_connect_gives_the_slot_back():
+    def connect():
+        raise ConnectionError("login timeout")
+
+    connections = ConnectionPool(connect, max_size=1)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            connections.connection(timeout=0.01)
+    assert connections.stats()["in_use"] == 0
+
+
+def test_warm_opens_min_size():
+    connections, opened = pool(min_size=2)
+    connections.warm()
+    assert len(opened) == 2
+    assert connections.stats()["idle"] == 2
+
+
+def test_returned_connection_cannot_be_used():
+    connections, _ = pool()
+    conn = connections.connection()
+    conn.close()
+    with pytest.raises(AttributeError):
+        conn.cursor()
+
+
+def test_invalid_sizes_are_rejected():
+    with pytest.raises(ValueError):
+        ConnectionPool(lambda: None, min_size=3, max_size=2)
+
+
+def test_iter_rows_fetches_in_chunks():
+    assert list(iter_rows(FakeCursor(FakeConnection(0)), chunk_size=2)) == [1, 2, 3, 4, 5]
@@ -0,0 +1,74 @@
+import pytest
+
+from event_dispatcher import EventDispatcher, complaint_room, role_room, user_room
+
+
+class FakeSocketIO:
+    def __init__(self):
+        self.emitted = []
+        self.tasks = []
+
+    def emit(self, event, data, to=None):
+        self.emitted.append((to, event, data))
+
+    def start_background_task(self, target):
+        self.tasks.append(target)
+        return target  # stands in for the thread handle (not run: tests flush by hand)
+
+
+def test_events_are_batched_per_room_until_flushed():
+    socketio = FakeSocketIO()
+    dispatcher = EventDispatcher(socketio, window=0.25)
+    dispatcher.publish("new_comment", {"id": 1}, ["complaint_1", "role_admin"])
+    dispatcher.publish("status_updated", {"id": 1}, ["complaint_1"])
+    assert socketio.emitted == []
+    assert len(socketio.tasks) == 1  # one flusher, started on first publish
+    dispatcher.flush()
+    assert socketio.emitted == [
+        ("complaint_1", "events", [{"event": "new_comment", "data": {"id": 1}},
+                                   {"event": "status_updated", "data": {"id": 1}}]),
+        ("role_admin", "events", [{"event": "new_comment", "data": {"id": 1}}]),
+    ]
+    dispatcher.flush()
+    assert len(socketio.emitted) == 2
+
+
+def test_coalesced_events_keep_their_position_and_the_latest_data():
+    socketio = FakeSocketIO()
+    dispatcher = EventDispatcher(socketio)
+    dispatcher.publish("upvote_updated", {"upvotes": 1}, ["r"], coalesce_key=7)
+    dispatcher.publish("new_comment", {"id": 7}, ["r"])
+    dispatcher.publish("upvote_updated", {"upvotes": 2}, ["r"], coalesce_key=7)
+    dispatcher.publish("upvote_updated", {"upvotes": 5}, ["r"], coalesce_key=8)
+    dispatcher.flush()
+    (_, _, items), = socketio.emitted
+    assert items == [{"event": "upvote_updated", "data": {"upvotes": 2}},
+                     {"event": "new_comment", "data": {"id": 7}},
+                     {"event": "upvote_updated", "data": {"upvotes": 5}}]
+    stats = dispatcher.stats()
+    assert (stats["published"], stats["coalesced"], stats["events_emitted"]) == (4, 1, 3)
+
+
+def test_large_bursts_are_split_into_max_batch_messages():
+    socketio = FakeSocketIO()
+    dispatcher = EventDispatcher(socketio, max_batch=2)
+    for i in range(5):
+        dispatcher.publish("new_complaint", {"id": i}, ["role_admin"])
+    dispatcher.flush()
+    assert [len(items) for _, _, items in socketio.emitted] == [2, 2, 1]
+
+
+def test_zero_window_emits_immediately():
+    socketio = FakeSocketIO()
+    dispatcher = EventDispatcher(socketio, window=0)
+    dispatcher.publish("badge_earned", {"badge": 1}, ["user_a@x"])
+    assert socketio.emitted == [("user_a@x", "events", [{"event": "badge_earned", "data": {"badge": 1}}])]
+    assert socketio.tasks == []
+
+
+def test_room_names():
+    assert complaint_room(3) == "complaint_3"
+    assert user_room(" A@X ") == "user_a@x"
+    assert role_room("admin") == "role_admin"
+    with pytest.raises(ValueError):
+        role_room("root")
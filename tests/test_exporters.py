@@ -0,0 +1,106 @@
+import gzip
+import json
+from collections import namedtuple
+
+import pytest
+
+from exporters import MAX_RELATED_IDS, STREAM_COLUMNS, _fetch_related, gzip_chunks, iter_export
+
+
+class FakeCursor:
+    def __init__(self, log, rows=()):
+        self.log = log
+        self.rows = list(rows)
+        self.description = [("complaint_id",), ("id",), ("comment_text",)]
+
+    def execute(self, sql, params=None):
+        self.log.append("execute")
+        self.params = params
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def fetchall(self):
+        return [(1, 10, "On it")]
+
+    def close(self):
+        self.log.append("cursor.close")
+
+
+class FakeConnection:
+    def __init__(self, log, rows=(), fail_rollback=False):
+        self.log = log
+        self.rows = rows
+        self.fail_rollback = fail_rollback
+
+    def cursor(self):
+        return FakeCursor(self.log, self.rows)
+
+    def rollback(self):
+        self.log.append("rollback")
+        if self.fail_rollback:
+            raise RuntimeError("connection lost")
+
+    def close(self, discard=False):
+        self.log.append("close(discard)" if discard else "close")
+
+
+Row = namedtuple("Row", STREAM_COLUMNS)
+
+
+def complaint(id):
+    return Row(*(id if column == "id" else None for column in STREAM_COLUMNS))
+
+
+def test_ndjson_with_comments():
+    log = []
+    rows = [complaint(1), complaint(2)]
+    connections = iter([FakeConnection(log, rows), FakeConnection(log)])
+    chunks = list(iter_export(lambda: next(connections), "", [], include=["comments"], chunk_size=5))
+    items = [json.loads(line) for line in "".join(chunks).splitlines()]
+    assert [item["id"] for item in items] == [1, 2]
+    assert items[0]["comments"] == [{"id": 10, "comment_text": "On it"}]
+    assert items[1]["comments"] == []
+
+
+def test_related_rows_are_fetched_in_batches_under_the_parameter_limit():
+    class BatchCursor(FakeCursor):
+        def fetchall(self):
+            return [(self.params[0], self.params[0], "first of batch")]
+
+    log = []
+    ids = list(range(1, 2 * MAX_RELATED_IDS + 2))
+    related = _fetch_related(BatchCursor(log), ["comments"], ids)
+    assert log == ["execute"] * 3
+    assert sorted(related["comments"]) == [1, MAX_RELATED_IDS + 1, 2 * MAX_RELATED_IDS + 1]
+
+
+def test_disconnect_closes_cursors_and_rolls_back_before_release():
+    log = []
+    rows = [complaint(i) for i in range(10)]
+    connections = iter([FakeConnection(log, rows), FakeConnection(log)])
+    chunks = iter_export(lambda: next(connections), "", [], fmt="csv", include=["comments"], chunk_size=2)
+    next(chunks)  # header
+    next(chunks)
+    log.clear()
+    chunks.close()
+    assert log == ["cursor.close", "rollback", "close", "cursor.close", "rollback", "close"]
+
+
+def test_connection_that_fails_to_roll_back_is_discarded():
+    log = []
+    chunks = iter_export(lambda: FakeConnection(log, [complaint(1)], fail_rollback=True), "", [])
+    list(chunks)
+    assert log[-2:] == ["rollback", "close(discard)"]
+
+
+def test_invalid_options_fail_up_front():
+    with pytest.raises(ValueError):
+        iter_export(lambda: None, "", [], fmt="xml")
+    with pytest.raises(ValueError):
+        iter_export(lambda: None, "", [], include=["votes"])
+
+
+def test_gzip_chunks_round_trip():
+    assert gzip.decompress(b"".join(gzip_chunks(["a,b\n", "1,2\n"]))) == b"a,b\n1,2\n"
@@ -0,0 +1,73 @@
+from flask import Flask, jsonify
+
+from http_cache import HttpCache
+
+
+def app_with_cache(cache):
+    app = Flask(__name__)
+    calls = []
+
+    @app.route("/complaint/<int:complaint_id>", methods=["GET", "POST"])
+    @cache.conditional(lambda complaint_id: [("complaint", complaint_id), "leaderboard"])
+    def complaint(complaint_id):
+        calls.append(complaint_id)
+        if complaint_id == 404:
+            return jsonify({"error": "Complaint not found"}), 404
+        return jsonify({"id": complaint_id})
+
+    return app.test_client(), calls
+
+
+def test_matching_etag_gets_304_without_running_the_view():
+    cache = HttpCache()
+    client, calls = app_with_cache(cache)
+    first = client.get("/complaint/1")
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] == "no-cache"
+    etag = first.headers["ETag"]
+    second = client.get("/complaint/1", headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.headers["ETag"] == etag
+    assert calls == [1]
+    assert cache.stats()["not_modified"] == 1
+
+
+def test_writes_to_a_dependency_invalidate_the_etag():
+    cache = HttpCache()
+    client, calls = app_with_cache(cache)
+    etag = client.get("/complaint/1").headers["ETag"]
+    cache.bump("complaint", 2)  # another complaint: still valid
+    assert client.get("/complaint/1", headers={"If-None-Match": etag}).status_code == 304
+    cache.bump("leaderboard")
+    changed = client.get("/complaint/1", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+
+def test_star_other_methods_and_errors_are_not_cached():
+    cache = HttpCache()
+    client, calls = app_with_cache(cache)
+    assert client.get("/complaint/1", headers={"If-None-Match": "*"}).status_code == 200
+    assert "ETag" not in client.post("/complaint/1").headers
+    assert "ETag" not in client.get("/complaint/404").headers
+    assert calls == [1, 1, 404]
+
+
+def test_etags_from_another_process_or_too_many_scopes_do_not_match():
+    cache = HttpCache(max_scopes=2)
+    etag, _ = cache.validators([("complaint", 1)])
+    assert HttpCache().validators([("complaint", 1)])[0] != etag
+    cache.bump("complaint", 2)
+    cache.bump("complaint", 3)
+    cache.bump("complaint", 4)  # over max_scopes: every counter is forgotten
+    assert cache.validators([("complaint", 1)])[0] != etag
+
+
+def test_max_staleness_rolls_the_etag_over(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("http_cache.time.time", lambda: now[0])
+    cache = HttpCache(max_staleness=5)
+    etag, _ = cache.validators(["leaderboard"])
+    assert cache.validators(["leaderboard"])[0] == etag
+    now[0] += 5
+    assert cache.validators(["leaderboard"])[0] != etag
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from leaderboard import RESOLVE_POINTS, SUBMIT_POINTS, Leaderboard
+
+NOW = datetime(2026, 5, 13, 12, 0)  # a Wednesday
+
+
+def profile(points, total=0, resolved=0):
+    return SimpleNamespace(points=points, total_complaints=total, resolved_complaints=resolved)
+
+
+def profile_row(email, points, total=0, resolved=0, name=None):
+    return SimpleNamespace(email=email, name=name, points=points, total_complaints=total,
+                           resolved_complaints=resolved)
+
+
+def award_row(kind, complaint_id, email, earned_at):
+    points = SUBMIT_POINTS if kind == "submit" else RESOLVE_POINTS
+    return SimpleNamespace(kind=kind, id=complaint_id, email=email, earned_at=earned_at, points=points)
+
+
+class FakeCursor:
+    """Returns the scripted rows for each query, calling during(n) before the nth execute"""
+
+    def __init__(self, profiles, awards, during=None):
+        self.results = [profiles, awards]
+        self.during = during or (lambda n: None)
+        self.executed = 0
+
+    def execute(self, sql, params=None):
+        self.during(self.executed)
+        self.executed += 1
+        self._rows = self.results.pop(0)
+
+    def fetchall(self):
+        return self._rows
+
+
+def test_hooks_rank_users():
+    board = Leaderboard(clock=lambda: NOW)
+    board.on_submit("a@x", 1, profile(10, total=1), name="A")
+    board.on_submit("b@x", 2, profile(10, total=1))
+    board.on_resolved("b@x", 2, profile(60, total=1, resolved=1))
+    entries, total = board.top("all")
+    assert total == 2
+    assert [(e["email"], e["points"], e["rank"]) for e in entries] == [("b@x", 60, 1), ("a@x", 10, 2)]
+    assert board.top("weekly")[0][0]["points"] == 60
+    assert entries[1]["name"] == "A"
+
+
+def test_replayed_hook_counts_once():
+    board = Leaderboard(clock=lambda: NOW)
+    board.on_submit("a@x", 1, profile(10, total=1))
+    board.on_submit("a@x", 1, profile(10, total=1))
+    assert board.top("all")[0][0]["points"] == 10
+    assert board.top("weekly")[0][0]["points"] == 10
+
+
+def test_rebuild_does_not_double_count_awards_the_snapshot_saw():
+    board = Leaderboard(clock=lambda: NOW)
+
+    def during(n):
+        if n == 0:  # committed and hooked just before the snapshot is read
+            board.on_submit("a@x", 7, profile(20, total=2))
+
+    cursor = FakeCursor([profile_row("a@x", 20, total=2)],
+                        [award_row("submit", 6, "a@x", NOW - timedelta(days=1)),
+                         award_row("submit", 7, "a@x", NOW)], during)
+    board.rebuild_from(cursor)
+    entry = board.top("all")[0][0]
+    assert (entry["points"], entry["total_complaints"]) == (20, 2)
+    assert board.top("weekly")[0][0]["points"] == 20
+    assert board.top("monthly")[0][0]["points"] == 20
+
+
+def test_rebuild_replays_awards_the_snapshot_missed():
+    board = Leaderboard(clock=lambda: NOW)
+
+    def during(n):
+        if n == 1:  # committed after the profile query read its rows
+            board.on_resolved("a@x", 6, profile(60, total=1, resolved=1))
+
+    cursor = FakeCursor([profile_row("a@x", 10, total=1)],
+                        [award_row("submit", 6, "a@x", NOW - timedelta(days=1))], during)
+    board.rebuild_from(cursor)
+    entry = board.top("all")[0][0]
+    assert (entry["points"], entry["resolved_complaints"]) == (60, 1)
+    assert board.top("weekly")[0][0]["points"] == 60
+
+
+def test_weekly_board_restarts_each_week():
+    now = [NOW]
+    board = Leaderboard(clock=lambda: now[0])
+    board.on_submit("a@x", 1, profile(10, total=1))
+    now[0] = NOW + timedelta(days=7)
+    assert board.top("weekly") == ([], 0)
+    assert board.top("monthly")[1] == 1
+    assert board.rank("a@x", "all") == 1
@@ -0,0 +1,100 @@
+import pytest
+from flask import Flask
+
+from metrics import Histogram, Metrics
+
+
+def sample(text, name):
+    """Value of the sample whose name and labels are exactly `name`"""
+    for line in text.splitlines():
+        if line.rsplit(" ", 1)[0] == name:
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"{name} not in output")
+
+
+def app_with_metrics():
+    metrics = Metrics()
+    app = Flask(__name__)
+    metrics.instrument_app(app)
+
+    @app.route("/items/<int:item_id>")
+    def item(item_id):
+        if item_id == 0:
+            return "missing", 500
+        return "ok"
+
+    return app, metrics
+
+
+def test_requests_are_labelled_by_route_template():
+    app, metrics = app_with_metrics()
+    client = app.test_client()
+    for item_id in (1, 2, 0):
+        client.get(f"/items/{item_id}")
+    client.get("/nowhere")
+    text = metrics.render()
+    assert sample(text, 'http_requests_total{endpoint="/items/<int:item_id>",method="GET"}') == 3
+    assert sample(text, 'http_request_errors_total{endpoint="/items/<int:item_id>",method="GET"}') == 1
+    assert sample(text, 'http_request_duration_seconds_count{endpoint="/items/<int:item_id>",method="GET"}') == 3
+    assert sample(text, 'http_request_duration_seconds_bucket{endpoint="/items/<int:item_id>",method="GET",le="+Inf"}') == 3
+    assert sample(text, 'http_requests_total{endpoint="unmatched",method="GET"}') == 1
+    assert sample(text, 'http_requests_in_flight{endpoint="/items/<int:item_id>"}') == 0
+
+
+def test_collectors_are_flattened_into_gauges():
+    metrics = Metrics()
+    metrics.register("pool", lambda: {"size": 3, "ready": True, "latency_ms": {"p95": 1.5}, "last_error": "x"})
+    metrics.register("broken", lambda: 1 / 0)
+    text = metrics.render()
+    assert sample(text, "app_pool_size") == 3
+    assert sample(text, "app_pool_ready") == 1
+    assert sample(text, "app_pool_latency_ms_p95") == 1.5
+    assert "last_error" not in text
+    assert "# TYPE app_pool_size gauge" in text
+    assert sample(text, 'app_collector_failed{collector="broken"}') == 1
+
+
+class FakeSocketIO:
+    def __init__(self):
+        self.handlers = {}
+
+    def on(self, message, namespace=None):
+        def register(handler):
+            self.handlers[message] = handler
+            return handler
+        return register
+
+
+def test_socketio_handlers_are_counted_and_errors_recorded():
+    metrics = Metrics()
+    socketio = FakeSocketIO()
+    metrics.instrument_socketio(socketio)
+
+    @socketio.on("send_message")
+    def handle(data):
+        if data is None:
+            raise ValueError("no data")
+
+    socketio.handlers["send_message"]({})
+    with pytest.raises(ValueError):
+        socketio.handlers["send_message"](None)
+    text = metrics.render()
+    assert sample(text, 'socketio_events_total{event="send_message"}') == 2
+    assert sample(text, 'socketio_event_errors_total{event="send_message"}') == 1
+
+
+def test_label_values_are_escaped():
+    metrics = Metrics()
+    metrics._requests[('/say/"hi"\\', "GET")] = [1, 0, Histogram()]
+    assert 'endpoint="/say/\\"hi\\"\\\\"' in metrics.render()
+
+
+def test_histogram_quantiles_interpolate_within_buckets():
+    histogram = Histogram(buckets=(0.1, 0.2))
+    assert histogram.quantile(0.5) is None
+    for value in (0.05, 0.15, 0.15, 0.15):
+        histogram.observe(value)
+    assert histogram.quantile(0.25) == pytest.approx(0.1)
+    assert histogram.quantile(1.0) == pytest.approx(0.2)
+    histogram.observe(9)
+    assert histogram.quantile(1.0) == 0.2  # beyond the last bound
@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from metrics import latency_summary
+from notification_outbox import NotificationOutbox, SpoolOutboxStore
+
+
+class DownStore:
+    """Stands in for the NotificationOutbox table while the database is unreachable"""
+
+    def enqueue(self, payload):
+        raise ConnectionError("database unreachable")
+
+    def claim(self, limit, lease_seconds):
+        raise ConnectionError("database unreachable")
+
+    def depth(self):
+        return 0
+
+    def purge(self, retention_days):
+        pass
+
+
+def outbox(store, posted, fail=False, **options):
+    outbox = NotificationOutbox(store, "http://logic-app.invalid/notify", **options)
+
+    def post(body):
+        if fail:
+            raise ConnectionError("webhook down")
+        posted.append(body)
+
+    outbox._post = post
+    return outbox
+
+
+def drain(outbox):
+    """One pass of a worker over every store, as _run() makes them"""
+    for store in outbox._stores:
+        try:
+            messages = store.claim(100, outbox.lease_seconds)
+        except ConnectionError:
+            continue
+        if messages:
+            outbox._deliver(store, messages)
+
+
+def test_spool_round_trip(tmp_path):
+    posted = []
+    spool = SpoolOutboxStore(tmp_path)
+    notifications = outbox(spool, posted)
+    notifications.enqueue({"complaint_id": 1})
+    notifications.enqueue({"complaint_id": 2})
+    assert notifications.queue_depth(max_age=0) == 2
+    drain(notifications)
+    assert posted == [{"complaint_id": 1}, {"complaint_id": 2}]
+    assert spool.depth() == 0
+    assert notifications.stats()["delivered"] == 2
+
+
+def test_enqueue_spools_when_the_store_is_down(tmp_path):
+    posted = []
+    spool = SpoolOutboxStore(tmp_path)
+    notifications = outbox(DownStore(), posted, fallback_store=spool)
+    notifications.enqueue({"complaint_id": "A1B2"})
+    assert spool.depth() == 1
+    assert notifications.stats()["spooled"] == 1
+    drain(notifications)
+    assert posted == [{"complaint_id": "A1B2"}]
+
+
+def test_enqueue_raises_without_a_fallback():
+    with pytest.raises(ConnectionError):
+        outbox(DownStore(), []).enqueue({"complaint_id": 1})
+
+
+def test_failures_back_off_then_dead_letter(tmp_path):
+    spool = SpoolOutboxStore(tmp_path)
+    notifications = outbox(spool, [], fail=True, max_attempts=2, base_delay=0.0)
+    notifications.enqueue({"complaint_id": 1})
+    drain(notifications)
+    assert spool.depth() == 1
+    drain(notifications)
+    assert spool.depth() == 0
+    assert len(list((tmp_path / "dead").iterdir())) == 1
+    stats = notifications.stats()
+    assert (stats["failed_attempts"], stats["dead_lettered"]) == (2, 1)
+    assert stats["last_error"].startswith("ConnectionError")
+
+
+def test_claimed_messages_are_not_handed_out_twice(tmp_path):
+    spool = SpoolOutboxStore(tmp_path)
+    spool.enqueue({"complaint_id": 1})
+    assert len(spool.claim(10, 60)) == 1
+    assert spool.claim(10, 60) == []
+
+
+def test_retry_waits_for_next_attempt(tmp_path):
+    spool = SpoolOutboxStore(tmp_path)
+    spool.enqueue({"complaint_id": 1})
+    messages = spool.claim(10, 60)
+    spool.mark_failed(messages, "HTTPError", datetime.utcnow() + timedelta(minutes=5))
+    assert spool.claim(10, 60) == []
+
+
+def test_latency_summary():
+    assert latency_summary([]) is None
+    assert latency_summary(range(1, 101)) == {"p50": 51, "p95": 96, "max": 100}
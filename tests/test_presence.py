@@ -0,0 +1,100 @@
+import pytest
+
+import presence as presence_module
+from presence import Presence
+
+
+class StopSweep(Exception):
+    pass
+
+
+class FakeSocketIO:
+    """Records emits; sleep() advances the fake clock and ends the sweep after `sweeps` passes"""
+
+    def __init__(self, clock, sweeps=1):
+        self.clock = clock
+        self.sweeps = sweeps
+        self.emitted = []
+        self.tasks = []
+
+    def emit(self, event, data, to=None, skip_sid=None):
+        self.emitted.append((event, data["user_name"], data["typing"], to, skip_sid))
+
+    def start_background_task(self, target):
+        self.tasks.append(target)
+        return target
+
+    def sleep(self, seconds):
+        if not self.sweeps:
+            raise StopSweep
+        self.sweeps -= 1
+        self.clock[0] += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(presence_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def make_presence(clock, **options):
+    socketio = FakeSocketIO(clock)
+    published = []
+    room = Presence(socketio, lambda *args, **kwargs: published.append((args, kwargs)), **options)
+    return room, socketio, published
+
+
+def test_only_typing_transitions_are_emitted(clock):
+    room, socketio, _ = make_presence(clock, min_interval=0.5)
+    for _ in range(5):
+        room.typing("sid1", "7", "Asha")
+        clock[0] += 0.1
+    room.typing("sid1", 7, "Asha", typing=False)
+    room.typing("sid1", 7, "Asha", typing=False)
+    assert socketio.emitted == [("user_typing", "Asha", True, "complaint_7", "sid1"),
+                                ("user_typing", "Asha", False, "complaint_7", "sid1")]
+    stats = room.stats()
+    assert (stats["typing_events"], stats["typing_emitted"], stats["typing"]) == (5, 2, 0)
+    assert stats["throttled"] == 4
+
+
+def test_sending_a_message_or_leaving_stops_typing(clock):
+    room, socketio, _ = make_presence(clock)
+    room.join("sid1", 7)
+    room.join("sid2", 7)
+    room.typing("sid1", 7, "Asha")
+    room.typing("sid2", 7, "Ben")
+    room.stop_typing("sid1", 7)
+    room.disconnect("sid2")
+    assert [(name, typing) for _, name, typing, _, _ in socketio.emitted] == \
+        [("Asha", True), ("Ben", True), ("Asha", False), ("Ben", False)]
+
+
+def test_sweep_expires_silent_typists(clock):
+    room, socketio, _ = make_presence(clock, typing_timeout=3.0, sweep_interval=1.0)
+    room.typing("sid1", 7, "Asha")
+    clock[0] += 1.0
+    room.typing("sid1", 7, "Asha")  # keeps the indicator alive until 104.0
+    socketio.sweeps = 3
+    with pytest.raises(StopSweep):
+        socketio.tasks[0]()
+    assert socketio.emitted[-1][:3] == ("user_typing", "Asha", False)
+    assert room.stats()["typing"] == 0
+
+
+def test_viewer_counts_are_published_per_connection(clock):
+    room, _, published = make_presence(clock)
+    room.join("sid1", 7)
+    room.join("sid1", "7")
+    room.join("sid2", 7)
+    room.leave("sid1", 7)
+    assert [args[1]["viewers"] for args, _ in published] == [1, 2, 1]
+    assert room.count(7) == 1
+
+
+def test_counts_are_not_published_when_workers_share_rooms(clock):
+    room, _, published = make_presence(clock, publish_counts=False)
+    room.join("sid1", 7)
+    assert published == []
+    assert room.count(7) == 1
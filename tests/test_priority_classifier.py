@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+import pytest
+
+from priority_classifier import DUE_DAYS, PriorityClassifier, rescore_complaints
+
+
+def test_default_rules():
+    classifier = PriorityClassifier()
+    assert classifier.classify("Urgent: water leak", "") == "High"
+    assert classifier.classify("Printer", "please look soon") == "Medium"
+    assert classifier.classify("Tissue box empty", None) == "Low"  # "issue" needs a word boundary
+
+
+def test_prefix_rules_weights_and_thresholds():
+    classifier = PriorityClassifier(
+        [{"keyword": "leak*", "priority": "High", "weight": 0.5},
+         {"keyword": "no  water", "priority": "Medium"}],
+        thresholds={"High": 1.0, "Medium": 1.0})
+    assert classifier.classify("Leaking tap", "") == "Low"
+    assert classifier.classify("Leaking tap", "still leaks") == "High"
+    assert classifier.classify("No\nwater today", "") == "Medium"
+
+
+def test_unknown_priorities_are_rejected():
+    with pytest.raises(ValueError):
+        PriorityClassifier([{"keyword": "x", "priority": "Critical"}])
+    with pytest.raises(ValueError):
+        PriorityClassifier(default="None")
+
+
+class FakeCursor:
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.executed = []
+
+    def execute(self, sql, params=None):
+        self.executed.append(sql)
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def executemany(self, sql, params):
+        self.executed.append((sql, list(params)))
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.cursors = [FakeCursor(rows), FakeCursor()]
+
+    def cursor(self):
+        return self.cursors.pop(0)
+
+
+def test_rescore_updates_changed_priorities_and_due_dates():
+    rows = [SimpleNamespace(id=1, title="Urgent leak", description="", priority="Low"),
+            SimpleNamespace(id=2, title="Broken chair", description="", priority="Low")]
+    conn = FakeConnection(rows)
+    writer = conn.cursors[1]
+    changes = rescore_complaints(conn, PriorityClassifier(), chunk_size=1)
+    assert changes == [(1, "High")]
+    sql, params = writer.executed[0]
+    assert "due_date = DATEADD(day, ?, submitted_at)" in sql
+    assert params == [("High", DUE_DAYS["High"], 1)]
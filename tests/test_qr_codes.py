@@ -0,0 +1,21 @@
+import pytest
+
+from qr_codes import parse_sheet_ids
+
+
+def test_ranges_and_listed_ids_are_merged_in_order():
+    assert parse_sheet_ids("3, 5-7,3", ids=[1, "2"]) == [1, 2, 3, 5, 6, 7]
+
+
+def test_oversized_range_is_refused_without_expanding_it():
+    with pytest.raises(ValueError):
+        parse_sheet_ids("1-1000000000")
+    with pytest.raises(ValueError):
+        parse_sheet_ids("1-300,1000-1300")
+    assert len(parse_sheet_ids("1-500")) == 500
+
+
+@pytest.mark.parametrize("ranges, ids", [("9-1", []), ("", []), ("a", []), ("-5", []), ("", range(501))])
+def test_invalid_ids_are_rejected(ranges, ids):
+    with pytest.raises(ValueError):
+        parse_sheet_ids(ranges, ids)
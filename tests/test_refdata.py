@@ -0,0 +1,78 @@
+import pytest
+
+import refdata
+from refdata import RefData
+
+
+class Loader:
+    """Returns the next value on each call; an Exception value is raised instead"""
+
+    def __init__(self, *values):
+        self.values = list(values)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        value = self.values.pop(0) if len(self.values) > 1 else self.values[0]
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(refdata.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_served_from_memory_until_the_ttl_expires(clock):
+    loader = Loader(["a"], ["b"])
+    cache = RefData(default_ttl=60)
+    cache.register("templates", loader)
+    assert cache.get("templates") == ["a"]
+    clock[0] += 59
+    assert cache.get("templates") == ["a"]
+    assert loader.calls == 1
+    clock[0] += 1
+    assert cache.get("templates") == ["b"]
+    assert loader.calls == 2
+
+
+def test_failed_reload_serves_the_cached_copy_and_retries_later(clock):
+    loader = Loader(["a"], ConnectionError("down"), ["b"])
+    cache = RefData(default_ttl=10)
+    cache.register("badges", loader)
+    cache.get("badges")
+    clock[0] += 10
+    assert cache.get("badges") == ["a"]
+    clock[0] += refdata.RETRY_SECONDS - 1
+    assert cache.get("badges") == ["a"]
+    assert loader.calls == 2
+    clock[0] += 1
+    assert cache.get("badges") == ["b"]
+    assert cache.stats()["badges"]["errors"] == 1
+
+
+def test_first_load_failure_raises():
+    cache = RefData()
+    cache.register("badges", Loader(ConnectionError("down")))
+    with pytest.raises(ConnectionError):
+        cache.get("badges")
+    with pytest.raises(KeyError):
+        cache.get("unknown")
+
+
+def test_refresh_and_invalidate_reload_and_report_changes(clock):
+    changes = []
+    cache = RefData(default_ttl=300)
+    cache.register("templates", Loader(["a"], ["a"], ["b"]), on_change=lambda: changes.append("templates"))
+    cache.register("badges", Loader([1], ConnectionError("down")))
+    cache.warm()
+    assert cache.refresh(["templates"]) == {"templates": None}
+    assert changes == []  # same value: dependants keep their caches
+    cache.invalidate("templates")
+    assert cache.get("templates") == ["b"]
+    assert changes == ["templates"]
+    assert cache.refresh(["badges"]) == {"badges": "down"}
+    assert cache.get("badges") == [1]
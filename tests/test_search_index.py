@@ -0,0 +1,81 @@
+import pytest
+
+from search_index import InMemorySearchIndex, SQLiteSearchIndex, parse_query, tokenize
+
+COMPLAINTS = [
+    (1, "Water leaking in hostel room", "The ceiling drips", "Submitted", "High", "Hostel"),
+    (2, "Hostel Wi-Fi down", "No internet on floor 3", "Assigned", "Medium", "Hostel"),
+    (3, "Library printer jammed", "Paper stuck again", "Submitted", "Low", "Library"),
+]
+COMMENTS = [(3, "Technician visited the hostel annex", 10)]
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def index(request):
+    index = InMemorySearchIndex() if request.param == "memory" else SQLiteSearchIndex()
+    index.bulk_load(iter(COMPLAINTS), iter(COMMENTS))
+    return index
+
+
+def ids(result):
+    return [doc_id for doc_id, _ in result[0]]
+
+
+def test_tokenize_drops_stopwords():
+    assert tokenize("The Wi-Fi is DOWN on floor 3") == ["wi", "fi", "down", "floor", "3"]
+    assert parse_query("water hos") == (["water"], "hos")
+
+
+def test_title_matches_rank_first(index):
+    result = index.search("hostel")
+    assert result[1] == 3
+    assert ids(result)[-1] == 3  # comment-only match
+    assert result[2] is False
+
+
+def test_last_term_matches_as_prefix(index):
+    assert set(ids(index.search("hos"))) == {1, 2, 3}
+    assert ids(index.search("water hos")) == [1]
+
+
+def test_filters_and_field_updates(index):
+    assert ids(index.search("hostel", status="Assigned")) == [2]
+    index.update_fields(1, status="Assigned")
+    assert set(ids(index.search("hostel", status="Assigned"))) == {1, 2}
+
+
+def test_comment_ids_are_added_once(index):
+    index.add_comment(1, "printer", 11)
+    index.add_comment(1, "printer", 11)
+    index.add_comment(3, "Technician visited the hostel annex", 10)  # already loaded
+    assert set(ids(index.search("printer"))) == {1, 3}
+    assert index.search("annex")[1] == 1
+
+
+def test_rebuild_keeps_old_contents_and_replays_writes():
+    index = InMemorySearchIndex()
+    index.bulk_load(iter(COMPLAINTS), iter(COMMENTS))
+
+    def complaints():
+        # Searches still see the old contents while the replacement is built
+        assert ids(index.search("library")) == [3]
+        index.upsert(4, "Broken lift", "", "Submitted", "High", "Infrastructure")
+        index.add_comment(2, "router replaced", 12)
+        yield (2, "Hostel Wi-Fi down", "No internet on floor 3", "Resolved", "Medium", "Hostel")
+        yield (3, "Library printer jammed", "Paper stuck again", "Submitted", "Low", "Library")
+
+    index.bulk_load(complaints(), iter([(2, "router replaced", 12)]))
+    assert ids(index.search("lift")) == [4]
+    assert ids(index.search("router")) == [2]
+    assert index._docs[2].comments_tf["router"] == 1  # in the snapshot and the journal, counted once
+    assert ids(index.search("water")) == []
+    assert ids(index.search("hostel", status="Resolved")) == [2]
+    assert len(index) == 3
+
+
+def test_prefix_expansion_cap_is_flagged():
+    index = InMemorySearchIndex(max_prefix_terms=3)
+    index.bulk_load(((i, f"room{i}", "", "Submitted", "Low", "Hostel") for i in range(1, 6)), ())
+    matches, total, approximate = index.search("room")
+    assert (total, approximate) == (3, True)
+    assert index.search("room1")[1:] == (1, False)
@@ -0,0 +1,104 @@
+import json
+import logging
+
+import pytest
+from flask import Flask, jsonify
+
+from sql_instrumentation import QueryBudgetExceeded, SqlInstrumentation, fingerprint, parse_budgets, redact
+
+
+class FakeCursor:
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.rowcount = -1
+        self.executed = []
+
+    def execute(self, sql, *params):
+        self.executed.append((sql, params))
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self.executed.extend((sql, params) for params in seq_of_params)
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+def test_fingerprint_ignores_literals_comments_and_list_lengths():
+    one = fingerprint("SELECT * FROM Complaints -- listing\nWHERE id IN (?, ?) AND status = 'Open' AND upvotes > 5")
+    other = fingerprint("SELECT *  FROM Complaints\n WHERE id IN (?,?,?,?) AND status = N'Resolved' AND upvotes > 12")
+    assert one == other
+    assert one[1] == "SELECT * FROM Complaints WHERE id IN (...) AND status = ? AND upvotes > ?"
+    rows = fingerprint("INSERT INTO Votes (a, b) VALUES (?, ?), (?, ?), (?, ?)")[1]
+    assert rows == "INSERT INTO Votes (a, b) VALUES (?, ?), ..."
+    assert fingerprint("SELECT * FROM Complaints WHERE id = ?")[0] != one[0]
+
+
+def test_redact_keeps_types_and_sizes_only():
+    assert redact(None) is None
+    assert redact("secret@example.com") == ["str(18)"]
+    assert redact((42, None, b"\x00\x01", 1.5)) == ["int", None, "bytes(2)", "float"]
+
+
+def test_slow_statements_are_logged_without_parameter_values(caplog):
+    instrumentation = SqlInstrumentation(slow_ms=0)
+    cursor = instrumentation.wrap_cursor(FakeCursor(rows=[1, 2]))
+    with caplog.at_level(logging.WARNING, logger="sql_instrumentation.slow"):
+        assert cursor.execute("SELECT * FROM Users WHERE email = ? AND pin = ?", "a@x.com", 987654) is cursor
+        cursor.executemany("INSERT INTO Tags (name) VALUES (?)", [("hunter2",), ("swordfish",)])
+    assert cursor.fetchall() == [1, 2]
+    logged = "\n".join(caplog.messages)
+    for value in ("a@x.com", "987654", "hunter2", "swordfish"):
+        assert value not in logged
+    first, second = (json.loads(message) for message in caplog.messages)
+    assert first["params"] == ["str(7)", "int"]
+    assert second["params"] == {"batch": 2, "first": ["str(7)"]}
+    stats = instrumentation.stats()
+    assert (stats["queries"], stats["rows"], stats["slow"]) == (2, 2, 2)
+
+
+def test_statements_beyond_max_fingerprints_are_counted_as_other():
+    instrumentation = SqlInstrumentation(max_fingerprints=1)
+    cursor = instrumentation.wrap_cursor(FakeCursor())
+    cursor.execute("SELECT 1 FROM A")
+    cursor.execute("SELECT 1 FROM B")
+    cursor.execute("SELECT 1 FROM C")
+    assert sorted(entry["calls"] for entry in instrumentation.top()) == [1, 2]
+    assert SqlInstrumentation.OTHER[0] in [entry["fingerprint"] for entry in instrumentation.top()]
+
+
+def app_running(instrumentation, statements, testing=True):
+    app = Flask(__name__)
+    app.testing = testing
+    instrumentation.instrument_app(app)
+
+    @app.route("/complaints")
+    def complaints():
+        cursor = instrumentation.wrap_cursor(FakeCursor())
+        for i in range(statements):
+            cursor.execute("SELECT * FROM Comments WHERE complaint_id = ?", i)
+        return jsonify([])
+
+    return app.test_client()
+
+
+def test_over_budget_request_fails_under_app_testing():
+    instrumentation = SqlInstrumentation(budget=2)
+    with pytest.raises(QueryBudgetExceeded, match="ran 3 SQL statements"):
+        app_running(instrumentation, 3).get("/complaints")
+    assert app_running(instrumentation, 2).get("/complaints").status_code == 200
+    assert instrumentation.stats()["budget_exceeded"] == 1
+
+
+def test_over_budget_request_is_only_logged_in_production(caplog):
+    instrumentation = SqlInstrumentation(budgets=parse_budgets("/complaints=1, /other=9"), debug_headers=True,
+                                         repeat_threshold=3)
+    with caplog.at_level(logging.WARNING, logger="sql_instrumentation"):
+        response = app_running(instrumentation, 3, testing=False).get("/complaints")
+    assert response.status_code == 200
+    assert response.headers["X-DB-Query-Count"] == "3"
+    assert any("budget 1" in message for message in caplog.messages)
+    assert any("likely N+1" in message for message in caplog.messages)
@@ -0,0 +1,50 @@
+import io
+import time
+
+import pytest
+
+from uploads import LocalBlobStore, UploadError, check_blob_name, new_blob_name, validate_upload
+
+
+def test_validate_upload():
+    validate_upload("photo.JPG", 1024)
+    with pytest.raises(UploadError):
+        validate_upload("script.pdf.exe")
+    with pytest.raises(UploadError):
+        validate_upload("big.pdf", 11 * 1024 * 1024)
+
+
+def test_blob_names_keep_the_extension():
+    name = new_blob_name("отчёт.pdf")
+    assert name.endswith("_attachment.pdf")
+    check_blob_name(name)
+    assert new_blob_name("../../etc/scan 1.png").endswith("_etc_scan_1.png")
+    with pytest.raises(UploadError):
+        new_blob_name("notes.txt")
+
+
+def test_local_store_requires_a_secret(tmp_path):
+    with pytest.raises(ValueError):
+        LocalBlobStore(tmp_path, "/uploads/local", None)
+
+
+def test_local_tokens_verify_across_instances(tmp_path):
+    blob_name = new_blob_name("scan.pdf")
+    issuer = LocalBlobStore(tmp_path, "/uploads/local", "shared-secret")
+    other_worker = LocalBlobStore(tmp_path, "/uploads/local", "shared-secret")
+    query = issuer.upload_token(blob_name)["upload_url"].split("?", 1)[1]
+    params = dict(part.split("=") for part in query.split("&"))
+    assert other_worker.verify_token(blob_name, params["expires"], params["sig"])
+    assert not other_worker.verify_token(new_blob_name("other.pdf"), params["expires"], params["sig"])
+    assert not other_worker.verify_token(blob_name, int(time.time()) - 1, params["sig"])
+
+
+def test_local_write_rejects_oversized_files(tmp_path):
+    store = LocalBlobStore(tmp_path, "/uploads/local", "secret")
+    blob_name = new_blob_name("scan.pdf")
+    with pytest.raises(UploadError):
+        store.write(blob_name, io.BytesIO(b"x" * 11), max_bytes=10)
+    with pytest.raises(UploadError):
+        store.finalize(blob_name)
+    store.write(blob_name, io.BytesIO(b"%PDF"))
+    assert store.finalize(blob_name) == f"/uploads/local/{blob_name}"
@@ -0,0 +1,140 @@
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+from upvotes import LOOKUP_SQL, BloomFilter, UpvoteCounter
+
+
+class FakeDatabase:
+    """Complaints {id: upvotes} and the ComplaintUpvotes (complaint_id, voter) pairs"""
+
+    def __init__(self, complaints, votes=()):
+        self.complaints = dict(complaints)
+        self.votes = set(votes)
+        self.lookups = 0
+        self.down = False
+
+    @contextmanager
+    def connect(self):
+        if self.down:
+            raise ConnectionError("database unreachable")
+        yield self
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+
+    def execute(self, sql, params=()):
+        if sql == LOOKUP_SQL:
+            self.db.lookups += 1
+            voter, complaint_id = params
+            if complaint_id in self.db.complaints:
+                self.rows = [SimpleNamespace(upvotes=self.db.complaints[complaint_id],
+                                             voted=(complaint_id, voter) in self.db.votes)]
+        elif sql.startswith("SELECT complaint_id, voter"):
+            self.rows = [SimpleNamespace(complaint_id=c, voter=v) for c, v in self.db.votes]
+        else:
+            changed = set()
+            for complaint_id, voter in zip(params[::2], params[1::2]):
+                if complaint_id in self.db.complaints and (complaint_id, voter) not in self.db.votes:
+                    self.db.votes.add((complaint_id, voter))
+                    self.db.complaints[complaint_id] += 1
+                    changed.add(complaint_id)
+            self.rows = [SimpleNamespace(id=c, upvotes=self.db.complaints[c]) for c in changed]
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+
+def counter(db, tmp_path, **options):
+    return UpvoteCounter(db.connect, str(tmp_path), fsync=False, **options)
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    items = [f"{i}\tvoter{i}" for i in range(1000)]
+    for item in items:
+        bloom.add(item)
+    assert all(item in bloom for item in items)
+    false_positives = sum(f"{i}\tother{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_one_vote_per_voter(tmp_path):
+    db = FakeDatabase({1: 4}, votes={(1, "old@x")})
+    upvotes = counter(db, tmp_path)
+    assert upvotes.vote(1, "a@x") == (True, 5)
+    assert upvotes.vote("1", "a@x") == (False, 5)
+    assert upvotes.vote(1, "old@x") == (False, 5)
+    with pytest.raises(KeyError):
+        upvotes.vote(99, "a@x")
+
+
+def test_bloom_filter_skips_the_database_for_new_voters(tmp_path):
+    db = FakeDatabase({1: 0}, votes={(1, "old@x")})
+    upvotes = counter(db, tmp_path)
+    upvotes._load_bloom()
+    upvotes.vote(1, "a@x")  # first sight of the complaint reads its count
+    lookups = db.lookups
+    upvotes.vote(1, "b@x")
+    assert db.lookups == lookups
+    assert upvotes.vote(1, "old@x") == (False, 2)
+
+
+def test_flush_writes_votes_and_removes_the_log(tmp_path):
+    flushed = []
+    db = FakeDatabase({1: 0, 2: 7})
+    upvotes = counter(db, tmp_path, on_flush=flushed.append)
+    upvotes.vote(1, "a@x")
+    upvotes.vote(2, "a@x")
+    assert len(list(tmp_path.iterdir())) == 1
+    assert upvotes.flush() == 2
+    assert db.votes == {(1, "a@x"), (2, "a@x")}
+    assert flushed == [{1: 1, 2: 8}]
+    assert upvotes.count(2) == 8
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_failed_flush_keeps_votes_pending(tmp_path):
+    db = FakeDatabase({1: 0})
+    upvotes = counter(db, tmp_path)
+    upvotes.vote(1, "a@x")
+    db.down = True
+    with pytest.raises(ConnectionError):
+        upvotes.flush()
+    assert upvotes.stats()["pending"] == 1
+    db.down = False
+    assert upvotes.flush() == 1
+    assert db.complaints[1] == 1
+
+
+def test_votes_left_in_the_log_are_replayed_once(tmp_path):
+    db = FakeDatabase({1: 0})
+    crashed = counter(db, tmp_path)
+    crashed.vote(1, "a@x")
+    crashed.vote(1, "b@x")
+    crashed._segment.close()  # the process died before flushing
+    with open(crashed._segment.path, "a", encoding="utf-8") as log:
+        log.write("1\ttorn")  # half-written line, never acknowledged
+
+    restarted = counter(db, tmp_path)
+    restarted._replay()
+    restarted._replay()
+    assert restarted.flush() == 2
+    assert db.complaints[1] == 2
+    assert db.votes == {(1, "a@x"), (1, "b@x")}
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,252 @@
+"""Complaint attachment uploads: parallel staged blocks and direct-to-storage tokens"""
+import base64
+import hashlib
+import hmac
+import os
+import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from werkzeug.utils import secure_filename
+
+ALLOWED_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.pdf', '.doc', '.docx')
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024
+DEFAULT_TOKEN_TTL = 600
+
+_BLOB_NAME = re.compile(r"^[0-9a-f]{32}_[\w.-]+$")
+
+
+class UploadError(ValueError):
+    """The attachment was rejected (type, size, unknown or expired upload)"""
+
+
+def validate_upload(filename, size=None):
+    if not filename or not filename.lower().endswith(ALLOWED_EXTENSIONS):
+        raise UploadError("Invalid file type.")
+    if size is not None and size > MAX_UPLOAD_BYTES:
+        raise UploadError("File too large.")
+
+
+def new_blob_name(filename):
+    """Unique, storage-safe blob name for an uploaded file, keeping its (allowed) extension.
+
+    secure_filename() drops non-ASCII characters, which can take the dot
+    before the extension with them ("отчёт.pdf" becomes "pdf"), so the
+    extension is re-attached and the sanitized name validated again.
+    """
+    validate_upload(filename)
+    name = secure_filename(filename)
+    extension = os.path.splitext(filename)[1].lower()
+    if not name.lower().endswith(extension):
+        name = (secure_filename(filename[:-len(extension)]) or "attachment") + extension
+    validate_upload(name)
+    return f"{uuid.uuid4().hex}_{name}"
+
+
+def check_blob_name(blob_name):
+    if not blob_name or not _BLOB_NAME.match(blob_name):
+        raise UploadError("Invalid upload reference.")
+    validate_upload(blob_name)
+
+
+def stream_size(stream):
+    stream.seek(0, 2)
+    size = stream.tell()
+    stream.seek(0)
+    return size
+
+
+class AzureBlobStore:
+    """Azure Blob Storage (or Azurite) backend.
+
+    upload() splits the file into blocks and stages up to max_concurrency of
+    them at a time before committing the block list, instead of one
+    sequential upload_blob() call. upload_token() hands the browser a
+    short-lived write-only SAS URL so the file never passes through Flask;
+    finalize() then checks the blob before the complaint row references it.
+    """
+
+    def __init__(self, service_client, container, block_size=DEFAULT_BLOCK_SIZE, max_concurrency=4,
+                 token_ttl=DEFAULT_TOKEN_TTL, timeout=30):
+        self.service = service_client
+        self.container = container
+        self.block_size = block_size
+        self.max_concurrency = max(1, max_concurrency)
+        self.token_ttl = token_ttl
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="blob-upload")
+
+    def _client(self, blob_name):
+        return self.service.get_blob_client(container=self.container, blob=blob_name)
+
+    def upload(self, blob_name, stream, length, content_type=None):
+        """Upload a seekable stream and return the blob URL"""
+        from azure.storage.blob import BlobBlock, ContentSettings
+
+        client = self._client(blob_name)
+        settings = ContentSettings(content_type=content_type) if content_type else None
+        if length <= self.block_size:
+            client.upload_blob(stream, length=length, overwrite=True, content_settings=settings,
+                               timeout=self.timeout)
+            return client.url
+
+        block_ids = []
+        in_flight = []
+        index = 0
+        while True:
+            data = stream.read(self.block_size)
+            if not data:
+                break
+            # Block ids must all have the same length within a blob
+            block_id = base64.b64encode(f"{index:08d}".encode()).decode()
+            block_ids.append(block_id)
+            in_flight.append(self._executor.submit(client.stage_block, block_id, data, length=len(data),
+                                                   timeout=self.timeout))
+            index += 1
+            # Bound memory to max_concurrency blocks
+            if len(in_flight) >= self.max_concurrency:
+                in_flight.pop(0).result()
+        for future in in_flight:
+            future.result()
+        client.commit_block_list([BlobBlock(block_id=block_id) for block_id in block_ids],
+                                 content_settings=settings, timeout=self.timeout)
+        return client.url
+
+    def upload_token(self, blob_name, content_type=None):
+        """Short-lived SAS URL the browser can PUT the file to"""
+        from azure.storage.blob import BlobSasPermissions, generate_blob_sas
+
+        now = datetime.now(timezone.utc)
+        expiry = now + timedelta(seconds=self.token_ttl)
+        sas_args = {
+            "account_name": self.service.account_name,
+            "container_name": self.container,
+            "blob_name": blob_name,
+            "permission": BlobSasPermissions(create=True, write=True),
+            "expiry": expiry,
+            "start": now - timedelta(minutes=5),  # clock skew
+        }
+        account_key = getattr(self.service.credential, "account_key", None)
+        if account_key:
+            sas_args["account_key"] = account_key
+        else:
+            sas_args["user_delegation_key"] = self.service.get_user_delegation_key(now, expiry)
+        sas = generate_blob_sas(**sas_args)
+        headers = {"x-ms-blob-type": "BlockBlob"}
+        if content_type:
+            headers["x-ms-blob-content-type"] = content_type
+        return {
+            "upload_url": f"{self._client(blob_name).url}?{sas}",
+            "method": "PUT",
+            "headers": headers,
+            "expires_at": expiry.isoformat(),
+        }
+
+    def finalize(self, blob_name):
+        """Confirm a direct upload landed and is acceptable; returns its URL"""
+        from azure.core.exceptions import ResourceNotFoundError
+
+        check_blob_name(blob_name)
+        client = self._client(blob_name)
+        try:
+            properties = client.get_blob_properties(timeout=self.timeout)
+        except ResourceNotFoundError:
+            raise UploadError("Upload not found.")
+        if properties.size > MAX_UPLOAD_BYTES:
+            client.delete_blob(timeout=self.timeout)
+            raise UploadError("File too large.")
+        return client.url
+
+
+class LocalBlobStore:
+    """Filesystem stand-in for blob storage (BLOB_BACKEND=local).
+
+    Files live under root and are served at base_url. Upload tokens are
+    HMAC-signed URLs pointing at the app's own PUT endpoint, so the direct
+    upload flow can be exercised without an Azure account. The secret must
+    be configured (the same for every worker), or a token issued by one
+    worker would be rejected by the others and by the next restart.
+    """
+
+    def __init__(self, root, base_url, secret, token_ttl=DEFAULT_TOKEN_TTL):
+        if not secret:
+            raise ValueError("BLOB_BACKEND=local needs FLASK_SECRET_KEY to sign upload tokens")
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip("/")
+        self.secret = secret if isinstance(secret, bytes) else str(secret).encode()
+        self.token_ttl = token_ttl
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, blob_name):
+        check_blob_name(blob_name)
+        return os.path.join(self.root, blob_name)
+
+    def url(self, blob_name):
+        return f"{self.base_url}/{blob_name}"
+
+    def upload(self, blob_name, stream, length, content_type=None):
+        self.write(blob_name, stream)
+        return self.url(blob_name)
+
+    def write(self, blob_name, stream, max_bytes=MAX_UPLOAD_BYTES):
+        """Copy stream to the blob file, rejecting it once it exceeds max_bytes"""
+        path = self.path(blob_name)
+        partial = f"{path}.part"
+        written = 0
+        try:
+            with open(partial, "wb") as f:
+                while True:
+                    data = stream.read(1024 * 1024)
+                    if not data:
+                        break
+                    written += len(data)
+                    if written > max_bytes:
+                        raise UploadError("File too large.")
+                    f.write(data)
+            os.replace(partial, path)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+        return written
+
+    def _signature(self, blob_name, expires):
+        return hmac.new(self.secret, f"{blob_name}:{expires}".encode(), hashlib.sha256).hexdigest()
+
+    def upload_token(self, blob_name, content_type=None):
+        expires = int(time.time()) + self.token_ttl
+        return {
+            "upload_url": f"{self.url(blob_name)}?expires={expires}&sig={self._signature(blob_name, expires)}",
+            "method": "PUT",
+            "headers": {},
+            "expires_at": datetime.fromtimestamp(expires, timezone.utc).isoformat(),
+        }
+
+    def verify_token(self, blob_name, expires, signature):
+        try:
+            expires = int(expires)
+        except (TypeError, ValueError):
+            return False
+        if expires < time.time():
+            return False
+        return hmac.compare_digest(self._signature(blob_name, expires), signature or "")
+
+    def finalize(self, blob_name):
+        path = self.path(blob_name)
+        if not os.path.exists(path):
+            raise UploadError("Upload not found.")
+        return self.url(blob_name)
+
+
+def create_upload_store(backend, service_client=None, container=None, local_root=None, local_url=None,
+                        secret=None, block_size=DEFAULT_BLOCK_SIZE, max_concurrency=4, token_ttl=DEFAULT_TOKEN_TTL):
+    """Upload store for the configured backend ('azure' or 'local'); None if Azure is unavailable"""
+    if backend == "local":
+        return LocalBlobStore(local_root, local_url, secret, token_ttl)
+    if backend == "azure":
+        if service_client is None:
+            return None
+        return AzureBlobStore(service_client, container, block_size, max_concurrency, token_ttl)
+    raise ValueError(f"Unknown blob backend: {backend}")
@@ -0,0 +1,343 @@
+"""Deduplicated upvotes, counted in memory and flushed to the database in batches"""
+import atexit
+import glob
+import hashlib
+import logging
+import math
+import os
+import threading
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows: segments are not shared between processes there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Votes per INSERT batch (two parameters each, well under the 2100 parameter limit)
+FLUSH_CHUNK = 500
+
+# Inserts new (complaint, voter) pairs and applies the number actually inserted to
+# Complaints.upvotes, so replaying or double-submitting a vote is harmless
+FLUSH_SQL = """
+SET NOCOUNT ON;
+DECLARE @votes TABLE (complaint_id INT, voter VARCHAR(255));
+INSERT INTO @votes (complaint_id, voter) VALUES {values};
+DECLARE @added TABLE (complaint_id INT);
+INSERT INTO ComplaintUpvotes (complaint_id, voter)
+OUTPUT INSERTED.complaint_id INTO @added
+SELECT DISTINCT v.complaint_id, v.voter
+FROM @votes v
+WHERE EXISTS (SELECT 1 FROM Complaints c WHERE c.id = v.complaint_id)
+  AND NOT EXISTS (SELECT 1 FROM ComplaintUpvotes u WITH (UPDLOCK, HOLDLOCK)
+                  WHERE u.complaint_id = v.complaint_id AND u.voter = v.voter);
+UPDATE c
+SET upvotes = ISNULL(c.upvotes, 0) + a.added
+OUTPUT INSERTED.id, INSERTED.upvotes
+FROM Complaints c
+JOIN (SELECT complaint_id, COUNT(*) AS added FROM @added GROUP BY complaint_id) a ON a.complaint_id = c.id;
+"""
+
+LOOKUP_SQL = """
+SELECT c.upvotes,
+       CASE WHEN EXISTS (SELECT 1 FROM ComplaintUpvotes u WHERE u.complaint_id = c.id AND u.voter = ?)
+            THEN 1 ELSE 0 END AS voted
+FROM Complaints c
+WHERE c.id = ?
+"""
+
+
+class BloomFilter:
+    """Set membership with no false negatives and ~error_rate false positives"""
+
+    def __init__(self, capacity=1000000, error_rate=0.01):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class _Segment:
+    """One append-only vote log file, locked while this process writes to it"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "a", encoding="utf-8")
+        if fcntl is not None:
+            fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def append(self, complaint_id, voter, fsync):
+        self.file.write(f"{complaint_id}\t{voter}\n")
+        self.file.flush()
+        if fsync:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+class UpvoteCounter:
+    """One upvote per (complaint, voter), answered from memory and written in batches.
+
+    vote() rejects duplicates without touching the database when it can: a
+    set of unflushed votes and a Bloom filter of flushed ones (loaded at
+    start) rule out most repeats, and only possible repeats are checked
+    against ComplaintUpvotes. An accepted vote is appended (and fsynced) to
+    a log segment in log_dir before vote() returns, then counted in memory.
+    The flusher inserts pending votes and bumps Complaints.upvotes in one
+    set-based batch every flush_interval seconds and deletes the segments
+    the batch covered. Segments left behind by a crash are replayed at
+    start; the insert skips votes already recorded, so replays never
+    double count. on_flush({complaint_id: upvotes}) receives the committed
+    counts.
+    """
+
+    def __init__(self, get_connection, log_dir, flush_interval=1.0, max_pending=5000,
+                 bloom_capacity=1000000, fsync=True, on_flush=None):
+        self.get_connection = get_connection
+        self.log_dir = log_dir
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.fsync = fsync
+        self.on_flush = on_flush
+        self.bloom = BloomFilter(bloom_capacity)
+        self.bloom_ready = False
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._base = {}       # complaint_id -> upvotes last read from or written to the database
+        self._delta = {}      # complaint_id -> accepted, unflushed votes
+        self._pending = []    # [(complaint_id, voter, counted)]; replayed votes are not in _delta
+        self._pending_set = set()
+        self._token = uuid.uuid4().hex[:12]
+        self._seq = 0
+        self._segment = None
+        self._sealed = []     # segment paths waiting for their votes to be flushed
+        self._thread = None
+        self._counters = {"accepted": 0, "duplicates": 0, "db_checks": 0, "flushed": 0, "flush_errors": 0}
+
+    @staticmethod
+    def _key(complaint_id, voter):
+        return f"{complaint_id}\t{voter}"
+
+    # Votes
+
+    def vote(self, complaint_id, voter):
+        """(accepted, live count); raises KeyError for an unknown complaint"""
+        complaint_id = int(complaint_id)
+        voter = " ".join(str(voter).split())[:255]  # one line in the vote log
+        key = self._key(complaint_id, voter)
+        with self._lock:
+            if key in self._pending_set:
+                self._counters["duplicates"] += 1
+                return False, self._count(complaint_id)
+            known = complaint_id in self._base
+            maybe_voted = not self.bloom_ready or key in self.bloom
+
+        if maybe_voted or not known:
+            self._counters["db_checks"] += 1
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(LOOKUP_SQL, (voter, complaint_id))
+                row = cursor.fetchone()
+            if row is None:
+                raise KeyError(complaint_id)
+            with self._lock:
+                self._base.setdefault(complaint_id, row.upvotes or 0)
+                if row.voted:
+                    self.bloom.add(key)
+                    self._counters["duplicates"] += 1
+                    return False, self._count(complaint_id)
+
+        with self._lock:
+            if key in self._pending_set:
+                self._counters["duplicates"] += 1
+                return False, self._count(complaint_id)
+            self._open_segment().append(complaint_id, voter, self.fsync)
+            self._pending.append((complaint_id, voter, True))
+            self._pending_set.add(key)
+            self.bloom.add(key)
+            self._delta[complaint_id] = self._delta.get(complaint_id, 0) + 1
+            self._counters["accepted"] += 1
+            count = self._count(complaint_id)
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self._wake.set()
+        return True, count
+
+    def count(self, complaint_id):
+        """Live count if this process has seen the complaint, else None"""
+        with self._lock:
+            complaint_id = int(complaint_id)
+            return self._count(complaint_id) if complaint_id in self._base else None
+
+    def _count(self, complaint_id):
+        return self._base.get(complaint_id, 0) + self._delta.get(complaint_id, 0)
+
+    # Durable log
+
+    def _open_segment(self):
+        if self._segment is None:
+            os.makedirs(self.log_dir, exist_ok=True)
+            self._seq += 1
+            self._segment = _Segment(os.path.join(self.log_dir, f"votes-{self._token}-{self._seq:06d}.log"))
+        return self._segment
+
+    def _seal(self):
+        """Close the current segment so the votes taken with it can be flushed"""
+        if self._segment is not None:
+            self._segment.close()
+            self._sealed.append(self._segment.path)
+            self._segment = None
+
+    def _replay(self):
+        """Queue votes from segments no running process holds (left by a crash or restart)"""
+        replayed = 0
+        for path in sorted(glob.glob(os.path.join(self.log_dir, "votes-*.log"))):
+            if f"-{self._token}-" in path:
+                continue
+            try:
+                handle = open(path, "r+", encoding="utf-8")
+            except OSError:
+                continue
+            try:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        continue  # another worker is still writing to it
+                content = handle.read()
+            finally:
+                handle.close()
+            with self._lock:
+                # A final line without its newline was torn by the crash and never acknowledged
+                for line in content.split("\n")[:-1]:
+                    complaint_id, _, voter = line.partition("\t")
+                    if not voter or not complaint_id.isdigit():
+                        continue
+                    key = self._key(int(complaint_id), voter)
+                    if key not in self._pending_set:
+                        self._pending.append((int(complaint_id), voter, False))
+                        self._pending_set.add(key)
+                        self.bloom.add(key)
+                        replayed += 1
+                self._sealed.append(path)
+        if replayed:
+            logger.info("Replaying %d upvotes from the vote log", replayed)
+
+    def _load_bloom(self):
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT complaint_id, voter FROM ComplaintUpvotes")
+            while True:
+                rows = cursor.fetchmany(5000)
+                if not rows:
+                    break
+                with self._lock:
+                    for row in rows:
+                        self.bloom.add(self._key(row.complaint_id, row.voter))
+        self.bloom_ready = True
+
+    # Flushing
+
+    def flush(self):
+        """Write pending votes now; returns the number of votes written"""
+        with self._flush_lock:
+            with self._lock:
+                self._seal()
+                batch, sealed = self._pending, self._sealed
+                self._pending, self._sealed = [], []
+            if not batch:
+                self._remove(sealed)
+                return 0
+            try:
+                counts = self._write(batch)
+            except Exception:
+                with self._lock:
+                    self._pending = batch + self._pending
+                    self._sealed = sealed + self._sealed
+                self._counters["flush_errors"] += 1
+                raise
+            with self._lock:
+                for complaint_id, voter, counted in batch:
+                    self._pending_set.discard(self._key(complaint_id, voter))
+                    if counted:
+                        self._delta[complaint_id] -= 1
+                        if not self._delta[complaint_id]:
+                            del self._delta[complaint_id]
+                self._base.update(counts)
+            self._remove(sealed)
+            added = len(batch)
+            self._counters["flushed"] += added
+        if counts and self.on_flush:
+            self.on_flush(counts)
+        return added
+
+    def _write(self, batch):
+        counts = {}
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            for start in range(0, len(batch), FLUSH_CHUNK):
+                chunk = batch[start:start + FLUSH_CHUNK]
+                cursor.execute(FLUSH_SQL.format(values=", ".join(["(?, ?)"] * len(chunk))),
+                               [value for complaint_id, voter, _ in chunk for value in (complaint_id, voter)])
+                counts.update({row.id: row.upvotes for row in cursor.fetchall()})
+        return counts
+
+    @staticmethod
+    def _remove(paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def start(self):
+        """Replay leftover vote logs, load the Bloom filter and flush in the background"""
+        if self._thread is not None:
+            return
+
+        def run():
+            try:
+                self._replay()
+            except Exception as e:
+                logger.warning("Could not replay the vote log: %s", e)
+            try:
+                self._load_bloom()
+            except Exception as e:
+                logger.warning("Could not load upvotes into the Bloom filter: %s", e)
+            while True:
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.warning("Upvote flush failed, will retry: %s", e)
+
+        self._thread = threading.Thread(target=run, name="upvote-flusher", daemon=True)
+        self._thread.start()
+        atexit.register(self._flush_at_exit)
+
+    def _flush_at_exit(self):
+        try:
+            self.flush()
+        except Exception as e:
+            logger.warning("Upvotes left in the vote log for replay: %s", e)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, pending=len(self._pending), segments=len(self._sealed) + bool(self._segment),
+                        bloom_ready=self.bloom_ready)